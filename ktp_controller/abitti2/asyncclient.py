@@ -0,0 +1,58 @@
+# Standard library imports
+import functools
+
+# Third-party imports
+
+# Internal imports
+import ktp_controller.http
+import ktp_controller.abitti2.client
+
+
+__all__ = [
+    # Abitti2 API commands:
+    "get_current_abitti2_version",
+    "get_cached_abitti2_version",
+    "change_single_security_code",
+    "decrypt_exams",
+    "upload_exam_package",
+    "get_decrypted_exams",
+    "start_decrypted_exams",
+    "decrypt_uploaded_exams",
+    "prepare_exam_package",
+    "reset",
+    "stop_exam_session",
+    "download_answers_file",
+    "set_exam_session_permission_to_use_browsers",
+]
+
+
+_to_async = functools.partial(
+    ktp_controller.http.to_async, executor=ktp_controller.abitti2.client.EXECUTOR
+)
+
+
+# Abitti2 API commands, same as in ktp_controller.abitti2.client, but
+# these do not block the event loop:
+
+
+get_current_abitti2_version = _to_async(
+    ktp_controller.abitti2.client.get_current_abitti2_version
+)
+get_cached_abitti2_version = _to_async(
+    ktp_controller.abitti2.client.get_cached_abitti2_version
+)
+change_single_security_code = _to_async(
+    ktp_controller.abitti2.client.change_single_security_code
+)
+decrypt_exams = _to_async(ktp_controller.abitti2.client.decrypt_exams)
+upload_exam_package = _to_async(ktp_controller.abitti2.client.upload_exam_package)
+get_decrypted_exams = _to_async(ktp_controller.abitti2.client.get_decrypted_exams)
+start_decrypted_exams = _to_async(ktp_controller.abitti2.client.start_decrypted_exams)
+decrypt_uploaded_exams = _to_async(ktp_controller.abitti2.client.decrypt_uploaded_exams)
+prepare_exam_package = _to_async(ktp_controller.abitti2.client.prepare_exam_package)
+reset = _to_async(ktp_controller.abitti2.client.reset)
+stop_exam_session = _to_async(ktp_controller.abitti2.client.stop_exam_session)
+download_answers_file = _to_async(ktp_controller.abitti2.client.download_answers_file)
+set_exam_session_permission_to_use_browsers = _to_async(
+    ktp_controller.abitti2.client.set_exam_session_permission_to_use_browsers
+)
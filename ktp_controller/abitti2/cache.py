@@ -0,0 +1,95 @@
+# Standard library imports
+import os
+import threading
+import time
+import typing
+
+# Third-party imports
+
+# Internal imports
+
+# Relative imports
+
+__all__ = [
+    "FileCache",
+    "TTLCache",
+]
+
+
+_T = typing.TypeVar("_T")
+
+
+class FileCache(typing.Generic[_T]):
+    """Value parsed from a file, parsed again only when the file
+    changes, that is, when its inode, size or modification time
+    changes.
+
+    >>> import pathlib, tempfile
+    >>> with tempfile.NamedTemporaryFile("w") as f:
+    ...     _ = f.write("first")
+    ...     f.flush()
+    ...     cache = FileCache(lambda: f.name, lambda p: pathlib.Path(p).read_text())
+    ...     cache.get()
+    'first'
+    """
+
+    def __init__(
+        self,
+        get_filepath: typing.Callable[[], str],
+        parse: typing.Callable[[str], _T],
+    ):
+        self.__get_filepath = get_filepath
+        self.__parse = parse
+        self.__lock = threading.Lock()
+        self.__key: typing.Tuple[str, int, int, int] | None = None
+        self.__value: _T | None = None
+
+    def get(self) -> _T:
+        filepath = self.__get_filepath()
+        st = os.stat(filepath)
+        key = (filepath, st.st_ino, st.st_size, st.st_mtime_ns)
+
+        with self.__lock:
+            if key != self.__key:
+                self.__value = self.__parse(filepath)
+                self.__key = key
+            return typing.cast(_T, self.__value)
+
+    def invalidate(self) -> None:
+        with self.__lock:
+            self.__key = None
+            self.__value = None
+
+
+class TTLCache(typing.Generic[_T]):
+    """Value which is loaded again once it's older than ttl_sec, or
+    after it has been invalidated explicitly.
+
+    >>> values = iter([1, 2])
+    >>> cache = TTLCache(lambda: next(values), ttl_sec=60)
+    >>> cache.get(), cache.get()
+    (1, 1)
+    >>> cache.invalidate()
+    >>> cache.get()
+    2
+    """
+
+    def __init__(self, load: typing.Callable[[], _T], *, ttl_sec: float):
+        self.__load = load
+        self.__ttl_sec = ttl_sec
+        self.__lock = threading.Lock()
+        self.__loaded_at: float | None = None
+        self.__value: _T | None = None
+
+    def get(self) -> _T:
+        with self.__lock:
+            now = time.monotonic()
+            if self.__loaded_at is None or now - self.__loaded_at >= self.__ttl_sec:
+                self.__value = self.__load()
+                self.__loaded_at = now
+            return typing.cast(_T, self.__value)
+
+    def invalidate(self) -> None:
+        with self.__lock:
+            self.__loaded_at = None
+            self.__value = None
@@ -1,8 +1,11 @@
 # Standard library imports
+import concurrent.futures
+import contextlib
 import hashlib
 import logging
 import os
 import os.path
+import time
 import typing
 
 # Third-party imports
@@ -11,7 +14,9 @@ import requests.auth
 
 # Internal imports
 import ktp_controller.files
+import ktp_controller.http
 import ktp_controller.utils
+import ktp_controller.abitti2.cache
 import ktp_controller.abitti2.naksu2
 
 
@@ -19,18 +24,26 @@ _LOGGER = logging.getLogger(__name__)
 
 
 __all__ = [
+    # Constants:
+    "EXECUTOR",
     # Utils:
     "get_basic_auth",
     "get_abitti2_websock_url",
     # Abitti2 API commands:
     "get_current_abitti2_version",
+    "get_cached_abitti2_version",
+    "invalidate_cached_abitti2_version",
     "change_single_security_code",
     "decrypt_exams",
     "upload_exam_package",
+    "upload_exam_package_stream",
     "get_decrypted_exams",
     "start_decrypted_exams",
+    "decrypt_uploaded_exams",
+    "prepare_exam_package",
     "reset",
     "stop_exam_session",
+    "open_answers_file_stream",
     "download_answers_file",
 ]
 
@@ -40,6 +53,23 @@ __all__ = [
 
 _ABITTI2_USERNAME = "valvoja"
 
+_COMPONENT = "Abitti2"
+
+# All requests to Abitti2 share the same keep-alive connection pool,
+# which is large enough for concurrent per-student requests.
+_POOL_MAXSIZE = 32
+_SESSION = ktp_controller.http.new_session(
+    pool_maxsize=_POOL_MAXSIZE, component=_COMPONENT
+)
+
+# Worker threads of ktp_controller.abitti2.asyncclient, one per pooled
+# connection.
+EXECUTOR = ktp_controller.http.new_executor(
+    max_workers=_POOL_MAXSIZE, component=_COMPONENT
+)
+
+_UPLOAD_CHUNK_SIZE = 1024**2
+
 
 # Utils:
 
@@ -48,7 +78,7 @@ def _get(path: str, *, stream: bool = False, timeout: int = 20) -> requests.Resp
     host = ktp_controller.abitti2.naksu2.read_domain()
     url = ktp_controller.utils.get_url(host, path)
 
-    response = requests.get(
+    response = _SESSION.get(
         url,
         auth=requests.auth.HTTPBasicAuth(
             _ABITTI2_USERNAME, ktp_controller.abitti2.naksu2.read_password()
@@ -69,7 +99,7 @@ def _post(path: str, *, data=None, timeout: int = 20) -> requests.Response:
     host = ktp_controller.abitti2.naksu2.read_domain()
     url = ktp_controller.utils.get_url(host, path)
 
-    response = requests.post(
+    response = _SESSION.post(
         url,
         auth=requests.auth.HTTPBasicAuth(
             _ABITTI2_USERNAME, ktp_controller.abitti2.naksu2.read_password()
@@ -104,6 +134,22 @@ def get_current_abitti2_version() -> str:
     return _get("/api/version").json()["version"]
 
 
+_VERSION_CACHE = ktp_controller.abitti2.cache.TTLCache(
+    get_current_abitti2_version, ttl_sec=5 * 60
+)
+
+
+def get_cached_abitti2_version() -> str:
+    """Return Abitti2 version, fetched at most every five minutes or
+    after invalidate_cached_abitti2_version() has been called."""
+
+    return _VERSION_CACHE.get()
+
+
+def invalidate_cached_abitti2_version() -> None:
+    _VERSION_CACHE.invalidate()
+
+
 def change_single_security_code() -> typing.Dict:
     return _post("/api/single-security-code").json()
 
@@ -114,29 +160,57 @@ def decrypt_exams(decrypt_code: str, timeout: int = 60) -> typing.Dict:
     ).json()
 
 
-def upload_exam_package(
-    exam_package_filepath, *, timeout: int = 20
+def upload_exam_package_stream(
+    filename: str,
+    chunks: typing.Iterable[bytes],
+    *,
+    size: int,
+    timeout: int = 20,
 ) -> typing.List[str]:
-    exam_package_filename = os.path.basename(exam_package_filepath)
+    """Upload an exam package whose chunks are produced while they are
+    being sent. size must be the exact size of the package, so that
+    the request has Content-Length."""
 
     host = ktp_controller.abitti2.naksu2.read_domain()
     url = ktp_controller.utils.get_url(host, "/api/load-exam")
 
-    with open(exam_package_filepath, "rb") as exam_package_file:
-        response = requests.post(
-            url,
-            auth=requests.auth.HTTPBasicAuth(
-                _ABITTI2_USERNAME, ktp_controller.abitti2.naksu2.read_password()
-            ),
-            timeout=timeout,
-            files={
-                "examZip": (exam_package_filename, exam_package_file, "application/zip")
-            },
-        )
+    body = ktp_controller.http.MultipartBody(
+        [
+            ktp_controller.http.MultipartPart(
+                "examZip",
+                chunks,
+                filename=filename,
+                content_type="application/zip",
+                size=size,
+            )
+        ]
+    )
+    response = _SESSION.post(
+        url,
+        auth=requests.auth.HTTPBasicAuth(
+            _ABITTI2_USERNAME, ktp_controller.abitti2.naksu2.read_password()
+        ),
+        timeout=timeout,
+        headers={"Content-Type": body.content_type},
+        data=body,
+    )
+
+    response.raise_for_status()
+
+    return response.json()
 
-        response.raise_for_status()
 
-        return response.json()
+def upload_exam_package(
+    exam_package_filepath, *, timeout: int = 20
+) -> typing.List[str]:
+    return upload_exam_package_stream(
+        os.path.basename(exam_package_filepath),
+        ktp_controller.utils.bytes_stream(
+            exam_package_filepath, chunk_size=_UPLOAD_CHUNK_SIZE
+        ),
+        size=os.path.getsize(exam_package_filepath),
+        timeout=timeout,
+    )
 
 
 def get_decrypted_exams() -> typing.Dict:
@@ -147,24 +221,67 @@ def start_decrypted_exams() -> typing.Dict:
     return _post("/api/start-exam").json()
 
 
-def prepare_exam_package(
-    exam_package_filepath: str, decrypt_codes: typing.Iterable[str]
+def _get_decrypt_code_hash(decrypt_code: str) -> str:
+    # TODO: is it ok to expose the decrypt code in log files?
+    return hashlib.sha1(decrypt_code.encode("ascii")).hexdigest()
+
+
+def _timed_decrypt_exams(decrypt_code: str) -> typing.Tuple[typing.Dict, float]:
+    started_at = time.monotonic()
+    retval = decrypt_exams(decrypt_code)
+    duration_sec = time.monotonic() - started_at
+
+    _LOGGER.info(
+        "decrypt code (sha1 hash: %r) decrypted %d exams in %.2f seconds: %s",
+        _get_decrypt_code_hash(decrypt_code),
+        len(retval["mebs"]),
+        duration_sec,
+        retval["mebs"],
+    )
+
+    return retval, duration_sec
+
+
+def decrypt_uploaded_exams(
+    exam_filenames: typing.Set[str],
+    decrypt_codes: typing.Iterable[str],
+    *,
+    concurrency: int = 4,
 ) -> typing.Set[str]:
-    exam_filenames = set(upload_exam_package(exam_package_filepath))
+    """Decrypt uploaded exams with all decrypt codes, at most
+    concurrency codes at a time, and check that all exams were
+    decrypted with valid codes."""
+
+    decrypt_codes = list(decrypt_codes)
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="decrypt_exams"
+    ) as executor:
+        results = list(executor.map(_timed_decrypt_exams, decrypt_codes))
 
     decrypted_exam_filenames = set()
     had_invalid_decrypt_code = False
-    for decrypt_code in decrypt_codes:
-        retval = decrypt_exams(decrypt_code)
+    for decrypt_code, (retval, _) in zip(decrypt_codes, results):
         if retval["wrongPassword"]:
-            # TODO: is it ok to expose the decrypt code in log files?
             _LOGGER.error(
                 "invalid decrypt code (sha1 hash: %r)",
-                hashlib.sha1(decrypt_code.encode("ascii")).hexdigest(),
+                _get_decrypt_code_hash(decrypt_code),
             )
             had_invalid_decrypt_code = True
         decrypted_exam_filenames.update(retval["mebs"])
 
+    if results:
+        slowest_decrypt_code, (_, slowest_duration_sec) = max(
+            zip(decrypt_codes, results), key=lambda r: r[1][1]
+        )
+        _LOGGER.info(
+            "decrypted exams with %d decrypt codes, slowest one "
+            "(sha1 hash: %r) took %.2f seconds",
+            len(decrypt_codes),
+            _get_decrypt_code_hash(slowest_decrypt_code),
+            slowest_duration_sec,
+        )
+
     still_encrypted_exam_filenames = exam_filenames - decrypted_exam_filenames
 
     if len(still_encrypted_exam_filenames) > 0:
@@ -182,6 +299,19 @@ def prepare_exam_package(
     return exam_filenames
 
 
+def prepare_exam_package(
+    exam_package_filepath: str,
+    decrypt_codes: typing.Iterable[str],
+    *,
+    decrypt_concurrency: int = 4,
+) -> typing.Set[str]:
+    return decrypt_uploaded_exams(
+        set(upload_exam_package(exam_package_filepath)),
+        decrypt_codes,
+        concurrency=decrypt_concurrency,
+    )
+
+
 def reset() -> None:
     prepare_exam_package(
         ktp_controller.files.DUMMY_EXAM_PACKAGE_FILEPATH, ["odotusaulakoe"]
@@ -193,15 +323,26 @@ def stop_exam_session(session_uuid: str) -> None:
     _post("/api/end-student-session", data={"sessionUuid": session_uuid})
 
 
+@contextlib.contextmanager
+def open_answers_file_stream(
+    *, chunk_size: int = 64 * 1024
+) -> typing.Iterator[typing.Iterator[bytes]]:
+    """Return a context manager which yields an iterator over chunks of
+    the answers file, as they arrive from Abitti2."""
+
+    with _get("/api/answers-zip/answers.meb", stream=True) as response:
+        yield response.iter_content(chunk_size)
+
+
 def download_answers_file(dest_filepath: str) -> str:
     sha256sum = hashlib.sha256()
     with ktp_controller.utils.open_atomic_write(
         dest_filepath, exclusive=True
     ) as dest_file:
-        response = _get("/api/answers-zip/answers.meb", stream=True)
-        for chunk in response.iter_content(4096):
-            dest_file.write(chunk)
-            sha256sum.update(chunk)
+        with open_answers_file_stream() as chunks:
+            for chunk in chunks:
+                dest_file.write(chunk)
+                sha256sum.update(chunk)
 
     return sha256sum.hexdigest()
 
@@ -6,6 +6,7 @@ import typing
 # Third-party imports
 
 # Internal imports
+import ktp_controller.abitti2.cache
 import ktp_controller.abitti2.words
 
 __all__ = [
@@ -23,24 +24,45 @@ def make_password(word_list_indices: typing.List[int]) -> str:
     return " ".join([ktp_controller.abitti2.words.WORDS[i] for i in word_list_indices])
 
 
+def _get_naksu2_conf_filepath() -> str:
+    return os.path.join(os.path.expanduser(_NAKSU2_CONF_DIR_PATH), "naksu2-config.json")
+
+
+def _get_domain_filepath() -> str:
+    return os.path.join(
+        os.path.expanduser(_NAKSU2_CONF_DIR_PATH), "certs", "domain.txt"
+    )
+
+
 def read_naksu2_conf(*, filepath: typing.Optional[str] = None) -> typing.Dict:
     if filepath is None:
-        filepath = os.path.join(
-            os.path.expanduser(_NAKSU2_CONF_DIR_PATH), "naksu2-config.json"
-        )
+        filepath = _get_naksu2_conf_filepath()
     with open(filepath, "rb") as f:
         return json.load(f)
 
 
-def read_password():
-    naksu2_conf = read_naksu2_conf()
-    return make_password(naksu2_conf["passwordSeed"])
+def _read_password(filepath: str) -> str:
+    return make_password(read_naksu2_conf(filepath=filepath)["passwordSeed"])
 
 
-def read_domain():
-    with open(
-        os.path.join(os.path.expanduser(_NAKSU2_CONF_DIR_PATH), "certs", "domain.txt"),
-        "r",
-        encoding="utf-8",
-    ) as f:
+def _read_domain(filepath: str) -> str:
+    with open(filepath, "r", encoding="utf-8") as f:
         return f.read().strip()
+
+
+# Password and domain are needed for every request to Abitti2, but the
+# files change only when Naksu2 reconfigures Abitti2.
+_PASSWORD_CACHE = ktp_controller.abitti2.cache.FileCache(
+    _get_naksu2_conf_filepath, _read_password
+)
+_DOMAIN_CACHE = ktp_controller.abitti2.cache.FileCache(
+    _get_domain_filepath, _read_domain
+)
+
+
+def read_password() -> str:
+    return _PASSWORD_CACHE.get()
+
+
+def read_domain() -> str:
+    return _DOMAIN_CACHE.get()
@@ -0,0 +1,99 @@
+# Standard library imports
+import logging
+import os.path
+
+# Third-party imports
+
+# Internal imports
+import ktp_controller.abitti2.client
+import ktp_controller.examomatic.client
+
+# Relative imports
+
+__all__ = [
+    "back_up_answers_file",
+    "transfer_answers_file",
+]
+
+
+_LOGGER = logging.getLogger(__file__)
+
+# Backups of the same exam package are kept in the same directory, and
+# only the latest one is kept.
+_BACKUP_FILENAME_SUFFIX = "_backup.meb"
+
+
+def transfer_answers_file(
+    answers_filepath: str,
+    *,
+    exam_package_external_id: str,
+    is_final: ktp_controller.examomatic.client.IsFinal,
+) -> str:
+    """Transfer answers file from Abitti2 to Exam-O-Matic and return its
+    SHA256 checksum.
+
+    Answers file is downloaded completely to answers_filepath first,
+    because Exam-O-Matic expects its checksum and size ahead of the
+    file. It's hashed while being downloaded, so it's read back from
+    disk only once, by the upload. Local copy is kept in any case.
+    """
+
+    sha256sum = ktp_controller.abitti2.client.download_answers_file(answers_filepath)
+    ktp_controller.examomatic.client.upload_answers_file(
+        exam_package_external_id=exam_package_external_id,
+        filepath=answers_filepath,
+        sha256sum=sha256sum,
+        is_final=is_final,
+    )
+
+    return sha256sum
+
+
+def _remove_previous_backups(answers_filepath: str) -> None:
+    dirpath = os.path.dirname(answers_filepath)
+    for filename in os.listdir(dirpath):
+        filepath = os.path.join(dirpath, filename)
+        if filename.endswith(_BACKUP_FILENAME_SUFFIX) and filepath != answers_filepath:
+            try:
+                os.unlink(filepath)
+            except FileNotFoundError:
+                pass
+
+
+def back_up_answers_file(
+    answers_filepath: str,
+    *,
+    exam_package_external_id: str,
+    last_sha256sum: str | None,
+) -> str:
+    """Download answers file from Abitti2 and upload it to Exam-O-Matic
+    as a non-final backup, unless it's identical to the last backup.
+    Return SHA256 checksum of the answers file.
+
+    answers_filepath must end with _backup.meb. Once the backup has
+    been uploaded, previous backups in the same directory are removed.
+    """
+
+    if not answers_filepath.endswith(_BACKUP_FILENAME_SUFFIX):
+        raise ValueError(
+            f"answers backup filepath must end with {_BACKUP_FILENAME_SUFFIX}",
+            answers_filepath,
+        )
+
+    sha256sum = ktp_controller.abitti2.client.download_answers_file(answers_filepath)
+
+    if sha256sum == last_sha256sum:
+        _LOGGER.info("Answers have not changed since the last backup.")
+        os.unlink(answers_filepath)
+        return sha256sum
+
+    ktp_controller.examomatic.client.upload_answers_file(
+        exam_package_external_id=exam_package_external_id,
+        filepath=answers_filepath,
+        sha256sum=sha256sum,
+        is_final=ktp_controller.examomatic.client.IsFinal.FALSE,
+    )
+    _LOGGER.info("Backed up answers to Exam-O-Matic (sha256: %s).", sha256sum)
+    _remove_previous_backups(answers_filepath)
+
+    return sha256sum
@@ -0,0 +1,113 @@
+# Standard library imports
+import logging
+import time
+import typing
+
+# Third-party imports
+
+# Internal imports
+import ktp_controller.abitti2.asyncclient
+import ktp_controller.metrics
+import ktp_controller.utils
+
+# Relative imports
+
+__all__ = [
+    "BrowserPermissionGranter",
+]
+
+
+_LOGGER = logging.getLogger(__file__)
+
+_WAITING_FOR_AUTH_BROWSER = "waiting-for-auth-browser"
+
+
+class BrowserPermissionGranter:
+    """Allow students who are waiting for authorization to use browsers.
+
+    Each exam session is granted once. If the student is still waiting
+    regrant_interval_sec after the grant, it is granted again. Grants of
+    a round are made concurrently, at most concurrency at a time, and
+    their latencies are sampled in latency_samples.
+    """
+
+    def __init__(self, *, concurrency: int, regrant_interval_sec: float = 30):
+        self.__concurrency = concurrency
+        self.__regrant_interval_sec = regrant_interval_sec
+        # Session UUID -> time.monotonic() of the last successful grant
+        self.__granted_at: typing.Dict[str, float] = {}
+        self.latency_samples = ktp_controller.metrics.LatencySamples()
+
+    def __get_pending_grants(
+        self, students: typing.List[typing.Dict[str, typing.Any]]
+    ) -> typing.List[typing.Tuple[str, str]]:
+        now = time.monotonic()
+        session_uuids = {student["sessionUuid"] for student in students}
+
+        # Forget sessions which Abitti2 does not report anymore.
+        for session_uuid in set(self.__granted_at) - session_uuids:
+            del self.__granted_at[session_uuid]
+
+        pending_grants = []
+        for student in students:
+            if student["studentStatus"] != _WAITING_FOR_AUTH_BROWSER:
+                continue
+            granted_at = self.__granted_at.get(student["sessionUuid"])
+            if (
+                granted_at is not None
+                and now - granted_at < self.__regrant_interval_sec
+            ):
+                continue
+            pending_grants.append((student["studentUuid"], student["sessionUuid"]))
+
+        return pending_grants
+
+    async def __grant(self, student_uuid: str, session_uuid: str) -> bool:
+        started_at = time.monotonic()
+        try:
+            await ktp_controller.abitti2.asyncclient.set_exam_session_permission_to_use_browsers(
+                session_uuid, True
+            )
+        except Exception:  # pylint: disable=broad-exception-caught
+            _LOGGER.error(
+                "failed to allow student %s to use browsers in session %s",
+                student_uuid,
+                session_uuid,
+            )
+            return False
+        finally:
+            self.latency_samples.record(time.monotonic() - started_at)
+
+        self.__granted_at[session_uuid] = time.monotonic()
+        _LOGGER.info(
+            "allowed student %s to use browsers in session %s",
+            student_uuid,
+            session_uuid,
+        )
+        return True
+
+    async def grant(self, students: typing.List[typing.Dict[str, typing.Any]]) -> int:
+        """Grant students who are waiting for authorization and have not
+        been granted yet. Return the number of successful grants."""
+
+        pending_grants = self.__get_pending_grants(students)
+        if not pending_grants:
+            return 0
+
+        results = await ktp_controller.utils.gather_bounded(
+            [self.__grant(*pending_grant) for pending_grant in pending_grants],
+            limit=self.__concurrency,
+        )
+        grant_count = sum(results)
+
+        _LOGGER.info(
+            "allowed %d/%d students to use browsers, grant latency %s",
+            grant_count,
+            len(pending_grants),
+            " ".join(
+                f"{name}={duration_sec:.3f}s"
+                for name, duration_sec in self.latency_samples.percentiles().items()
+            ),
+        )
+
+        return grant_count
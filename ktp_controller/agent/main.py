@@ -2,12 +2,16 @@
 
 # Standard library imports
 import asyncio
+import collections
+import contextlib
+import copy
 import datetime
 import enum
-import hashlib
+import functools
 import json
 import logging
 import os.path
+import time
 import typing
 import zipfile
 
@@ -16,22 +20,49 @@ import requests.exceptions
 import websockets
 
 # Internal imports
+import ktp_controller.abitti2.asyncclient
 import ktp_controller.abitti2.client
 import ktp_controller.abitti2.naksu2
 import ktp_controller.abitti2.schemas
+import ktp_controller.agent.answers
+import ktp_controller.agent.grants
+import ktp_controller.agent.metrics
+import ktp_controller.agent.outbox
+import ktp_controller.agent.package
+import ktp_controller.agent.prebuild
+import ktp_controller.agent.prefetch
+import ktp_controller.agent.reporter
+import ktp_controller.agent.scheduler
+import ktp_controller.agent.snapshot
 import ktp_controller.agent.state
 import ktp_controller.agent.stats
+import ktp_controller.agent.verification
+import ktp_controller.agent.watchdog
+import ktp_controller.api.asyncclient
 import ktp_controller.api.client
+import ktp_controller.examomatic.asyncclient
 import ktp_controller.examomatic.client
 import ktp_controller.files
+import ktp_controller.http
+import ktp_controller.metrics
 import ktp_controller.pydantic
+import ktp_controller.tracing
 import ktp_controller.utils
 import ktp_controller.messages
+from ktp_controller.settings import SETTINGS
 
 
 _LOGGER = logging.getLogger(__file__)
 
 
+def _get_exam_file_content_filepath(sha256sum: str) -> str:
+    return ktp_controller.files.get_local_filepath(
+        ktp_controller.files.LocalFilepathType.EXAM_FILE_CONTENT,
+        sha256sum[:2],
+        sha256sum,
+    )
+
+
 def _create_dummy_exam_package_file():
     ktp_controller.examomatic.client.download_dummy_exam_file(
         ktp_controller.files.DUMMY_EXAM_FILE_FILEPATH
@@ -47,7 +78,7 @@ def _create_dummy_exam_package_file():
             )
 
 
-def _transfer_answers(
+async def _transfer_answers(
     exam_package_external_id: str,
     *,
     is_final: ktp_controller.examomatic.client.IsFinal = ktp_controller.examomatic.client.IsFinal.UNKNOWN,
@@ -58,59 +89,120 @@ def _transfer_answers(
         ktp_controller.utils.utcnow_str() + "_final" if is_final else "",
     )
 
-    sha256sum = ktp_controller.abitti2.client.download_answers_file(answers_file_path)
-
-    ktp_controller.examomatic.client.upload_answers_file(
+    await asyncio.to_thread(
+        ktp_controller.agent.answers.transfer_answers_file,
+        answers_file_path,
         exam_package_external_id=exam_package_external_id,
-        filepath=answers_file_path,
-        sha256sum=sha256sum,
         is_final=is_final,
     )
 
 
-def _create_exam_package_file(
+async def _get_exam_package_file_infos(
     api_scheduled_exam_package,
-) -> typing.Tuple[str, typing.Set[str]]:
+) -> typing.Tuple[str, typing.List[typing.Dict], typing.Set[str]]:
     exam_file_infos = []
     for api_scheduled_exam_external_id in api_scheduled_exam_package[
         "scheduled_exam_external_ids"
     ]:
-        api_scheduled_exam = ktp_controller.api.client.get_scheduled_exam(
+        api_scheduled_exam = await ktp_controller.api.asyncclient.get_scheduled_exam(
             api_scheduled_exam_external_id
         )
         exam_file_infos.append(api_scheduled_exam["exam_file_info"])
 
-    decrypt_codes: typing.Set[str] = set()
-    exam_package_filepath = ktp_controller.files.get_local_filepath(
-        ktp_controller.files.LocalFilepathType.EXAM_PACKAGE,
-        api_scheduled_exam_package["external_id"],
-        hashlib.sha256(
-            "".join(sorted([i["sha256"] for i in exam_file_infos])).encode("ascii")
-        ).hexdigest(),
+    decrypt_codes = {i["decrypt_code"] for i in exam_file_infos}
+    exam_package_filepath = ktp_controller.agent.package.get_exam_package_filepath(
+        api_scheduled_exam_package["external_id"], exam_file_infos
     )
 
-    with ktp_controller.utils.open_atomic_write(
-        exam_package_filepath
-    ) as exam_package_file:
-        with zipfile.ZipFile(exam_package_file, "w") as exam_package_file_zip:
-            for exam_file_info in exam_file_infos:
-                exam_package_file_zip.write(
-                    ktp_controller.files.get_local_filepath(
-                        ktp_controller.files.LocalFilepathType.EXAM_FILE,
-                        exam_file_info["external_id"],
-                        exam_file_info["sha256"],
-                    ),
-                    ktp_controller.utils.utcnow_str() + exam_file_info["name"],
-                )
-                decrypt_codes.add(exam_file_info["decrypt_code"])
+    return exam_package_filepath, exam_file_infos, decrypt_codes
+
+
+def _build_and_upload_exam_package(
+    exam_package_filepath: str,
+    exam_file_infos: typing.List[typing.Dict],
+    *,
+    verification_index: ktp_controller.agent.verification.VerificationIndex,
+) -> typing.List[str]:
+    # Packages are built deterministically, so a retried prepare reuses
+    # the package built on the first try, or by the prebuilder. If there
+    # is none, the package is built straight into the request body, and
+    # saved to the disk on the way. Its exact size is known beforehand,
+    # so that the request has Content-Length.
+    with ktp_controller.agent.package.open_exam_package_stream(
+        exam_package_filepath,
+        exam_file_infos,
+        verification_index=verification_index,
+    ) as (chunks, size):
+        _LOGGER.info("Uploading exam package %r.", exam_package_filepath)
+        return ktp_controller.abitti2.client.upload_exam_package_stream(
+            os.path.basename(exam_package_filepath), chunks, size=size
+        )
 
-    return exam_package_filepath, decrypt_codes
 
+async def _upload_exam_package(
+    exam_package_filepath: str,
+    exam_file_infos: typing.List[typing.Dict],
+    *,
+    verification_index: ktp_controller.agent.verification.VerificationIndex,
+) -> typing.Set[str]:
+    exam_filenames = await asyncio.to_thread(
+        _build_and_upload_exam_package,
+        exam_package_filepath,
+        exam_file_infos,
+        verification_index=verification_index,
+    )
+
+    return set(exam_filenames)
+
+
+def _is_exam_session_ended(student: typing.Dict[str, typing.Any]) -> bool:
+    return (
+        student.get("examFinished", False)
+        or student.get("sessionStatus") == "session_ended"
+    )
+
+
+async def _stop_exam_sessions(
+    students: typing.List[typing.Dict[str, typing.Any]], *, concurrency: int
+) -> None:
+    # Sessions which have ended already need not be stopped again.
+    session_uuids = list(
+        dict.fromkeys(
+            s["sessionUuid"] for s in students if not _is_exam_session_ended(s)
+        )
+    )
+    if not session_uuids:
+        return
+
+    results = await ktp_controller.utils.gather_bounded(
+        [
+            ktp_controller.abitti2.asyncclient.stop_exam_session(session_uuid)
+            for session_uuid in session_uuids
+        ],
+        limit=concurrency,
+        return_exceptions=True,
+    )
+
+    errors = []
+    for session_uuid, result in zip(session_uuids, results):
+        if isinstance(result, Exception):
+            _LOGGER.error("failed to stop exam session %s: %r", session_uuid, result)
+            errors.append(result)
 
-def _set_current_exam_package_state(
+    _LOGGER.info(
+        "Stopped %d/%d exam sessions.",
+        len(session_uuids) - len(errors),
+        len(session_uuids),
+    )
+
+    if errors:
+        raise errors[0]
+
+
+async def _set_current_exam_package_state(
     current_exam_package: typing.Dict[str, typing.Any], next_state: str
 ) -> bool:
-    last_state = ktp_controller.api.client.set_current_exam_package_state(
+    last_state = await ktp_controller.api.asyncclient.set_current_exam_package_state(
         current_exam_package["external_id"], next_state
     )
 
@@ -126,32 +218,18 @@ def _set_current_exam_package_state(
     return last_state != next_state
 
 
-def _allow_students_to_use_browsers(students):
-    for student in students:
-        student_uuid = student["studentUuid"]
-        session_uuid = student["sessionUuid"]
-        student_status = student["studentStatus"]
-
-        if student_status != "waiting-for-auth-browser":
-            continue
+_TRAFFIC_COUNTER_NAMES = (
+    "messages_received",
+    "messages_sent",
+    "bytes_received",
+    "bytes_sent",
+)
 
-        try:
-            ktp_controller.abitti2.client.set_exam_session_permission_to_use_browsers(
-                session_uuid, True
-            )
-        except Exception:  # pylint: disable=broad-exception-caught
-            _LOGGER.error(
-                "failed to allow student %s to use browsers in session %s",
-                student_uuid,
-                session_uuid,
-            )
-            continue
 
-        _LOGGER.info(
-            "allowed student %s to use browsers in session %s",
-            student_uuid,
-            session_uuid,
-        )
+def _get_traffic_counts(
+    connection_stats: ktp_controller.agent.stats.ConnectionStats,
+) -> typing.Dict[str, int]:
+    return {key: getattr(connection_stats, key) for key in _TRAFFIC_COUNTER_NAMES}
 
 
 class Trigger(str, enum.Enum):
@@ -195,6 +273,7 @@ class Agent:
         approx_api_status_report_interval_sec: int = 30,
         approx_examomatic_ping_interval_sec: int = 30,
         approx_restart_timeout_sec: int = 5,
+        transition_retry_interval_sec: int = 5,
         state: ktp_controller.agent.state.AgentState,
     ):
         self.__state = state
@@ -206,6 +285,67 @@ class Agent:
         self.__approx_examomatic_ping_interval_sec = approx_examomatic_ping_interval_sec
         self.__approx_restart_timeout_sec = approx_restart_timeout_sec
 
+        # Transitions of the current exam package are triggered by
+        # time (scheduler, pongs) and by commands, one at a time.
+        self.__work_lock = asyncio.Lock()
+        self.__scheduler = ktp_controller.agent.scheduler.TransitionScheduler(
+            is_auto_control_enabled=lambda: self.__is_auto_control_enabled,
+            retry_interval_sec=transition_retry_interval_sec,
+        )
+
+        # Checksums of downloaded exam files are cached here, so that
+        # unchanged files are not re-hashed on every exam refresh.
+        self.__verification_index = (
+            ktp_controller.agent.verification.VerificationIndex()
+        )
+        self.__exam_file_content_locks: typing.DefaultDict[str, asyncio.Lock] = (
+            collections.defaultdict(asyncio.Lock)
+        )
+        # Answers are downloaded from Abitti2 by backups and by
+        # archiving, one at a time. This is not the work lock, because
+        # a backup may take minutes, and transitions must not wait for
+        # it.
+        self.__answers_transfer_lock = asyncio.Lock()
+        # (exam package external id, answers file SHA256) of the last
+        # non-final answers backup.
+        self.__last_answers_backup: typing.Tuple[str, str] | None = None
+
+        self.__prebuilder = ktp_controller.agent.prebuild.ExamPackagePrebuilder(
+            verification_index=self.__verification_index,
+            lead_time_sec=SETTINGS.exam_package_prebuild_lead_time_sec,
+        )
+
+        self.__browser_permission_granter = (
+            ktp_controller.agent.grants.BrowserPermissionGranter(
+                concurrency=SETTINGS.abitti2_browser_permission_grant_concurrency
+            )
+        )
+
+        # Status reports which could not be sent are delivered later,
+        # in order.
+        self.__status_report_outbox = ktp_controller.agent.outbox.Outbox(
+            ktp_controller.examomatic.asyncclient.send_abitti2_status_report,
+            max_size=SETTINGS.status_report_outbox_max_size,
+        )
+        self.__status_reporter = ktp_controller.agent.reporter.StatusReporter(
+            self.__status_report_outbox.send,
+            heartbeat_interval_sec=SETTINGS.examomatic_status_report_heartbeat_sec,
+        )
+
+        # API pushes invalidations of the current exam package over the
+        # websocket, so it is fetched only when it has changed. A package
+        # promoted by the fetch itself is in the response already, so
+        # the fetch does not invalidate the snapshot.
+        self.__current_exam_package = ktp_controller.agent.snapshot.Snapshot(
+            functools.partial(
+                ktp_controller.api.asyncclient.get_current_exam_package,
+                notify_agents=False,
+            )
+        )
+        # Agent is the only one sending status reports to API, so the
+        # last one sent is also the last one stored by API.
+        self.__last_abitti2_status_report: typing.Dict[str, typing.Any] | None = None
+
         # Abitti2 reports these
         self.__last_received_exam_list = None
         self.__last_received_security_code = None
@@ -213,6 +353,21 @@ class Agent:
         self.__connection_stats: typing.Dict[
             Component, ktp_controller.agent.stats.ConnectionStats
         ] = {}
+        self.__loop_lag_monitor = ktp_controller.agent.watchdog.LoopLagMonitor(
+            threshold_sec=SETTINGS.agent_loop_lag_threshold_sec
+        )
+
+        # Metrics which outlive connections:
+        self.__connect_counts: typing.Counter[Component] = collections.Counter()
+        self.__traffic_totals: typing.DefaultDict[Component, typing.Counter[str]] = (
+            collections.defaultdict(collections.Counter)
+        )
+        self.__handler_latency_stats: typing.Dict[
+            typing.Tuple[str, str], ktp_controller.metrics.LatencyStats
+        ] = {}
+        self.__last_transition_durations: typing.Dict[typing.Tuple[str, str], float] = (
+            {}
+        )
         self.__commands = {
             str(
                 ktp_controller.messages.Command.ENABLE_AUTO_CONTROL
@@ -254,6 +409,7 @@ class Agent:
             _LOGGER.info(
                 "Auto control is now %s.", "enabled" if enabled else "disabled"
             )
+            self.__scheduler.wake_up()
             command_status = ktp_controller.messages.CommandStatus.OK
         else:
             command_status = ktp_controller.messages.CommandStatus.OK_NO_CHANGE
@@ -316,18 +472,48 @@ class Agent:
             command_uuid=command_uuid, command_status=command_status
         )
 
-    def __prepare_current_exam_package(
+    @contextlib.contextmanager
+    def __measure_handler(
+        self, component: Component, message_kind: str
+    ) -> typing.Iterator[None]:
+        started_at = time.monotonic()
+        is_error = True
+        try:
+            yield
+            is_error = False
+        finally:
+            self.__handler_latency_stats.setdefault(
+                (str(component), str(message_kind)),
+                ktp_controller.metrics.LatencyStats(),
+            ).record(time.monotonic() - started_at, is_error=is_error)
+
+    async def __get_last_abitti2_status_report(
+        self,
+    ) -> typing.Dict[str, typing.Any] | None:
+        if self.__last_abitti2_status_report is None:
+            return await ktp_controller.api.asyncclient.get_last_abitti2_status_report()
+        return copy.deepcopy(self.__last_abitti2_status_report)
+
+    async def __prepare_current_exam_package(
         self,
         current_exam_package: typing.Dict[str, typing.Any],
     ) -> bool:
-        (exam_package_filepath, decrypt_codes) = _create_exam_package_file(
-            current_exam_package
+        (exam_package_filepath, exam_file_infos, decrypt_codes) = (
+            await _get_exam_package_file_infos(current_exam_package)
         )
         if self.__is_auto_control_enabled:
             # Change automatically when exam package is prepared.
-            ktp_controller.abitti2.client.change_single_security_code()
-        exam_filenames = ktp_controller.abitti2.client.prepare_exam_package(
-            exam_package_filepath, decrypt_codes
+            await ktp_controller.abitti2.asyncclient.change_single_security_code()
+        exam_filenames = (
+            await ktp_controller.abitti2.asyncclient.decrypt_uploaded_exams(
+                await _upload_exam_package(
+                    exam_package_filepath,
+                    exam_file_infos,
+                    verification_index=self.__verification_index,
+                ),
+                decrypt_codes,
+                concurrency=SETTINGS.abitti2_decrypt_concurrency,
+            )
         )
         _LOGGER.info(
             "Prepared current exam package %r (%d exams) successfully.",
@@ -337,11 +523,11 @@ class Agent:
 
         return True
 
-    def __start_current_exam_package(
+    async def __start_current_exam_package(
         self,
         current_exam_package: typing.Dict[str, typing.Any],
     ) -> bool:
-        ktp_controller.abitti2.client.start_decrypted_exams()
+        await ktp_controller.abitti2.asyncclient.start_decrypted_exams()
         _LOGGER.info(
             "Started current exam package %r successfully.",
             current_exam_package["external_id"],
@@ -349,24 +535,23 @@ class Agent:
 
         return True
 
-    def __stop_current_exam_package(
+    async def __stop_current_exam_package(
         self,
         current_exam_package: typing.Dict[str, typing.Any],
     ) -> bool:
         if self.__is_auto_control_enabled:
             # Change the security code first to ensure students cannot enter anymore.
-            ktp_controller.abitti2.client.change_single_security_code()
+            await ktp_controller.abitti2.asyncclient.change_single_security_code()
 
-        abitti2_status_report = (
-            ktp_controller.api.client.get_last_abitti2_status_report()
+        abitti2_status_report = await self.__get_last_abitti2_status_report()
+        await _stop_exam_sessions(
+            abitti2_status_report["status"]["data"]["students"],
+            concurrency=SETTINGS.abitti2_stop_exam_session_concurrency,
         )
-        for student in abitti2_status_report["status"]["data"]["students"]:
-            ktp_controller.abitti2.client.stop_exam_session(student["sessionUuid"])
 
         is_stopped = (
             all(
-                s.get("examFinished", False)
-                or s.get("sessionStatus") == "session_ended"
+                _is_exam_session_ended(s)
                 for s in abitti2_status_report["status"]["data"]["students"]
             )
             and current_exam_package["state"] == "stopping"
@@ -387,26 +572,42 @@ class Agent:
 
         return is_stopped
 
-    def __archive_current_exam_package(
+    async def __begin_stopping_current_exam_package(
         self,
         current_exam_package: typing.Dict[str, typing.Any],
     ) -> bool:
-        abitti2_status_report = (
-            ktp_controller.api.client.get_last_abitti2_status_report()
-        )
+        await self.__stop_current_exam_package(current_exam_package)
+        return True
+
+    async def __archive_current_exam_package(
+        self,
+        current_exam_package: typing.Dict[str, typing.Any],
+    ) -> bool:
+        abitti2_status_report = await self.__get_last_abitti2_status_report()
         if abitti2_status_report["status"]["data"]["answerPaperCount"] > 0:
-            _transfer_answers(
-                current_exam_package["external_id"],
-                is_final=ktp_controller.examomatic.client.IsFinal.TRUE,
-            )
+            async with self.__answers_transfer_lock:
+                await _transfer_answers(
+                    current_exam_package["external_id"],
+                    is_final=ktp_controller.examomatic.client.IsFinal.TRUE,
+                )
         else:
             # If there are no answers, Abitti2 blocks download
             # requests indefinitely.
             _LOGGER.warning("There are no answers to download.")
-        ktp_controller.abitti2.client.reset()
+        await ktp_controller.abitti2.asyncclient.reset()
+        return True
+
+    async def __keep_current_exam_package_archived(  # pylint: disable=unused-argument
+        self,
+        current_exam_package: typing.Dict[str, typing.Any],
+    ) -> bool:
         return True
 
     async def __work_on_current_exam_package(self, *, trigger: Trigger) -> bool:
+        async with self.__work_lock:
+            return await self.__do_work_on_current_exam_package(trigger=trigger)
+
+    async def __do_work_on_current_exam_package(self, *, trigger: Trigger) -> bool:
         utcnow = ktp_controller.utils.utcnow()
         trigger = Trigger(trigger)  # Raises ValueError if trigger is not a Trigger.
 
@@ -418,12 +619,13 @@ class Agent:
                 "and reported by upper levels in the call stack."
             )
 
-        current_exam_package = ktp_controller.api.client.get_current_exam_package()
+        current_exam_package = await self.__current_exam_package.get()
+        self.__scheduler.update_current_exam_package(current_exam_package)
 
         if current_exam_package is None:
             if self.__is_auto_control_enabled and self.__last_received_exam_list == []:
                 _LOGGER.info("Reseting Abitti2 with a dummy exam package...")
-                ktp_controller.abitti2.client.reset()
+                await ktp_controller.abitti2.asyncclient.reset()
                 _LOGGER.info("Abitti2 was reset.")
             return False  # No current exam package
 
@@ -476,9 +678,7 @@ class Agent:
                         )
                     )
                 ),
-                "action": lambda *args: (
-                    self.__stop_current_exam_package(*args) or True
-                ),
+                "action": self.__begin_stopping_current_exam_package,
                 "next_state": "stopping",
             },
             "stopping": {
@@ -499,7 +699,7 @@ class Agent:
             "archived": {
                 "valid_triggers": (Trigger.TIME,),
                 "time_condition": True,
-                "action": lambda *args: True,
+                "action": self.__keep_current_exam_package_archived,
                 "next_state": "archived",
             },
         }
@@ -521,10 +721,17 @@ class Agent:
                 transition["time_condition"],
                 transition["action"],
             )
-            if transition["action"](current_exam_package):
-                changed = _set_current_exam_package_state(
+            started_at = time.monotonic()
+            if await transition["action"](current_exam_package):
+                changed = await _set_current_exam_package_state(
                     current_exam_package, transition["next_state"]
                 )
+                # API pushes an invalidation too, but the next work
+                # must not race with it.
+                self.__current_exam_package.invalidate()
+            self.__last_transition_durations[(str(state), transition["next_state"])] = (
+                time.monotonic() - started_at
+            )
 
         if changed:
             _LOGGER.debug(
@@ -532,6 +739,7 @@ class Agent:
                 state,
                 transition["next_state"],
             )
+            self.__scheduler.update_current_exam_package(current_exam_package)
         return changed
 
     async def __send_pings_to_api(self, websock):
@@ -545,7 +753,13 @@ class Agent:
         while True:
             message = ktp_controller.messages.StatusReportMessage(
                 data=ktp_controller.messages.StatusReportData(
-                    is_auto_control_enabled=self.__is_auto_control_enabled
+                    is_auto_control_enabled=self.__is_auto_control_enabled,
+                    loop_lag_events=[
+                        ktp_controller.messages.LoopLagEventData(
+                            detected_at=e.detected_at, lag_sec=e.lag_sec, stack=e.stack
+                        )
+                        for e in self.__loop_lag_monitor.events
+                    ],
                 ),
             ).model_dump_json()
             await websock.send(message)
@@ -566,6 +780,13 @@ class Agent:
             await asyncio.sleep(self.__approx_examomatic_ping_interval_sec)
 
     async def __communicate_with_api(self, websock):
+        self.__current_exam_package.subscribe()
+        try:
+            await self.__do_communicate_with_api(websock)
+        finally:
+            self.__current_exam_package.unsubscribe()
+
+    async def __do_communicate_with_api(self, websock):
         async for data in websock:
             _LOGGER.debug("<-- API: %s", data)
             try:
@@ -577,14 +798,16 @@ class Agent:
                 continue
 
             if message["kind"] == "command":
+                received_at = time.time()
                 command_data = ktp_controller.messages.CommandData.model_validate(
                     message["data"]
                 )
                 _LOGGER.info("Executing command %r...", command_data.command)
                 try:
-                    command_result = await self.__commands[command_data.command](
-                        message["uuid"], command_data
-                    )
+                    with self.__measure_handler(Component.API, message["kind"]):
+                        command_result = await self.__commands[command_data.command](
+                            message["uuid"], command_data
+                        )
                 except Exception:  # pylint: disable=broad-exception-caught
                     _LOGGER.exception(
                         "Executing command %r failed", command_data.command
@@ -598,23 +821,49 @@ class Agent:
                     _LOGGER.info(
                         "Executed command %r successfully.", command_data.command
                     )
-                await websock.send(
-                    ktp_controller.messages.CommandResultMessage(
-                        kind=ktp_controller.messages.MessageKind.COMMAND_RESULT,
-                        data=command_result,
-                    ).model_dump_json()
+                ktp_controller.tracing.record_span(
+                    "agent.execute_command",
+                    message["uuid"],
+                    received_at,
+                    time.time(),
+                    command=command_data.command,
+                    command_status=command_result.command_status,
                 )
+                with ktp_controller.tracing.span(
+                    "agent.send_command_result", message["uuid"]
+                ):
+                    await websock.send(
+                        ktp_controller.messages.CommandResultMessage(
+                            kind=ktp_controller.messages.MessageKind.COMMAND_RESULT,
+                            data=command_result,
+                        ).model_dump_json()
+                    )
                 _LOGGER.info("Sent command result %r successfully.", command_result)
                 continue
 
+            if message["kind"] == "invalidation":
+                invalidation_data = (
+                    ktp_controller.messages.InvalidationData.model_validate(
+                        message["data"]
+                    )
+                )
+                if (
+                    invalidation_data.invalidation
+                    == ktp_controller.messages.Invalidation.CURRENT_EXAM_PACKAGE
+                ):
+                    self.__current_exam_package.invalidate()
+                continue
+
             if message["kind"] == "pong":
-                # Whenever we get ponged, it's a sign for us to do
-                # some auto control work. So, keep ping pong interval
-                # quite short. This could be replaced with more
-                # sophisticated scheduling logic, but for now,
-                # ping-pong scheduling is good enough.
+                # Transitions are triggered by the scheduler exactly
+                # at their deadlines, pongs are just a safety net in
+                # case something was missed. No need to queue up
+                # behind an ongoing transition, though.
+                if self.__work_lock.locked():
+                    continue
                 try:
-                    await self.__work_on_current_exam_package(trigger=Trigger.TIME)
+                    with self.__measure_handler(Component.API, message["kind"]):
+                        await self.__work_on_current_exam_package(trigger=Trigger.TIME)
                 except _UsageError as usage_error:
                     _LOGGER.error(
                         "automatic work on the current exam package filed: %s",
@@ -648,7 +897,7 @@ class Agent:
                     self.__connection_stats[Component.EXAMOMATIC].refresh_exams_count
                     == 0
                 ):
-                    self.__refresh_exams(is_spontaneous=True)
+                    await self.__refresh_exams(is_spontaneous=True)
                 continue
 
             if message["type"] == "change_keycode":
@@ -658,11 +907,11 @@ class Agent:
                         "Keycode cannot be changed by Exam-O-Matic, because auto control is not enabled."
                     )
                     continue  # TODO: is ok to not ack this message because we cannot fulfil it?
-                ktp_controller.abitti2.client.change_single_security_code()
+                await ktp_controller.abitti2.asyncclient.change_single_security_code()
                 _LOGGER.info("Keycode changed.")
             elif message["type"] == "refresh_exams":
                 _LOGGER.info("received refresh_exams message from Exam-O-Matic")
-                self.__refresh_exams(is_spontaneous=False)
+                await self.__refresh_exams(is_spontaneous=False)
             else:
                 _LOGGER.error(
                     "received message of unknown type %r from Exam-O-Matic",
@@ -715,7 +964,7 @@ class Agent:
             self.__validate_abitti2_stats_message(message)
             and self.__is_auto_control_enabled
         ):
-            _allow_students_to_use_browsers(message["data"]["students"])
+            await self.__browser_permission_granter.grant(message["data"]["students"])
 
         message["singleSecurityCode"] = self.__last_received_security_code
 
@@ -727,7 +976,7 @@ class Agent:
 
         try:
             abitti2_version = (
-                ktp_controller.abitti2.client.get_current_abitti2_version()
+                await ktp_controller.abitti2.asyncclient.get_cached_abitti2_version()
             )
         except Exception:  # pylint: disable=broad-exception-caught
             _LOGGER.exception("failed to get current Abitti2 version")
@@ -741,15 +990,14 @@ class Agent:
             "exams": self.__last_received_exam_list,
         }
 
-        try:
-            ktp_controller.examomatic.client.send_abitti2_status_report(status_report)
-            status_report["reported_at"] = ktp_controller.utils.utcnow_str()
-            _LOGGER.info("sent Abitti2 status report to Exam-O-Matic")
-        except Exception:  # pylint: disable=broad-exception-caught
-            _LOGGER.exception("failed to send Abitti2 status report to Exam-O-Matic")
-            status_report["reported_at"] = None
+        # Exam-O-Matic gets only changed reports and heartbeats, but the
+        # local API stores every report.
+        status_report["reported_at"] = await self.__status_reporter.report(
+            status_report
+        )
 
-        ktp_controller.api.client.send_abitti2_status_report(status_report)
+        await ktp_controller.api.asyncclient.send_abitti2_status_report(status_report)
+        self.__last_abitti2_status_report = status_report
         _LOGGER.info("sent Abitti2 status report to KTP Controller API")
 
     async def __handle_abitti2_exams_message(
@@ -779,6 +1027,10 @@ class Agent:
             return (None, None)
 
     async def __communicate_with_abitti2(self, websock):
+        # Abitti2 might have been upgraded while the connection was
+        # down.
+        ktp_controller.abitti2.client.invalidate_cached_abitti2_version()
+
         async for data in websock:
             received_at = ktp_controller.utils.utcnow()
 
@@ -802,7 +1054,8 @@ class Agent:
             _LOGGER.info("received %r message from Abitti2", message_type)
 
             try:
-                await handler(websock, received_at, message)
+                with self.__measure_handler(Component.ABITTI2, message_type):
+                    await handler(websock, received_at, message)
             except Exception:  # pylint: disable=broad-exception-caught
                 _LOGGER.exception(
                     "failed to handle %r message from Abitti2: %r",
@@ -825,12 +1078,17 @@ class Agent:
                     url,
                     additional_headers=additional_headers,
                 ) as websock:
-                    self.__connection_stats[name] = connection_stats_class(
+                    connection_stats = connection_stats_class(
                         ktp_controller.utils.utcnow()
                     )
+                    self.__connection_stats[name] = connection_stats
+                    self.__connect_counts[name] += 1
+                    counting_websock = ktp_controller.agent.stats.CountingWebsocket(
+                        websock, connection_stats
+                    )
                     async with asyncio.TaskGroup() as tg:
                         for asyncfunc in asyncfuncs:
-                            tg.create_task(asyncfunc(websock))
+                            tg.create_task(asyncfunc(counting_websock))
             except ExceptionGroup as eg:
                 _LOGGER.error(
                     "Websocket connection to %s has failed!",
@@ -844,7 +1102,11 @@ class Agent:
                 )
                 await asyncio.sleep(self.__approx_restart_timeout_sec)
             finally:
-                self.__connection_stats.pop(name, None)
+                connection_stats = self.__connection_stats.pop(name, None)
+                if connection_stats is not None:
+                    self.__traffic_totals[name].update(
+                        _get_traffic_counts(connection_stats)
+                    )
 
     async def __maintain_websocket_connection_to_api(self):
         await self.__maintain_websocket_connection(
@@ -881,7 +1143,7 @@ class Agent:
             additional_headers=ktp_controller.abitti2.client.get_basic_auth(),
         )
 
-    def __ensure_exam_file_exists(self, eom_scheduled_exam):
+    async def __ensure_exam_file_exists(self, eom_scheduled_exam):
         _LOGGER.info(
             "ensuring exam file %r (file_uuid=%s) exists",
             eom_scheduled_exam["file_name"],
@@ -909,8 +1171,12 @@ class Agent:
             os.rename(
                 filepath, f"{filepath}.incorrect_size-{utcnow}"
             )  # Saved for possible investigation.
+            self.__verification_index.forget(filepath)
             do_download = True
-        elif ktp_controller.utils.sha256(filepath) != eom_scheduled_exam["file_sha256"]:
+        elif (
+            await asyncio.to_thread(self.__verification_index.get_sha256, filepath)
+            != eom_scheduled_exam["file_sha256"]
+        ):
             _LOGGER.warning(
                 "exam file %r (file_uuid=%s) is already downloaded, "
                 "but Exam-O-Matic claims it has incorrect SHA256 checksum, re-downloading it now",
@@ -920,20 +1186,26 @@ class Agent:
             os.rename(
                 filepath, f"{filepath}.incorrect_sha256-{utcnow}"
             )  # Saved for possible investigation.
+            self.__verification_index.forget(filepath)
             do_download = True
 
         if do_download:
-            _LOGGER.info(
-                "starting to download exam file %r (file_uuid=%s) to %r",
-                eom_scheduled_exam["file_name"],
-                eom_scheduled_exam["file_uuid"],
+            # Linked with the lock held, so that the content cannot be
+            # replaced by a concurrent re-download in between.
+            async with self.__exam_file_content_locks[
+                eom_scheduled_exam["file_sha256"]
+            ]:
+                content_filepath = await self.__ensure_exam_file_content_exists(
+                    eom_scheduled_exam
+                )
+                os.link(content_filepath, filepath)
+            await asyncio.to_thread(
+                self.__verification_index.record,
                 filepath,
-            )
-            ktp_controller.examomatic.client.download_exam_file(
-                eom_scheduled_exam["file_sha256"], filepath
+                eom_scheduled_exam["file_sha256"],
             )
             _LOGGER.info(
-                "downloaded exam file %r (file_uuid=%s) successfully to %r",
+                "linked exam file %r (file_uuid=%s) to %r",
                 eom_scheduled_exam["file_name"],
                 eom_scheduled_exam["file_uuid"],
                 filepath,
@@ -945,14 +1217,85 @@ class Agent:
                 eom_scheduled_exam["file_uuid"],
                 filepath,
             )
+            # Exam files downloaded before the content store existed
+            # are added to it, so that they can be shared too.
+            content_filepath = _get_exam_file_content_filepath(
+                eom_scheduled_exam["file_sha256"]
+            )
+            async with self.__exam_file_content_locks[
+                eom_scheduled_exam["file_sha256"]
+            ]:
+                if not os.path.exists(content_filepath):
+                    os.link(filepath, content_filepath)
+                    await asyncio.to_thread(
+                        self.__verification_index.record,
+                        content_filepath,
+                        eom_scheduled_exam["file_sha256"],
+                    )
+
+    async def __ensure_exam_file_content_exists(self, eom_scheduled_exam) -> str:
+        # Must be called with the content lock of the SHA256 held. Same
+        # content might be scheduled under multiple file UUIDs, and
+        # those are ensured concurrently.
+        sha256sum = eom_scheduled_exam["file_sha256"]
+        content_filepath = _get_exam_file_content_filepath(sha256sum)
+
+        if os.path.exists(content_filepath):
+            if (
+                os.path.getsize(content_filepath) == eom_scheduled_exam["file_size"]
+                and await asyncio.to_thread(
+                    self.__verification_index.get_sha256, content_filepath
+                )
+                == sha256sum
+            ):
+                _LOGGER.info(
+                    "exam file %r (file_uuid=%s) content already exists at %r, "
+                    "skipping download",
+                    eom_scheduled_exam["file_name"],
+                    eom_scheduled_exam["file_uuid"],
+                    content_filepath,
+                )
+                return content_filepath
+
+            _LOGGER.warning(
+                "exam file content %r is corrupted, re-downloading it now",
+                content_filepath,
+            )
+            os.rename(
+                content_filepath,
+                f"{content_filepath}.corrupted-{ktp_controller.utils.utcnow_str()}",
+            )  # Saved for possible investigation.
+            self.__verification_index.forget(content_filepath)
 
-    def __refresh_exams(self, *, is_spontaneous: bool):
+        _LOGGER.info(
+            "starting to download exam file %r (file_uuid=%s) to %r",
+            eom_scheduled_exam["file_name"],
+            eom_scheduled_exam["file_uuid"],
+            content_filepath,
+        )
+        await ktp_controller.examomatic.asyncclient.download_exam_file(
+            sha256sum, content_filepath
+        )
+        # Checksum was verified while downloading.
+        await asyncio.to_thread(
+            self.__verification_index.record, content_filepath, sha256sum
+        )
+        _LOGGER.info(
+            "downloaded exam file %r (file_uuid=%s) successfully to %r",
+            eom_scheduled_exam["file_name"],
+            eom_scheduled_exam["file_uuid"],
+            content_filepath,
+        )
+
+        return content_filepath
+
+    async def __refresh_exams(self, *, is_spontaneous: bool):
         _LOGGER.info(
             "Starting %sexam refresh...", "spontaneous " if is_spontaneous else ""
         )
 
         try:
-            eom_exam_info = ktp_controller.examomatic.client.get_exam_info()
+            eom_exam_info = await ktp_controller.examomatic.asyncclient.get_exam_info()
         except requests.exceptions.HTTPError as http_error:
             if http_error.response.status_code == 404:
                 if is_spontaneous:
@@ -970,13 +1313,233 @@ class Agent:
 
         _LOGGER.debug("Received exam info from Exam-O-Matic: %s:", eom_exam_info)
 
-        for eom_scheduled_exam in eom_exam_info["schedules"]:
-            self.__ensure_exam_file_exists(eom_scheduled_exam)
+        # Exam info is saved only after all exam files are ready, so
+        # that every package API considers current can be prepared.
+        await ktp_controller.agent.prefetch.prefetch_exam_files(
+            ktp_controller.agent.prefetch.get_prefetch_order(eom_exam_info),
+            self.__ensure_exam_file_exists,
+            concurrency=SETTINGS.exam_file_prefetch_concurrency,
+        )
 
-        ktp_controller.api.client.save_exam_info(eom_exam_info)
+        await ktp_controller.api.asyncclient.save_exam_info(eom_exam_info)
+        self.__current_exam_package.invalidate()
+        self.__scheduler.update_exam_info(eom_exam_info)
+        self.__prebuilder.update_exam_info(eom_exam_info)
 
         _LOGGER.info("refreshed exams successfully")
 
+    async def __work_on_schedule(self):
+        while True:
+            await self.__scheduler.wait_for_next_deadline()
+            try:
+                await self.__work_on_current_exam_package(trigger=Trigger.TIME)
+            except _UsageError as usage_error:
+                _LOGGER.error(
+                    "scheduled work on the current exam package failed: %s",
+                    usage_error,
+                )
+            except Exception:  # pylint: disable=broad-exception-caught
+                # Scheduler is retrying soon, and connections to other
+                # components should not be torn down because of this.
+                _LOGGER.exception("scheduled work on the current exam package failed")
+
+    async def __scan_exam_file_integrity(self):
+        interval_sec = SETTINGS.exam_file_integrity_scan_interval_sec
+        if interval_sec == 0:
+            _LOGGER.info("Exam file integrity scan is disabled.")
+            return
+
+        while True:
+            await asyncio.sleep(interval_sec)
+            _LOGGER.info("Starting exam file integrity scan...")
+            try:
+                corrupted_filepaths = await asyncio.to_thread(
+                    self.__verification_index.scan_integrity
+                )
+            except Exception:  # pylint: disable=broad-exception-caught
+                # The scan is only a safety net, other components
+                # should not be torn down because of it.
+                _LOGGER.exception("Exam file integrity scan failed")
+                continue
+            if corrupted_filepaths:
+                # Corrupted files get re-downloaded on the next exam
+                # refresh, because their checksums do not match
+                # anymore.
+                _LOGGER.error(
+                    "Exam file integrity scan found %d corrupted files: %s",
+                    len(corrupted_filepaths),
+                    corrupted_filepaths,
+                )
+            else:
+                _LOGGER.info("Exam file integrity scan found no corrupted files.")
+
+    async def __back_up_answers_once(self) -> None:
+        current_exam_package = await self.__current_exam_package.get()
+        if current_exam_package is None or current_exam_package["state"] not in (
+            "running",
+            "stopping",
+        ):
+            return
+
+        abitti2_status_report = await self.__get_last_abitti2_status_report()
+        if (
+            abitti2_status_report is None
+            or abitti2_status_report["status"]["data"]["answerPaperCount"] == 0
+        ):
+            # If there are no answers, Abitti2 blocks download
+            # requests indefinitely.
+            return
+
+        exam_package_external_id = current_exam_package["external_id"]
+        last_sha256sum = None
+        if (
+            self.__last_answers_backup is not None
+            and self.__last_answers_backup[0] == exam_package_external_id
+        ):
+            last_sha256sum = self.__last_answers_backup[1]
+
+        sha256sum = await asyncio.to_thread(
+            ktp_controller.agent.answers.back_up_answers_file,
+            ktp_controller.files.get_local_filepath(
+                ktp_controller.files.LocalFilepathType.ANSWERS_FILE,
+                exam_package_external_id,
+                ktp_controller.utils.utcnow_str() + "_backup",
+            ),
+            exam_package_external_id=exam_package_external_id,
+            last_sha256sum=last_sha256sum,
+        )
+        self.__last_answers_backup = (exam_package_external_id, sha256sum)
+
+    async def __back_up_answers(self):
+        interval_sec = SETTINGS.answers_backup_interval_sec
+        if interval_sec == 0:
+            _LOGGER.info("Answer backups are disabled.")
+            return
+
+        while True:
+            await asyncio.sleep(interval_sec)
+            if self.__answers_transfer_lock.locked():
+                # Final answers are being transferred already.
+                continue
+            try:
+                async with self.__answers_transfer_lock:
+                    await self.__back_up_answers_once()
+            except Exception:  # pylint: disable=broad-exception-caught
+                _LOGGER.exception("Failed to back up answers, retrying later.")
+
+    def __get_connection_metric_families(
+        self,
+    ) -> typing.List[ktp_controller.metrics.MetricFamily]:
+        connected = ktp_controller.metrics.MetricFamily(
+            "ktp_agent_connected",
+            "gauge",
+            "Whether the agent is connected to the component.",
+        )
+        connected_since = ktp_controller.metrics.MetricFamily(
+            "ktp_agent_connected_since_seconds",
+            "gauge",
+            "Unix time when the current connection to the component was made.",
+        )
+        connects = ktp_controller.metrics.MetricFamily(
+            "ktp_agent_connects_total",
+            "counter",
+            "Number of connections made to the component, including reconnects.",
+        )
+        traffic = {
+            key: ktp_controller.metrics.MetricFamily(
+                f"ktp_agent_{key}_total",
+                "counter",
+                f"Number of websocket {key.replace('_', ' ')}.",
+            )
+            for key in _TRAFFIC_COUNTER_NAMES
+        }
+        ping_pongs = ktp_controller.metrics.MetricFamily(
+            "ktp_agent_examomatic_ping_pongs",
+            "gauge",
+            "Number of ping-pongs with Exam-O-Matic in the current connection.",
+        )
+
+        for component in Component:
+            connection_stats = self.__connection_stats.get(component)
+            traffic_counts = collections.Counter(self.__traffic_totals[component])
+            connected.add(int(connection_stats is not None), component=component)
+            connects.add(self.__connect_counts[component], component=component)
+            if connection_stats is not None:
+                connected_since.add(
+                    connection_stats.connected_at.timestamp(), component=component
+                )
+                traffic_counts.update(_get_traffic_counts(connection_stats))
+                if isinstance(
+                    connection_stats,
+                    ktp_controller.agent.stats.ExamomaticConnectionStats,
+                ):
+                    ping_pongs.add(connection_stats.ping_pong_count)
+            for key, metric_family in traffic.items():
+                metric_family.add(traffic_counts[key], component=component)
+
+        return [connected, connected_since, connects, *traffic.values(), ping_pongs]
+
+    def __get_metric_families(self) -> typing.List[ktp_controller.metrics.MetricFamily]:
+        last_transition_duration = ktp_controller.metrics.MetricFamily(
+            "ktp_agent_last_transition_duration_seconds",
+            "gauge",
+            "Duration of the last transition of the current exam package.",
+        )
+        for (from_state, to_state), duration_sec in sorted(
+            self.__last_transition_durations.items()
+        ):
+            last_transition_duration.add(
+                duration_sec, from_state=from_state, to_state=to_state
+            )
+
+        grant_latency = ktp_controller.metrics.MetricFamily(
+            "ktp_agent_browser_permission_grant_duration_seconds",
+            "gauge",
+            "Percentiles of recent browser permission grant durations.",
+        )
+        loop_lag = ktp_controller.metrics.MetricFamily(
+            "ktp_agent_event_loop_lag_seconds",
+            "histogram",
+            "How late the event loop wakes up from short sleeps.",
+        )
+        loop_lag.add_histogram(self.__loop_lag_monitor.histogram)
+
+        latency_samples = self.__browser_permission_granter.latency_samples
+        for name, duration_sec in latency_samples.percentiles().items():
+            grant_latency.add(duration_sec, percentile=name)
+
+        return [
+            *self.__get_connection_metric_families(),
+            *ktp_controller.metrics.get_latency_metric_families(
+                "ktp_agent_handled_messages",
+                "messages handled",
+                ["component", "message_kind"],
+                self.__handler_latency_stats,
+            ),
+            last_transition_duration,
+            grant_latency,
+            loop_lag,
+            *ktp_controller.http.get_request_metric_families("ktp_agent_http_request"),
+        ]
+
+    def __get_metrics_text(self) -> str:
+        return ktp_controller.metrics.format_metric_families(
+            self.__get_metric_families()
+        )
+
+    async def __serve_metrics(self):
+        if SETTINGS.agent_metrics_port == 0:
+            return
+        try:
+            await ktp_controller.agent.metrics.serve_metrics(
+                self.__get_metrics_text,
+                host=SETTINGS.agent_metrics_host,
+                port=SETTINGS.agent_metrics_port,
+            )
+        except OSError:
+            # Metrics are not worth restarting everything for.
+            _LOGGER.exception("failed to serve metrics")
+
     async def forever(self):
         while True:
             _LOGGER.info("Start!")
@@ -986,6 +1549,13 @@ class Agent:
                     tg.create_task(self.__maintain_websocket_connection_to_api())
                     tg.create_task(self.__maintain_websocket_connection_to_abitti2())
                     tg.create_task(self.__maintain_websocket_connection_to_examomatic())
+                    tg.create_task(self.__work_on_schedule())
+                    tg.create_task(self.__scan_exam_file_integrity())
+                    tg.create_task(self.__prebuilder.run())
+                    tg.create_task(self.__back_up_answers())
+                    tg.create_task(self.__status_report_outbox.run())
+                    tg.create_task(self.__serve_metrics())
+                    tg.create_task(self.__loop_lag_monitor.run())
             except* Exception:  # pylint: disable=broad-exception-caught
                 _LOGGER.exception("Operational failure")
                 _LOGGER.error(
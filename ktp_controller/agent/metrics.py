@@ -0,0 +1,93 @@
+# Standard library imports
+import asyncio
+import logging
+import typing
+
+# Third-party imports
+
+# Internal imports
+import ktp_controller.utils
+from ktp_controller.settings import SETTINGS
+
+# Relative imports
+
+__all__ = [
+    "get_metrics_url",
+    "serve_metrics",
+]
+
+
+_LOGGER = logging.getLogger(__file__)
+
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_REQUEST_TIMEOUT_SEC = 5
+
+
+def _format_response(status: str, content_type: str, body: bytes) -> bytes:
+    return (
+        f"HTTP/1.1 {status}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n"
+        "\r\n"
+    ).encode("ascii") + body
+
+
+async def _handle_request(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    get_metrics_text: typing.Callable[[], str],
+) -> None:
+    try:
+        async with asyncio.timeout(_REQUEST_TIMEOUT_SEC):
+            request_line = await reader.readline()
+            # Headers are not needed.
+            while (await reader.readline()).strip():
+                pass
+
+            method, target, *_ = request_line.decode("latin-1").split() + ["", ""]
+            if method != "GET":
+                response = _format_response(
+                    "405 Method Not Allowed", "text/plain", b"method not allowed\n"
+                )
+            elif target.split("?", 1)[0] != "/metrics":
+                response = _format_response(
+                    "404 Not Found", "text/plain", b"not found\n"
+                )
+            else:
+                response = _format_response(
+                    "200 OK", _CONTENT_TYPE, get_metrics_text().encode("utf-8")
+                )
+
+            writer.write(response)
+            await writer.drain()
+    except (TimeoutError, ConnectionError):
+        _LOGGER.debug("metrics request failed", exc_info=True)
+    finally:
+        writer.close()
+
+
+def get_metrics_url() -> str:
+    return ktp_controller.utils.get_url(
+        f"{SETTINGS.agent_metrics_host}:{SETTINGS.agent_metrics_port}",
+        "/metrics",
+        scheme="http",
+    )
+
+
+async def serve_metrics(
+    get_metrics_text: typing.Callable[[], str], *, host: str, port: int
+) -> None:
+    """Serve metrics in Prometheus text format at http://host:port/metrics
+    forever. get_metrics_text is called on every request, so it must be
+    cheap."""
+
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle_request(reader, writer, get_metrics_text),
+        host,
+        port,
+    )
+    _LOGGER.info("Serving metrics at http://%s:%d/metrics", host, port)
+    async with server:
+        await server.serve_forever()
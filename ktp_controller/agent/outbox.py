@@ -0,0 +1,203 @@
+# Standard library imports
+import asyncio
+import json
+import logging
+import os
+import os.path
+import sqlite3
+import threading
+import typing
+
+# Third-party imports
+import requests.exceptions
+
+# Internal imports
+
+# Relative imports
+
+__all__ = [
+    "Outbox",
+    "is_retryable_error",
+]
+
+
+_LOGGER = logging.getLogger(__file__)
+
+_OUTBOX_FILEPATH = os.path.expanduser(
+    "~/.local/share/ktp-controller/status-report-outbox.sqlite"
+)
+
+
+# HTTP client errors which may succeed when retried.
+_RETRYABLE_CLIENT_ERROR_STATUS_CODES = (408, 429)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Return False if retrying cannot fix error, that is, if the
+    message was rejected with a 4xx response other than 408 Request
+    Timeout or 429 Too Many Requests."""
+
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status_code = error.response.status_code
+        return (
+            not 400 <= status_code < 500
+            or status_code in _RETRYABLE_CLIENT_ERROR_STATUS_CODES
+        )
+    return True
+
+
+class Outbox:
+    """Persistent FIFO of messages which could not be sent right away.
+
+    Messages are sent directly while the outbox is empty. Once a send
+    fails, the message and all messages after it are stored in a SQLite
+    database and sent in order by run(), with exponential backoff
+    between failed attempts. Stored messages survive restarts.
+
+    Stored messages are read from the database read_batch_size at a
+    time, but still sent one per request, because Exam-O-Matic takes a
+    single status report per request and has no batch endpoint.
+
+    Messages whose send fails with an error is_retryable returns False
+    for are dropped instead, so that a message which can never be sent
+    does not block the messages after it.
+
+    The outbox holds at most max_size messages. When it is full, the
+    oldest messages are dropped to make room for new ones, because the
+    newest messages describe the current state best.
+
+    Database is accessed in a worker thread, never in the event loop.
+    """
+
+    def __init__(
+        self,
+        send: typing.Callable[[typing.Any], typing.Awaitable],
+        *,
+        outbox_filepath: str = _OUTBOX_FILEPATH,
+        max_size: int = 1000,
+        read_batch_size: int = 20,
+        min_backoff_sec: float = 1,
+        max_backoff_sec: float = 300,
+        is_retryable: typing.Callable[[Exception], bool] = is_retryable_error,
+    ):
+        self.__send = send
+        self.__is_retryable = is_retryable
+        self.__max_size = max_size
+        self.__read_batch_size = read_batch_size
+        self.__min_backoff_sec = min_backoff_sec
+        self.__max_backoff_sec = max_backoff_sec
+
+        self.__wakeup = asyncio.Event()
+        self.__is_draining = False
+
+        os.makedirs(os.path.dirname(outbox_filepath), exist_ok=True)
+        # Used from worker threads, one at a time.
+        self.__connection = sqlite3.connect(outbox_filepath, check_same_thread=False)
+        self.__connection_lock = threading.Lock()
+        with self.__connection:
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS outbox "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, message TEXT NOT NULL)"
+            )
+
+    def __get_size(self) -> int:
+        with self.__connection_lock:
+            (size,) = self.__connection.execute(
+                "SELECT COUNT(*) FROM outbox"
+            ).fetchone()
+        return size
+
+    def __put(self, message: typing.Any) -> int:
+        with self.__connection_lock, self.__connection:
+            self.__connection.execute(
+                "INSERT INTO outbox (message) VALUES (?)", (json.dumps(message),)
+            )
+            return self.__connection.execute(
+                "DELETE FROM outbox WHERE id NOT IN "
+                "(SELECT id FROM outbox ORDER BY id DESC LIMIT ?)",
+                (self.__max_size,),
+            ).rowcount
+
+    def __read_batch(self) -> typing.List[typing.Tuple[int, typing.Any]]:
+        with self.__connection_lock:
+            return [
+                (message_id, json.loads(message))
+                for message_id, message in self.__connection.execute(
+                    "SELECT id, message FROM outbox ORDER BY id LIMIT ?",
+                    (self.__read_batch_size,),
+                )
+            ]
+
+    def __delete(self, message_id: int) -> None:
+        with self.__connection_lock, self.__connection:
+            self.__connection.execute("DELETE FROM outbox WHERE id = ?", (message_id,))
+
+    async def get_size(self) -> int:
+        return await asyncio.to_thread(self.__get_size)
+
+    async def put(self, message: typing.Any) -> None:
+        """Store message to be sent by run()."""
+
+        dropped_count = await asyncio.to_thread(self.__put, message)
+        if dropped_count > 0:
+            _LOGGER.warning(
+                "Outbox is full, dropped %d oldest message(s).", dropped_count
+            )
+        self.__wakeup.set()
+
+    async def send(self, message: typing.Any) -> bool:
+        """Send message directly if the outbox is empty. Otherwise, or if
+        the send fails, store the message to be sent later in order.
+        Return True if the message was sent directly. Messages which
+        were rejected for good are dropped."""
+
+        if not self.__is_draining and await self.get_size() == 0:
+            try:
+                await self.__send(message)
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                if not self.__is_retryable(error):
+                    _LOGGER.exception("message was rejected, dropping it")
+                    return False
+                _LOGGER.exception("failed to send message, storing it to outbox")
+            else:
+                return True
+
+        await self.put(message)
+        return False
+
+    async def __drain(self) -> None:
+        backoff_sec = self.__min_backoff_sec
+        while batch := await asyncio.to_thread(self.__read_batch):
+            for message_id, message in batch:
+                try:
+                    await self.__send(message)
+                except Exception as error:  # pylint: disable=broad-exception-caught
+                    if not self.__is_retryable(error):
+                        # Retrying would block all messages after this
+                        # one forever.
+                        _LOGGER.exception(
+                            "message from outbox was rejected, dropping it"
+                        )
+                    else:
+                        _LOGGER.exception(
+                            "failed to send message from outbox, retrying in %s seconds",
+                            backoff_sec,
+                        )
+                        await asyncio.sleep(backoff_sec)
+                        backoff_sec = min(2 * backoff_sec, self.__max_backoff_sec)
+                        break
+                else:
+                    backoff_sec = self.__min_backoff_sec
+                # The message may have been dropped meanwhile, in which
+                # case this is a no-op.
+                await asyncio.to_thread(self.__delete, message_id)
+
+    async def run(self) -> None:
+        while True:
+            self.__wakeup.clear()
+            self.__is_draining = True
+            try:
+                await self.__drain()
+            finally:
+                self.__is_draining = False
+            await self.__wakeup.wait()
@@ -0,0 +1,501 @@
+# Standard library imports
+import collections
+import contextlib
+import dataclasses
+import hashlib
+import json
+import logging
+import os.path
+import struct
+import threading
+import typing
+import zlib
+
+# Third-party imports
+
+# Internal imports
+import ktp_controller.agent.verification
+import ktp_controller.files
+import ktp_controller.utils
+
+# Relative imports
+
+__all__ = [
+    "build_exam_package_file",
+    "get_compound_sha256",
+    "get_exam_package_filepath",
+    "get_exam_package_members",
+    "get_exam_package_size",
+    "iter_exam_package",
+    "open_exam_package_stream",
+    "write_exam_package",
+]
+
+
+_LOGGER = logging.getLogger(__file__)
+
+# Exam packages are zip archives of stored (uncompressed) members, see
+# APPNOTE.TXT by PKWARE. Member timestamps are fixed, so that packages
+# built from the same exam files are byte-identical.
+_ZIP_DOS_TIME = 0
+_ZIP_DOS_DATE = (1 << 5) | 1  # 1980-01-01
+_ZIP_VERSION = 20
+_ZIP64_VERSION = 45
+_ZIP_MADE_BY_UNIX = 3 << 8
+_ZIP_FLAG_UTF8 = 0x800
+_ZIP_EXTERNAL_ATTR = 0o644 << 16
+# Sizes and offsets from this up are stored in zip64 extra fields, and
+# replaced by the marker in the headers.
+_ZIP64_LIMIT = 0xFFFFFFFF
+_ZIP64_MARKER = 0xFFFFFFFF
+_ZIP64_MAX_ENTRIES = 0xFFFF
+
+_ZIP_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_ZIP_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_ZIP_END_RECORD = struct.Struct("<IHHHHIIH")
+_ZIP64_END_RECORD = struct.Struct("<IQHHIIQQQQ")
+_ZIP64_END_LOCATOR = struct.Struct("<IIQI")
+
+_COPY_CHUNK_SIZE = 1024**2
+
+# Packages can be built by the prebuilder and by prepare at the same
+# time, but each path must be built by one at a time.
+_BUILD_LOCKS: typing.DefaultDict[str, threading.Lock] = collections.defaultdict(
+    threading.Lock
+)
+_BUILD_LOCKS_LOCK = threading.Lock()
+
+
+def get_compound_sha256(exam_file_infos: typing.Iterable[typing.Dict]) -> str:
+    return hashlib.sha256(
+        "".join(sorted([i["sha256"] for i in exam_file_infos])).encode("ascii")
+    ).hexdigest()
+
+
+def get_exam_package_filepath(
+    exam_package_external_id: str, exam_file_infos: typing.Iterable[typing.Dict]
+) -> str:
+    return ktp_controller.files.get_local_filepath(
+        ktp_controller.files.LocalFilepathType.EXAM_PACKAGE,
+        exam_package_external_id,
+        get_compound_sha256(exam_file_infos),
+    )
+
+
+def get_exam_package_members(
+    exam_file_infos: typing.Iterable[typing.Dict],
+) -> typing.List[typing.Tuple[str, str]]:
+    """Return sorted (member name, exam file SHA256) pairs of an exam
+    package. Member names are prefixed with the content checksum to
+    keep them unique within the package."""
+
+    return sorted(
+        (f"{i['sha256'][:16]}_{i['name']}", i["sha256"]) for i in exam_file_infos
+    )
+
+
+@dataclasses.dataclass
+class _ZipEntry:
+    name: bytes
+    flags: int
+    filepath: str
+    size: int
+    offset: int
+
+
+def _get_zip_local_header(entry: _ZipEntry, crc: int) -> bytes:
+    version, size, extra = _ZIP_VERSION, entry.size, b""
+    if entry.size >= _ZIP64_LIMIT:
+        # Local zip64 extra field has both sizes, always.
+        version, size = _ZIP64_VERSION, _ZIP64_MARKER
+        extra = struct.pack("<HHQQ", 1, 16, entry.size, entry.size)
+
+    return (
+        _ZIP_LOCAL_HEADER.pack(
+            0x04034B50,
+            version,
+            entry.flags,
+            0,  # Stored.
+            _ZIP_DOS_TIME,
+            _ZIP_DOS_DATE,
+            crc,
+            size,
+            size,
+            len(entry.name),
+            len(extra),
+        )
+        + entry.name
+        + extra
+    )
+
+
+def _get_zip_central_header(entry: _ZipEntry, crc: int) -> bytes:
+    version, size, offset = _ZIP_VERSION, entry.size, entry.offset
+    zip64_values = []
+    if entry.size >= _ZIP64_LIMIT:
+        size = _ZIP64_MARKER
+        zip64_values += [entry.size, entry.size]
+    if entry.offset >= _ZIP64_LIMIT:
+        offset = _ZIP64_MARKER
+        zip64_values.append(entry.offset)
+    extra = b""
+    if zip64_values:
+        version = _ZIP64_VERSION
+        extra = struct.pack(
+            f"<HH{len(zip64_values)}Q", 1, 8 * len(zip64_values), *zip64_values
+        )
+
+    return (
+        _ZIP_CENTRAL_HEADER.pack(
+            0x02014B50,
+            _ZIP_MADE_BY_UNIX | version,
+            version,
+            entry.flags,
+            0,  # Stored.
+            _ZIP_DOS_TIME,
+            _ZIP_DOS_DATE,
+            crc,
+            size,
+            size,
+            len(entry.name),
+            len(extra),
+            0,  # Comment length.
+            0,  # Disk number.
+            0,  # Internal attributes.
+            _ZIP_EXTERNAL_ATTR,
+            offset,
+        )
+        + entry.name
+        + extra
+    )
+
+
+def _get_zip_central_directory(
+    entries: typing.List[_ZipEntry], crcs: typing.List[int], offset: int
+) -> bytes:
+    headers = b"".join(
+        _get_zip_central_header(entry, crc) for entry, crc in zip(entries, crcs)
+    )
+
+    end_records = b""
+    if (
+        len(entries) >= _ZIP64_MAX_ENTRIES
+        or len(headers) >= _ZIP64_LIMIT
+        or offset >= _ZIP64_LIMIT
+    ):
+        end_records += _ZIP64_END_RECORD.pack(
+            0x06064B50,
+            _ZIP64_END_RECORD.size - 12,
+            _ZIP_MADE_BY_UNIX | _ZIP64_VERSION,
+            _ZIP64_VERSION,
+            0,
+            0,
+            len(entries),
+            len(entries),
+            len(headers),
+            offset,
+        )
+        end_records += _ZIP64_END_LOCATOR.pack(0x07064B50, 0, offset + len(headers), 1)
+    end_records += _ZIP_END_RECORD.pack(
+        0x06054B50,
+        0,
+        0,
+        min(len(entries), _ZIP64_MAX_ENTRIES),
+        min(len(entries), _ZIP64_MAX_ENTRIES),
+        _ZIP64_MARKER if len(headers) >= _ZIP64_LIMIT else len(headers),
+        _ZIP64_MARKER if offset >= _ZIP64_LIMIT else offset,
+        0,
+    )
+
+    return headers + end_records
+
+
+def _get_zip_entries(
+    members: typing.Iterable[typing.Tuple[str, str]],
+    exam_filepaths: typing.Dict[str, str],
+) -> typing.Tuple[typing.List[_ZipEntry], int]:
+    # Return entries and the offset of the central directory. Headers
+    # have the same size whatever the CRC is, so the layout is known
+    # without reading any exam file.
+    entries = []
+    offset = 0
+    for member_name, sha256sum in members:
+        exam_filepath = exam_filepaths[sha256sum]
+        entry = _ZipEntry(
+            name=member_name.encode("utf-8"),
+            flags=0 if member_name.isascii() else _ZIP_FLAG_UTF8,
+            filepath=exam_filepath,
+            size=os.path.getsize(exam_filepath),
+            offset=offset,
+        )
+        entries.append(entry)
+        offset += len(_get_zip_local_header(entry, 0)) + entry.size
+
+    return entries, offset
+
+
+def _get_crc32(filepath: str) -> int:
+    crc = 0
+    for chunk in ktp_controller.utils.bytes_stream(
+        filepath, chunk_size=_COPY_CHUNK_SIZE
+    ):
+        crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def get_exam_package_size(
+    members: typing.Iterable[typing.Tuple[str, str]],
+    exam_filepaths: typing.Dict[str, str],
+) -> int:
+    """Return the size of the exam package iter_exam_package() yields,
+    without building it."""
+
+    entries, offset = _get_zip_entries(members, exam_filepaths)
+
+    return offset + len(_get_zip_central_directory(entries, [0] * len(entries), offset))
+
+
+def iter_exam_package(
+    members: typing.Iterable[typing.Tuple[str, str]],
+    exam_filepaths: typing.Dict[str, str],
+) -> typing.Iterator[bytes]:
+    """Yield chunks of a deterministic exam package zip, reading exam
+    files as the chunks are consumed. exam_filepaths maps exam file
+    SHA256 checksums to local filepaths.
+
+    CRC and sizes of each member are in its local header, instead of
+    in a data descriptor after the data, which streaming unzippers may
+    reject for stored members. The CRC is needed before the data, so
+    each exam file is read twice, the second time normally from the
+    page cache.
+    """
+
+    entries, offset = _get_zip_entries(members, exam_filepaths)
+
+    crcs = []
+    for entry in entries:
+        crc = _get_crc32(entry.filepath)
+        yield _get_zip_local_header(entry, crc)
+        size = 0
+        for chunk in ktp_controller.utils.bytes_stream(
+            entry.filepath, chunk_size=_COPY_CHUNK_SIZE
+        ):
+            size += len(chunk)
+            yield chunk
+        if size != entry.size:
+            raise RuntimeError(
+                "exam file changed while building exam package", entry.filepath
+            )
+        crcs.append(crc)
+
+    yield _get_zip_central_directory(entries, crcs, offset)
+
+
+def write_exam_package(
+    fileobj: typing.BinaryIO,
+    members: typing.Iterable[typing.Tuple[str, str]],
+    exam_filepaths: typing.Dict[str, str],
+) -> str:
+    """Write a deterministic exam package zip to fileobj and return its
+    SHA256 checksum, see iter_exam_package()."""
+
+    sha256sum = hashlib.sha256()
+    for chunk in iter_exam_package(members, exam_filepaths):
+        fileobj.write(chunk)
+        sha256sum.update(chunk)
+
+    return sha256sum.hexdigest()
+
+
+def _read_manifest(manifest_filepath: str) -> typing.Dict[str, typing.Any] | None:
+    try:
+        with open(manifest_filepath, "r", encoding="utf-8") as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return None
+    except Exception:  # pylint: disable=broad-exception-caught
+        _LOGGER.exception(
+            "ignoring invalid exam package manifest %r", manifest_filepath
+        )
+        return None
+
+
+def _get_build_lock(exam_package_filepath: str) -> threading.Lock:
+    with _BUILD_LOCKS_LOCK:
+        return _BUILD_LOCKS[exam_package_filepath]
+
+
+def _get_exam_filepaths(
+    exam_file_infos: typing.Iterable[typing.Dict],
+) -> typing.Dict[str, str]:
+    return {
+        i["sha256"]: ktp_controller.files.get_local_filepath(
+            ktp_controller.files.LocalFilepathType.EXAM_FILE,
+            i["external_id"],
+            i["sha256"],
+        )
+        for i in exam_file_infos
+    }
+
+
+def _is_exam_package_reusable(
+    exam_package_filepath: str,
+    members: typing.List[typing.Tuple[str, str]],
+    *,
+    verification_index: ktp_controller.agent.verification.VerificationIndex,
+) -> bool:
+    manifest = _read_manifest(f"{exam_package_filepath}.manifest.json")
+    if manifest is None or [tuple(m) for m in manifest["members"]] != members:
+        return False
+
+    try:
+        sha256sum = verification_index.get_sha256(exam_package_filepath)
+    except FileNotFoundError:
+        return False
+
+    if sha256sum != manifest["sha256"]:
+        _LOGGER.warning(
+            "Exam package %r does not match its manifest.", exam_package_filepath
+        )
+        return False
+
+    return True
+
+
+def _save_manifest(
+    exam_package_filepath: str,
+    members: typing.List[typing.Tuple[str, str]],
+    sha256sum: str,
+    *,
+    verification_index: ktp_controller.agent.verification.VerificationIndex,
+) -> None:
+    # Must be called with the build lock held, right after the package
+    # has been written.
+    verification_index.record(exam_package_filepath, sha256sum)
+
+    with ktp_controller.utils.open_atomic_write(
+        f"{exam_package_filepath}.manifest.json", encoding="utf-8"
+    ) as manifest_file:
+        json.dump({"sha256": sha256sum, "members": members}, manifest_file)
+
+    _LOGGER.info("Built exam package %r.", exam_package_filepath)
+
+
+def _save_exam_package_file(
+    exam_package_filepath: str,
+    exam_file_infos: typing.List[typing.Dict],
+    *,
+    verification_index: ktp_controller.agent.verification.VerificationIndex,
+) -> str:
+    # Must be called with the build lock held.
+    members = get_exam_package_members(exam_file_infos)
+
+    with ktp_controller.utils.open_atomic_write(
+        exam_package_filepath
+    ) as exam_package_file:
+        sha256sum = write_exam_package(
+            exam_package_file,
+            members,
+            _get_exam_filepaths(exam_file_infos),
+        )
+
+    _save_manifest(
+        exam_package_filepath,
+        members,
+        sha256sum,
+        verification_index=verification_index,
+    )
+
+    return sha256sum
+
+
+def build_exam_package_file(
+    exam_package_filepath: str,
+    exam_file_infos: typing.List[typing.Dict],
+    *,
+    verification_index: ktp_controller.agent.verification.VerificationIndex,
+) -> bool:
+    """Build exam package to exam_package_filepath, unless an identical
+    and intact package has already been built there. Return True if
+    the package was built, False if the existing one was reused.
+
+    Each built package is accompanied by a manifest, which records its
+    members and checksum.
+    """
+
+    with _get_build_lock(exam_package_filepath):
+        if _is_exam_package_reusable(
+            exam_package_filepath,
+            get_exam_package_members(exam_file_infos),
+            verification_index=verification_index,
+        ):
+            _LOGGER.info("Reusing exam package %r.", exam_package_filepath)
+            return False
+
+        _save_exam_package_file(
+            exam_package_filepath,
+            exam_file_infos,
+            verification_index=verification_index,
+        )
+
+    return True
+
+
+@contextlib.contextmanager
+def open_exam_package_stream(
+    exam_package_filepath: str,
+    exam_file_infos: typing.List[typing.Dict],
+    *,
+    verification_index: ktp_controller.agent.verification.VerificationIndex,
+) -> typing.Iterator[typing.Tuple[typing.Iterator[bytes], int]]:
+    """Return a context manager which yields chunks and the size of an
+    exam package, for uploading it without building it to disk first.
+
+    An identical and intact package built earlier to
+    exam_package_filepath is read from there. Otherwise the package is
+    built while the chunks are consumed, and saved to
+    exam_package_filepath on the way, as build_exam_package_file()
+    would. Build lock is held until the context is exited.
+    """
+
+    members = get_exam_package_members(exam_file_infos)
+
+    with _get_build_lock(exam_package_filepath):
+        if _is_exam_package_reusable(
+            exam_package_filepath, members, verification_index=verification_index
+        ):
+            _LOGGER.info("Reusing exam package %r.", exam_package_filepath)
+            yield (
+                ktp_controller.utils.bytes_stream(
+                    exam_package_filepath, chunk_size=_COPY_CHUNK_SIZE
+                ),
+                os.path.getsize(exam_package_filepath),
+            )
+            return
+
+        exam_filepaths = _get_exam_filepaths(exam_file_infos)
+        sha256sum = hashlib.sha256()
+
+        with ktp_controller.utils.open_atomic_write(
+            exam_package_filepath
+        ) as exam_package_file:
+
+            def _iter_and_save():
+                for chunk in iter_exam_package(members, exam_filepaths):
+                    exam_package_file.write(chunk)
+                    sha256sum.update(chunk)
+                    yield chunk
+
+            chunks = _iter_and_save()
+            yield chunks, get_exam_package_size(members, exam_filepaths)
+            # The consumer may stop early without an error, the rest of
+            # the package is saved nevertheless.
+            for _ in chunks:
+                pass
+
+        _save_manifest(
+            exam_package_filepath,
+            members,
+            sha256sum.hexdigest(),
+            verification_index=verification_index,
+        )
@@ -0,0 +1,212 @@
+# Standard library imports
+import asyncio
+import datetime
+import logging
+import os
+import typing
+
+# Third-party imports
+
+# Internal imports
+import ktp_controller.agent.package
+import ktp_controller.agent.verification
+import ktp_controller.utils
+
+# Relative imports
+
+__all__ = [
+    # Utils:
+    "get_upcoming_exam_packages",
+    # Types:
+    "ExamPackagePrebuilder",
+]
+
+
+_LOGGER = logging.getLogger(__file__)
+
+
+# Utils:
+
+
+def get_upcoming_exam_packages(
+    eom_exam_info: typing.Dict[str, typing.Any], *, utcnow: datetime.datetime
+) -> typing.List[typing.Tuple[datetime.datetime, str, typing.List[typing.Dict]]]:
+    """Return (lock time, external id, exam file infos) of packages
+    which have not ended yet, ordered by lock time. Exam file infos are
+    in the same form as API stores them."""
+
+    eom_schedules = {
+        eom_schedule["id"]: eom_schedule for eom_schedule in eom_exam_info["schedules"]
+    }
+
+    upcoming_exam_packages = []
+    for external_id, eom_package in eom_exam_info["packages"].items():
+        if eom_package["lock_time"] is None:
+            continue
+        if datetime.datetime.fromisoformat(eom_package["end_time"]) < utcnow:
+            continue
+
+        try:
+            exam_file_infos = [
+                {
+                    "external_id": eom_schedules[schedule_id]["file_uuid"],
+                    "name": eom_schedules[schedule_id]["file_name"],
+                    "sha256": eom_schedules[schedule_id]["file_sha256"],
+                }
+                for schedule_id in eom_package["schedules"]
+            ]
+        except KeyError as key_error:
+            _LOGGER.warning(
+                "Exam package %r refers to an unknown schedule %s.",
+                external_id,
+                key_error,
+            )
+            continue
+
+        upcoming_exam_packages.append(
+            (
+                datetime.datetime.fromisoformat(eom_package["lock_time"]),
+                external_id,
+                exam_file_infos,
+            )
+        )
+
+    return sorted(upcoming_exam_packages, key=lambda p: (p[0], p[1]))
+
+
+def _remove_stale_exam_package_file(
+    exam_package_filepath: str,
+    verification_index: ktp_controller.agent.verification.VerificationIndex,
+) -> None:
+    _LOGGER.info("Removing stale exam package %r.", exam_package_filepath)
+    for filepath in [f"{exam_package_filepath}.manifest.json", exam_package_filepath]:
+        try:
+            os.unlink(filepath)
+        except FileNotFoundError:
+            pass
+    verification_index.forget(exam_package_filepath)
+
+
+# Types:
+
+
+class ExamPackagePrebuilder:
+    """Build exam packages of upcoming packages in the background,
+    starting lead_time_sec before their lock times, so that preparing
+    the package only needs to pick up the ready zip.
+
+    Prebuilt packages whose schedules change are removed as stale.
+    """
+
+    def __init__(
+        self,
+        *,
+        verification_index: ktp_controller.agent.verification.VerificationIndex,
+        lead_time_sec: float,
+        retry_interval_sec: float = 60,
+    ):
+        self.__verification_index = verification_index
+        self.__lead_time = datetime.timedelta(seconds=lead_time_sec)
+        self.__retry_interval_sec = retry_interval_sec
+
+        self.__wakeup = asyncio.Event()
+
+        self.__upcoming_exam_packages: typing.List[
+            typing.Tuple[datetime.datetime, str, typing.List[typing.Dict]]
+        ] = []
+        # Exam package external id -> exam package filepath
+        self.__wanted_filepaths: typing.Dict[str, str] = {}
+        self.__prebuilt_filepaths: typing.Dict[str, str] = {}
+
+    def update_exam_info(self, eom_exam_info: typing.Dict[str, typing.Any]) -> None:
+        self.__upcoming_exam_packages = get_upcoming_exam_packages(
+            eom_exam_info, utcnow=ktp_controller.utils.utcnow()
+        )
+        self.__wanted_filepaths = {
+            external_id: ktp_controller.agent.package.get_exam_package_filepath(
+                external_id, exam_file_infos
+            )
+            for _, external_id, exam_file_infos in self.__upcoming_exam_packages
+        }
+
+        for external_id, filepath in list(self.__prebuilt_filepaths.items()):
+            if self.__wanted_filepaths.get(external_id) != filepath:
+                del self.__prebuilt_filepaths[external_id]
+                _remove_stale_exam_package_file(filepath, self.__verification_index)
+
+        self.__wakeup.set()
+
+    async def __prebuild(
+        self,
+        external_id: str,
+        exam_package_filepath: str,
+        exam_file_infos: typing.List[typing.Dict],
+    ) -> None:
+        _LOGGER.info("Prebuilding exam package %r...", external_id)
+        await asyncio.to_thread(
+            ktp_controller.agent.package.build_exam_package_file,
+            exam_package_filepath,
+            exam_file_infos,
+            verification_index=self.__verification_index,
+        )
+
+        if self.__wanted_filepaths.get(external_id) != exam_package_filepath:
+            # Schedules changed while the package was being built.
+            await asyncio.to_thread(
+                _remove_stale_exam_package_file,
+                exam_package_filepath,
+                self.__verification_index,
+            )
+            return
+
+        self.__prebuilt_filepaths[external_id] = exam_package_filepath
+        _LOGGER.info(
+            "Prebuilt exam package %r to %r.", external_id, exam_package_filepath
+        )
+
+    async def run(self) -> None:
+        if not self.__lead_time:
+            _LOGGER.info("Exam package prebuilding is disabled.")
+            return
+
+        while True:
+            self.__wakeup.clear()
+            utcnow = ktp_controller.utils.utcnow()
+            timeout: float | None = None
+
+            for lock_time, external_id, exam_file_infos in list(
+                self.__upcoming_exam_packages
+            ):
+                exam_package_filepath = self.__wanted_filepaths.get(external_id)
+                if (
+                    exam_package_filepath is None
+                    or self.__prebuilt_filepaths.get(external_id)
+                    == exam_package_filepath
+                ):
+                    continue
+
+                due_at = lock_time - self.__lead_time
+                if due_at > utcnow:
+                    # Packages are ordered by lock time.
+                    due_in_sec = (due_at - utcnow).total_seconds()
+                    timeout = (
+                        due_in_sec if timeout is None else min(timeout, due_in_sec)
+                    )
+                    break
+
+                try:
+                    await self.__prebuild(
+                        external_id, exam_package_filepath, exam_file_infos
+                    )
+                except Exception:  # pylint: disable=broad-exception-caught
+                    # Exam files might be still missing, for example.
+                    _LOGGER.exception(
+                        "Failed to prebuild exam package %r, retrying later.",
+                        external_id,
+                    )
+                    timeout = self.__retry_interval_sec
+
+            try:
+                await asyncio.wait_for(self.__wakeup.wait(), timeout)
+            except TimeoutError:
+                pass
@@ -0,0 +1,112 @@
+# Standard library imports
+import datetime
+import logging
+import typing
+
+# Third-party imports
+
+# Internal imports
+import ktp_controller.utils
+
+# Relative imports
+
+__all__ = [
+    "get_prefetch_order",
+    "prefetch_exam_files",
+]
+
+
+_LOGGER = logging.getLogger(__file__)
+
+
+def get_prefetch_order(
+    eom_exam_info: typing.Dict[str, typing.Any],
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    """Return Exam-O-Matic schedules in the order their exam files
+    should be prefetched: schedules of the earliest starting packages
+    first. Each exam file is included only once.
+    """
+
+    package_start_times: typing.Dict[str, datetime.datetime] = {}
+    for eom_package in eom_exam_info["packages"].values():
+        start_time = datetime.datetime.fromisoformat(eom_package["start_time"])
+        for schedule_id in eom_package["schedules"]:
+            package_start_times[schedule_id] = min(
+                start_time, package_start_times.get(schedule_id, start_time)
+            )
+
+    def _sort_key(eom_schedule):
+        # Schedules which do not belong to any package are ordered by
+        # their own start times.
+        start_time = package_start_times.get(
+            eom_schedule["id"],
+            datetime.datetime.fromisoformat(eom_schedule["start_time"]),
+        )
+        return (start_time, eom_schedule["id"])
+
+    eom_schedules = []
+    seen_exam_files = set()
+    for eom_schedule in sorted(eom_exam_info["schedules"], key=_sort_key):
+        exam_file = (eom_schedule["file_uuid"], eom_schedule["file_sha256"])
+        if exam_file in seen_exam_files:
+            continue
+        seen_exam_files.add(exam_file)
+        eom_schedules.append(eom_schedule)
+
+    return eom_schedules
+
+
+async def prefetch_exam_files(
+    eom_schedules: typing.List[typing.Dict[str, typing.Any]],
+    ensure_exam_file_exists: typing.Callable[
+        [typing.Dict[str, typing.Any]], typing.Awaitable
+    ],
+    *,
+    concurrency: int,
+) -> None:
+    """Ensure exam files of all given schedules exist, at most
+    concurrency files at a time, in the given order.
+
+    All files are attempted even if some of them fail. Failures are
+    raised as an ExceptionGroup once all files have been attempted.
+    """
+
+    total_count = len(eom_schedules)
+    total_size = sum(eom_schedule["file_size"] for eom_schedule in eom_schedules)
+    ready_count = 0
+    ready_size = 0
+
+    async def _prefetch(eom_schedule):
+        nonlocal ready_count, ready_size
+
+        try:
+            await ensure_exam_file_exists(eom_schedule)
+        except Exception:
+            _LOGGER.exception(
+                "failed to prefetch exam file %r (file_uuid=%s)",
+                eom_schedule["file_name"],
+                eom_schedule["file_uuid"],
+            )
+            raise
+
+        ready_count += 1
+        ready_size += eom_schedule["file_size"]
+        _LOGGER.info(
+            "exam file prefetch progress: %d/%d files, %d/%d bytes ready",
+            ready_count,
+            total_count,
+            ready_size,
+            total_size,
+        )
+
+    results = await ktp_controller.utils.gather_bounded(
+        [_prefetch(eom_schedule) for eom_schedule in eom_schedules],
+        limit=concurrency,
+        return_exceptions=True,
+    )
+
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        raise ExceptionGroup(
+            f"failed to prefetch {len(errors)}/{total_count} exam files", errors
+        )
@@ -0,0 +1,160 @@
+# Standard library imports
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import typing
+
+# Third-party imports
+
+# Internal imports
+import ktp_controller.utils
+
+# Relative imports
+
+__all__ = [
+    # Utils:
+    "get_status_report_fingerprint",
+    # Types:
+    "StatusReporter",
+]
+
+
+_LOGGER = logging.getLogger(__file__)
+
+
+# Utils:
+
+
+def get_status_report_fingerprint(status_report: typing.Dict[str, typing.Any]) -> str:
+    """Return a checksum of the meaningful contents of an Abitti2 status
+    report: student statuses, answer count, exam states and the
+    reported identifiers. Receive times and fields Abitti2 adds on its
+    own do not affect the fingerprint."""
+
+    message = status_report["status"]
+    data = message.get("data") or {}
+    students = sorted(
+        (
+            [s.get("studentUuid"), s.get("sessionUuid"), s.get("studentStatus")]
+            for s in data.get("students") or []
+        ),
+        key=json.dumps,
+    )
+
+    return hashlib.sha256(
+        json.dumps(
+            {
+                "students": students,
+                "answerPaperCount": data.get("answerPaperCount"),
+                "examStatus": data.get("examStatus"),
+                "singleSecurityCode": message.get("singleSecurityCode"),
+                "exams": status_report["exams"],
+                "monitoring_passphrase": status_report["monitoring_passphrase"],
+                "server_version": status_report["server_version"],
+            },
+            sort_keys=True,
+            default=str,
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+# Types:
+
+
+class StatusReporter:
+    """Send Abitti2 status reports to Exam-O-Matic only when they matter.
+
+    Changed reports are sent immediately, but at most once per
+    min_interval_sec; a burst of changes within the interval is
+    coalesced into one deferred send of the latest report. Unchanged
+    reports are sent once per heartbeat_interval_sec. Zero heartbeat
+    interval sends every report.
+
+    send must return True if the report was delivered, or False if it
+    was queued for a later delivery.
+    """
+
+    def __init__(
+        self,
+        send: typing.Callable[[typing.Dict[str, typing.Any]], typing.Awaitable[bool]],
+        *,
+        heartbeat_interval_sec: float,
+        min_interval_sec: float = 1,
+    ):
+        self.__send = send
+        self.__heartbeat_interval_sec = heartbeat_interval_sec
+        self.__min_interval_sec = min_interval_sec
+
+        self.__last_fingerprint: str | None = None
+        self.__last_sent_at: float | None = None
+        self.__last_reported_at: str | None = None
+        self.__deferred_send: asyncio.Task | None = None
+
+    def __is_heartbeat_due(self, now: float) -> bool:
+        return (
+            self.__heartbeat_interval_sec == 0
+            or self.__last_sent_at is None
+            or now - self.__last_sent_at >= self.__heartbeat_interval_sec
+        )
+
+    async def __send_now(
+        self, status_report: typing.Dict[str, typing.Any], fingerprint: str
+    ) -> None:
+        self.__last_sent_at = time.monotonic()
+        try:
+            is_delivered = await self.__send(status_report)
+        except Exception:  # pylint: disable=broad-exception-caught
+            _LOGGER.exception("failed to send Abitti2 status report to Exam-O-Matic")
+            self.__last_fingerprint = None
+            self.__last_reported_at = None
+            return
+
+        self.__last_fingerprint = fingerprint
+        if is_delivered:
+            self.__last_reported_at = ktp_controller.utils.utcnow_str()
+            _LOGGER.info("sent Abitti2 status report to Exam-O-Matic")
+        else:
+            self.__last_reported_at = None
+            _LOGGER.info("queued Abitti2 status report to Exam-O-Matic")
+
+    async def __send_later(
+        self,
+        delay_sec: float,
+        status_report: typing.Dict[str, typing.Any],
+        fingerprint: str,
+    ) -> None:
+        await asyncio.sleep(delay_sec)
+        await self.__send_now(status_report, fingerprint)
+
+    async def report(self, status_report: typing.Dict[str, typing.Any]) -> str | None:
+        """Send status_report if it is due and return the time when the
+        latest equivalent report was sent, or None if it has not been
+        sent successfully. Deferred reports have not been sent yet, so
+        None is returned for them."""
+
+        # The latest report always supersedes a deferred one.
+        if self.__deferred_send is not None and not self.__deferred_send.done():
+            self.__deferred_send.cancel()
+        self.__deferred_send = None
+
+        fingerprint = get_status_report_fingerprint(status_report)
+        now = time.monotonic()
+
+        if self.__is_heartbeat_due(now):
+            await self.__send_now(status_report, fingerprint)
+        elif fingerprint != self.__last_fingerprint:
+            assert self.__last_sent_at is not None
+            delay_sec = self.__last_sent_at + self.__min_interval_sec - now
+            if delay_sec <= 0:
+                await self.__send_now(status_report, fingerprint)
+            else:
+                # Copied, because the caller may annotate the report
+                # before the deferred send.
+                self.__deferred_send = asyncio.create_task(
+                    self.__send_later(delay_sec, dict(status_report), fingerprint)
+                )
+                return None
+
+        return self.__last_reported_at
@@ -0,0 +1,199 @@
+# Standard library imports
+import asyncio
+import datetime
+import logging
+import typing
+
+# Third-party imports
+
+# Internal imports
+import ktp_controller.utils
+
+# Relative imports
+
+__all__ = [
+    # Utils:
+    "get_transition_deadline",
+    # Types:
+    "TransitionScheduler",
+]
+
+
+_LOGGER = logging.getLogger(__file__)
+
+
+# Utils:
+
+
+def _parse_dt(value: str | datetime.datetime | None) -> datetime.datetime | None:
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.fromisoformat(value)
+
+
+def get_transition_deadline(
+    current_exam_package: typing.Dict[str, typing.Any] | None,
+    *,
+    utcnow: datetime.datetime,
+    is_auto_control_enabled: bool,
+    upcoming_lock_times: typing.Iterable[datetime.datetime] = (),
+) -> datetime.datetime | None:
+    """Return the time when the next transition of the current exam
+    package is due, or None if nothing is expected to happen before
+    something else (exam refresh, command, etc.) changes the situation.
+
+    Deadlines which are already in the past are returned as they are,
+    it's up to the caller to decide how to handle them.
+    """
+
+    if current_exam_package is None:
+        if not is_auto_control_enabled:
+            return None
+        # Next package becomes current when it gets locked.
+        return min((t for t in upcoming_lock_times if t > utcnow), default=None)
+
+    state = current_exam_package["state"]
+
+    state_changed_at = _parse_dt(current_exam_package["state_changed_at"]) or utcnow
+
+    if state == "stopping":
+        # Stopping is retried until all sessions have ended, regardless
+        # of the auto control state.
+        return state_changed_at
+
+    if not is_auto_control_enabled:
+        return None
+
+    return {
+        None: _parse_dt(current_exam_package["lock_time"]) or utcnow,
+        "ready": _parse_dt(current_exam_package["start_time"]),
+        "running": _parse_dt(current_exam_package["end_time"]),
+        # Stopped packages are archived right away, and after
+        # archiving, the next package might be waiting to become
+        # current.
+        "stopped": state_changed_at,
+        "archived": state_changed_at,
+    }[state]
+
+
+# Types:
+
+
+class TransitionScheduler:
+    def __init__(
+        self,
+        *,
+        is_auto_control_enabled: typing.Callable[[], bool],
+        retry_interval_sec: float = 5,
+        max_sleep_sec: float = 60,
+    ):
+        self.__is_auto_control_enabled = is_auto_control_enabled
+        self.__retry_interval = datetime.timedelta(seconds=retry_interval_sec)
+        self.__max_sleep_sec = max_sleep_sec
+
+        self.__wakeup = asyncio.Event()
+
+        # Until the current exam package has been seen at least once,
+        # the scheduler fires right away.
+        self.__is_current_exam_package_known = False
+        self.__current_exam_package: typing.Dict[str, typing.Any] | None = None
+        self.__upcoming_lock_times: typing.List[datetime.datetime] = []
+
+        self.__last_fired_deadline: datetime.datetime | None = None
+        self.__last_fired_at: datetime.datetime | None = None
+
+    def update_current_exam_package(
+        self, current_exam_package: typing.Dict[str, typing.Any] | None
+    ) -> None:
+        if (
+            self.__current_exam_package is None
+            or current_exam_package is None
+            or self.__current_exam_package["external_id"]
+            != current_exam_package["external_id"]
+            or self.__current_exam_package["state"] != current_exam_package["state"]
+        ):
+            # Progress was made, so the next deadline is a fresh one.
+            self.__last_fired_deadline = None
+            self.__last_fired_at = None
+
+        self.__is_current_exam_package_known = True
+        self.__current_exam_package = (
+            None if current_exam_package is None else dict(current_exam_package)
+        )
+        self.wake_up()
+
+    def update_exam_info(self, eom_exam_info: typing.Dict[str, typing.Any]) -> None:
+        utcnow = ktp_controller.utils.utcnow()
+        self.__upcoming_lock_times = sorted(
+            _parse_dt(package["lock_time"])
+            for package in eom_exam_info["packages"].values()
+            if package["lock_time"] is not None
+            and _parse_dt(package["end_time"]) >= utcnow
+        )
+        # New exam info might have made a new package current.
+        self.__is_current_exam_package_known = False
+        self.__last_fired_deadline = None
+        self.__last_fired_at = None
+        self.wake_up()
+
+    def wake_up(self) -> None:
+        self.__wakeup.set()
+
+    def get_next_deadline(
+        self, utcnow: datetime.datetime
+    ) -> typing.Tuple[datetime.datetime | None, datetime.datetime | None]:
+        """Return the time when the scheduler fires next, and the
+        transition deadline it fires for, which is earlier if the
+        transition is being retried."""
+
+        if not self.__is_current_exam_package_known:
+            if self.__last_fired_at is None:
+                return utcnow, None
+            return self.__last_fired_at + self.__retry_interval, None
+
+        transition_deadline = get_transition_deadline(
+            self.__current_exam_package,
+            utcnow=utcnow,
+            is_auto_control_enabled=self.__is_auto_control_enabled(),
+            upcoming_lock_times=self.__upcoming_lock_times,
+        )
+
+        # If the same deadline has already fired and the state did not
+        # change, the transition is not (yet) possible. Retry a bit
+        # later instead of spinning.
+        deadline = transition_deadline
+        if (
+            transition_deadline is not None
+            and transition_deadline == self.__last_fired_deadline
+            and self.__last_fired_at is not None
+        ):
+            deadline = max(
+                transition_deadline, self.__last_fired_at + self.__retry_interval
+            )
+
+        return deadline, transition_deadline
+
+    async def wait_for_next_deadline(self) -> None:
+        while True:
+            self.__wakeup.clear()
+            utcnow = ktp_controller.utils.utcnow()
+            deadline, transition_deadline = self.get_next_deadline(utcnow)
+
+            if deadline is not None and deadline <= utcnow:
+                # The unadjusted deadline is stored, it's what the next
+                # round compares against to detect a retry.
+                self.__last_fired_deadline = transition_deadline
+                self.__last_fired_at = utcnow
+                _LOGGER.debug("Deadline %s reached.", deadline)
+                return
+
+            # Sleep at most max_sleep_sec at a time to follow wall
+            # clock adjustments.
+            timeout = self.__max_sleep_sec
+            if deadline is not None:
+                timeout = min(timeout, (deadline - utcnow).total_seconds())
+
+            try:
+                await asyncio.wait_for(self.__wakeup.wait(), timeout)
+            except TimeoutError:
+                pass
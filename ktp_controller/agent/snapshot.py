@@ -0,0 +1,82 @@
+# Standard library imports
+import copy
+import logging
+import time
+import typing
+
+# Third-party imports
+
+# Internal imports
+
+# Relative imports
+
+__all__ = [
+    "Snapshot",
+]
+
+
+_LOGGER = logging.getLogger(__file__)
+
+
+class Snapshot:
+    """In-memory copy of API data, re-fetched only after invalidation.
+
+    API pushes invalidations whenever the data may have changed. The
+    snapshot can be trusted only while invalidations are being
+    received, so it is used only between subscribe() and
+    unsubscribe(). As a safety net, it also expires after max_age_sec.
+    """
+
+    def __init__(
+        self,
+        fetch: typing.Callable[[], typing.Awaitable[typing.Any]],
+        *,
+        max_age_sec: float = 60,
+    ):
+        self.__fetch = fetch
+        self.__max_age_sec = max_age_sec
+
+        self.__is_subscribed = False
+        # Incremented on every invalidation, so that a fetch which was
+        # started before an invalidation is not stored.
+        self.__generation = 0
+        self.__value: typing.Any = None
+        self.__fetched_at: float | None = None
+
+    def __is_valid(self) -> bool:
+        return (
+            self.__is_subscribed
+            and self.__fetched_at is not None
+            and time.monotonic() - self.__fetched_at < self.__max_age_sec
+        )
+
+    def invalidate(self) -> None:
+        self.__generation += 1
+        self.__fetched_at = None
+        self.__value = None
+
+    def subscribe(self) -> None:
+        self.invalidate()
+        self.__is_subscribed = True
+
+    def unsubscribe(self) -> None:
+        self.__is_subscribed = False
+        self.invalidate()
+
+    async def get(self) -> typing.Any:
+        """Return a copy of the snapshot, fetching it first if needed.
+        The copy can be modified freely."""
+
+        if not self.__is_valid():
+            generation = self.__generation
+            fetched_at = time.monotonic()
+            value = await self.__fetch()
+            if generation != self.__generation:
+                # Invalidated while fetching, the value may be stale
+                # already, so it is not stored.
+                return value
+            self.__value = value
+            self.__fetched_at = fetched_at
+            _LOGGER.debug("fetched a new snapshot: %s", value)
+
+        return copy.deepcopy(self.__value)
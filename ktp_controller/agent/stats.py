@@ -1,6 +1,7 @@
 # Standard library imports
 import abc
 import dataclasses
+import typing
 
 # Third-party imports
 import pydantic
@@ -14,12 +15,17 @@ __all__ = [
     "ExamomaticConnectionStats",
     "APIConnectionStats",
     "Abitti2ConnectionStats",
+    "CountingWebsocket",
 ]
 
 
 @dataclasses.dataclass
 class ConnectionStats(abc.ABC):
     connected_at: ktp_controller.pydantic.DateTime
+    messages_received: pydantic.NonNegativeInt = 0
+    messages_sent: pydantic.NonNegativeInt = 0
+    bytes_received: pydantic.NonNegativeInt = 0
+    bytes_sent: pydantic.NonNegativeInt = 0
 
 
 class ExamomaticConnectionStats(ConnectionStats):
@@ -34,3 +40,30 @@ class APIConnectionStats(ConnectionStats):
 
 class Abitti2ConnectionStats(ConnectionStats):
     pass
+
+
+def _get_message_size(message: str | bytes) -> int:
+    return len(message.encode("utf-8")) if isinstance(message, str) else len(message)
+
+
+class CountingWebsocket:
+    """Websocket connection which counts messages and bytes sent and
+    received through it to connection_stats."""
+
+    def __init__(self, websock, connection_stats: ConnectionStats):
+        self.__websock = websock
+        self.__connection_stats = connection_stats
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(self.__websock, name)
+
+    async def send(self, message: str | bytes) -> None:
+        await self.__websock.send(message)
+        self.__connection_stats.messages_sent += 1
+        self.__connection_stats.bytes_sent += _get_message_size(message)
+
+    async def __aiter__(self) -> typing.AsyncIterator[str | bytes]:
+        async for message in self.__websock:
+            self.__connection_stats.messages_received += 1
+            self.__connection_stats.bytes_received += _get_message_size(message)
+            yield message
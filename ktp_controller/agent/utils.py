@@ -7,12 +7,14 @@ import uuid
 # Internal imports
 import ktp_controller.messages
 import ktp_controller.redis
+import ktp_controller.tracing
 
 # Relative imports
 
 __all__ = [
     "PUBSUB_CHANNEL",
     "send_command",
+    "send_invalidation",
 ]
 
 
@@ -23,4 +25,23 @@ PUBSUB_CHANNEL = f"ktp-controller__agent_messages__{ str(uuid.uuid4()) }"
 
 async def send_command(command_data: ktp_controller.messages.CommandData) -> str:
     command_message = ktp_controller.messages.CommandMessage(data=command_data)
-    return await ktp_controller.redis.pubsub_send(command_message, PUBSUB_CHANNEL)
+    with ktp_controller.tracing.span(
+        "api.publish_command", str(command_message.uuid), channel=PUBSUB_CHANNEL
+    ):
+        return await ktp_controller.redis.pubsub_send(command_message, PUBSUB_CHANNEL)
+
+
+async def send_invalidation(invalidation: ktp_controller.messages.Invalidation) -> None:
+    """Tell agents that their snapshot of some API data is stale.
+
+    Failures are only logged, because agents expire their snapshots
+    anyway, and the change itself must not fail because of this.
+    """
+
+    invalidation_message = ktp_controller.messages.InvalidationMessage(
+        data=ktp_controller.messages.InvalidationData(invalidation=invalidation)
+    )
+    try:
+        await ktp_controller.redis.pubsub_send(invalidation_message, PUBSUB_CHANNEL)
+    except Exception:  # pylint: disable=broad-exception-caught
+        _LOGGER.exception("failed to send invalidation %r to agents", invalidation)
@@ -0,0 +1,172 @@
+# Standard library imports
+import contextlib
+import json
+import logging
+import os
+import os.path
+import threading
+import typing
+
+# Third-party imports
+
+# Internal imports
+import ktp_controller.utils
+
+# Relative imports
+
+__all__ = [
+    "VerificationIndex",
+]
+
+
+_LOGGER = logging.getLogger(__file__)
+
+_VERIFICATION_INDEX_FILEPATH = os.path.expanduser(
+    "~/.local/share/ktp-controller/verification-index.json"
+)
+
+
+def _get_key(filepath: str) -> typing.List[int] | None:
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+class VerificationIndex:
+    """Index of verified SHA256 checksums of local files.
+
+    A checksum is considered valid as long as the inode, size and
+    modification time of the file stay the same, so unchanged files
+    are not re-hashed. The index is persisted as a JSON file and can be
+    used from multiple threads. Updates are saved right away, unless
+    they are made within batch().
+    """
+
+    def __init__(self, index_filepath: str = _VERIFICATION_INDEX_FILEPATH):
+        self.__index_filepath = index_filepath
+        self.__lock = threading.Lock()
+        self.__batch_depth = 0
+        self.__is_dirty = False
+        self.__entries: typing.Dict[str, typing.Dict[str, typing.Any]] = self.__load()
+
+    def __load(self) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+        try:
+            with open(self.__index_filepath, "r", encoding="ascii") as index_file:
+                return json.load(index_file)
+        except FileNotFoundError:
+            return {}
+        except Exception:  # pylint: disable=broad-exception-caught
+            _LOGGER.exception(
+                "Failed to load verification index %r. Proceeding with an empty index.",
+                self.__index_filepath,
+            )
+            return {}
+
+    def __save(self) -> None:
+        # Must be called with the lock held.
+        self.__is_dirty = True
+        if self.__batch_depth == 0:
+            self.__write()
+
+    def __write(self) -> None:
+        # Must be called with the lock held.
+        os.makedirs(os.path.dirname(self.__index_filepath), exist_ok=True)
+        with ktp_controller.utils.open_atomic_write(
+            self.__index_filepath, encoding="ascii"
+        ) as index_file:
+            json.dump(self.__entries, index_file)
+        self.__is_dirty = False
+
+    @contextlib.contextmanager
+    def batch(self) -> typing.Iterator[None]:
+        """Return a context manager which defers saving the index until
+        the outermost batch is exited, so that many updates are saved
+        at once. Updates made by other threads meanwhile are deferred
+        too."""
+
+        with self.__lock:
+            self.__batch_depth += 1
+        try:
+            yield
+        finally:
+            with self.__lock:
+                self.__batch_depth -= 1
+                if self.__batch_depth == 0 and self.__is_dirty:
+                    self.__write()
+
+    def record(self, filepath: str, sha256sum: str) -> None:
+        """Record sha256sum as the verified checksum of filepath in its
+        current state."""
+
+        key = _get_key(filepath)
+        if key is None:
+            raise FileNotFoundError(filepath)
+
+        with self.__lock:
+            self.__entries[filepath] = {"key": key, "sha256": sha256sum}
+            self.__save()
+
+    def forget(self, filepath: str) -> None:
+        with self.__lock:
+            if self.__entries.pop(filepath, None) is not None:
+                self.__save()
+
+    def get_sha256(self, filepath: str, *, force: bool = False) -> str:
+        """Return SHA256 checksum of filepath. File is hashed only if it
+        has changed since it was last hashed, or if force is True."""
+
+        key = _get_key(filepath)
+        if key is None:
+            self.forget(filepath)
+            raise FileNotFoundError(filepath)
+
+        if not force:
+            with self.__lock:
+                entry = self.__entries.get(filepath)
+            if entry is not None and entry["key"] == key:
+                return entry["sha256"]
+
+        sha256sum = ktp_controller.utils.sha256(filepath)
+
+        # Do not trust the checksum if the file was modified while it
+        # was being hashed.
+        if _get_key(filepath) == key:
+            with self.__lock:
+                self.__entries[filepath] = {"key": key, "sha256": sha256sum}
+                self.__save()
+
+        return sha256sum
+
+    def scan_integrity(self) -> typing.List[str]:
+        """Re-hash all indexed files and return filepaths whose contents
+        do not match their previously verified checksums anymore.
+        Removed files are dropped from the index."""
+
+        with self.__lock:
+            entries = dict(self.__entries)
+
+        corrupted_filepaths = []
+        # Saved once, not after each re-hashed file.
+        with self.batch():
+            for filepath, entry in entries.items():
+                try:
+                    sha256sum = self.get_sha256(filepath, force=True)
+                except FileNotFoundError:
+                    _LOGGER.info("Verified file %r has been removed.", filepath)
+                    continue
+                except OSError:
+                    # One unreadable file must not stop the scan.
+                    _LOGGER.exception("Failed to re-hash verified file %r", filepath)
+                    continue
+                if sha256sum != entry["sha256"]:
+                    _LOGGER.error(
+                        "Verified file %r has changed: expected SHA256 %s, got %s",
+                        filepath,
+                        entry["sha256"],
+                        sha256sum,
+                    )
+                    corrupted_filepaths.append(filepath)
+
+        return corrupted_filepaths
@@ -0,0 +1,126 @@
+# Standard library imports
+import asyncio
+import collections
+import dataclasses
+import datetime
+import logging
+import sys
+import threading
+import time
+import traceback
+import typing
+
+# Third-party imports
+
+# Internal imports
+import ktp_controller.metrics
+import ktp_controller.utils
+
+# Relative imports
+
+__all__ = [
+    "LoopLagEvent",
+    "LoopLagMonitor",
+]
+
+
+_LOGGER = logging.getLogger(__file__)
+
+
+@dataclasses.dataclass
+class LoopLagEvent:
+    detected_at: datetime.datetime
+    lag_sec: float
+    # Stack of the event loop thread while it was blocked, if the
+    # watchdog caught it.
+    stack: str | None = None
+
+
+class LoopLagMonitor:
+    """Measure how late the event loop wakes up from short sleeps.
+
+    Lags are recorded to histogram, and lags of at least threshold_sec
+    to events, which keeps max_event_count latest ones. A watchdog
+    thread dumps the stack of the event loop thread once the loop has
+    been blocked for threshold_sec, so that the blocking code is seen
+    while it is still blocking.
+    """
+
+    def __init__(
+        self,
+        *,
+        threshold_sec: float,
+        interval_sec: float = 0.1,
+        max_event_count: int = 20,
+    ):
+        self.__threshold_sec = threshold_sec
+        self.__interval_sec = interval_sec
+
+        self.histogram = ktp_controller.metrics.Histogram()
+        self.events: typing.Deque[LoopLagEvent] = collections.deque(
+            maxlen=max_event_count
+        )
+
+        self.__lock = threading.Lock()
+        self.__beat_at = time.monotonic()
+        self.__beat_count = 0
+        self.__dumped_beat_count: int | None = None
+        self.__stack: str | None = None
+
+    def __dump_stack_if_blocked(self, loop_thread_id: int) -> None:
+        with self.__lock:
+            blocked_sec = time.monotonic() - self.__beat_at - self.__interval_sec
+            if (
+                blocked_sec < self.__threshold_sec
+                or self.__dumped_beat_count == self.__beat_count
+            ):
+                return
+            self.__dumped_beat_count = self.__beat_count
+
+        frame = sys._current_frames().get(  # pylint: disable=protected-access
+            loop_thread_id
+        )
+        if frame is None:
+            return
+        stack = "".join(traceback.format_stack(frame))
+        with self.__lock:
+            self.__stack = stack
+        _LOGGER.warning(
+            "Event loop has been blocked for %.3f seconds at:\n%s", blocked_sec, stack
+        )
+
+    def __watch(self, loop_thread_id: int, is_stopped: threading.Event) -> None:
+        while not is_stopped.wait(self.__threshold_sec / 2):
+            self.__dump_stack_if_blocked(loop_thread_id)
+
+    def __beat(self, lag_sec: float) -> None:
+        with self.__lock:
+            self.__beat_at = time.monotonic()
+            self.__beat_count += 1
+            stack, self.__stack = self.__stack, None
+
+        self.histogram.record(lag_sec)
+        if lag_sec >= self.__threshold_sec:
+            self.events.append(
+                LoopLagEvent(ktp_controller.utils.utcnow(), lag_sec, stack)
+            )
+            _LOGGER.warning("Event loop lagged %.3f seconds.", lag_sec)
+
+    async def run(self) -> None:
+        is_stopped = threading.Event()
+        watchdog_thread = threading.Thread(
+            target=self.__watch,
+            args=(threading.get_ident(), is_stopped),
+            name="loop-lag-watchdog",
+            daemon=True,
+        )
+        with self.__lock:
+            self.__beat_at = time.monotonic()
+        watchdog_thread.start()
+        try:
+            while True:
+                wake_up_due_at = time.monotonic() + self.__interval_sec
+                await asyncio.sleep(self.__interval_sec)
+                self.__beat(max(time.monotonic() - wake_up_due_at, 0.0))
+        finally:
+            is_stopped.set()
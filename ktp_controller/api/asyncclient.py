@@ -0,0 +1,48 @@
+# Standard library imports
+import functools
+
+# Third-party imports
+
+# Internal imports
+import ktp_controller.http
+import ktp_controller.api.client
+
+
+__all__ = [
+    # API commands:
+    "async_command",
+    "get_current_exam_package",
+    "get_last_abitti2_status_report",
+    "set_current_exam_package_state",
+    "get_scheduled_exam",
+    "get_scheduled_exam_package",
+    "save_exam_info",
+    "send_abitti2_status_report",
+]
+
+
+_to_async = functools.partial(
+    ktp_controller.http.to_async, executor=ktp_controller.api.client.EXECUTOR
+)
+
+
+# API commands, same as in ktp_controller.api.client, but these do not
+# block the event loop.
+
+
+async_command = _to_async(ktp_controller.api.client.async_command)
+get_current_exam_package = _to_async(ktp_controller.api.client.get_current_exam_package)
+get_last_abitti2_status_report = _to_async(
+    ktp_controller.api.client.get_last_abitti2_status_report
+)
+set_current_exam_package_state = _to_async(
+    ktp_controller.api.client.set_current_exam_package_state
+)
+get_scheduled_exam = _to_async(ktp_controller.api.client.get_scheduled_exam)
+get_scheduled_exam_package = _to_async(
+    ktp_controller.api.client.get_scheduled_exam_package
+)
+save_exam_info = _to_async(ktp_controller.api.client.save_exam_info)
+send_abitti2_status_report = _to_async(
+    ktp_controller.api.client.send_abitti2_status_report
+)
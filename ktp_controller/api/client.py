@@ -7,16 +7,21 @@ import requests
 import requests.exceptions
 
 # Internal imports
+import ktp_controller.http
 import ktp_controller.messages
+import ktp_controller.metrics
 import ktp_controller.utils
 from ktp_controller.settings import SETTINGS
 import ktp_controller.api.exam.schemas
 
 __all__ = [
+    # Constants:
+    "EXECUTOR",
     # Utils:
     "eom_exam_info_to_api_exam_info",
     "get_agent_websock_url",
     "get_ui_websock_url",
+    "get_latency_stats",
     # API commands:
     "async_command",
     "get_current_exam_package",
@@ -33,6 +38,21 @@ __all__ = [
 
 _LOGGER = logging.getLogger(__name__)
 
+_COMPONENT = "API"
+
+_POOL_MAXSIZE = 10
+
+# All requests to API share the same keep-alive connection pool.
+_SESSION = ktp_controller.http.new_session(
+    pool_maxsize=_POOL_MAXSIZE, component=_COMPONENT
+)
+
+# Worker threads of ktp_controller.api.asyncclient, one per pooled
+# connection.
+EXECUTOR = ktp_controller.http.new_executor(
+    max_workers=_POOL_MAXSIZE, component=_COMPONENT
+)
+
 
 # Utils:
 
@@ -40,7 +60,7 @@ _LOGGER = logging.getLogger(__name__)
 def _post(path: str, *, data=None, json=None, timeout: int = 5) -> requests.Response:
     if data is None:
         data = {}
-    response = requests.post(
+    response = _SESSION.post(
         ktp_controller.utils.get_url(
             f"{SETTINGS.api_host}:{SETTINGS.api_port}", path, scheme="http"
         ),
@@ -119,6 +139,15 @@ def get_ui_websock_url():
     )
 
 
+def get_latency_stats() -> typing.Dict[str, ktp_controller.metrics.LatencyStats]:
+    """Return latency counters of API requests made by this process,
+    keyed by API endpoint path.
+    """
+
+    latency_stats = ktp_controller.http.get_latency_stats(_COMPONENT)
+    return {path: stats for (_, path), stats in latency_stats.items()}
+
+
 # API commands:
 
 
@@ -143,8 +172,18 @@ def get_last_abitti2_status_report(
     ).json()
 
 
-def get_current_exam_package(*, timeout: int = 20) -> typing.Dict[str, typing.Any]:
-    return _post("/api/v1/exam/get_current_exam_package", timeout=timeout).json()
+def get_current_exam_package(
+    *, notify_agents: bool = True, timeout: int = 20
+) -> typing.Dict[str, typing.Any]:
+    """Return the current exam package. If getting it promotes a new
+    package to current, agents are notified, unless notify_agents is
+    False."""
+
+    return _post(
+        "/api/v1/exam/get_current_exam_package",
+        json={"notify_agents": notify_agents},
+        timeout=timeout,
+    ).json()
 
 
 def set_current_exam_package_state(
@@ -10,6 +10,8 @@ import sqlalchemy.orm
 import sqlalchemy.sql
 
 # Internal imports
+import ktp_controller.agent.utils
+import ktp_controller.messages
 import ktp_controller.utils
 from ktp_controller.api import models
 from ktp_controller.api.database import get_db
@@ -174,6 +176,11 @@ async def _save_exam_info(
 
     db.commit()
 
+    # New exam info may change which package becomes current next.
+    await ktp_controller.agent.utils.send_invalidation(
+        ktp_controller.messages.Invalidation.CURRENT_EXAM_PACKAGE
+    )
+
 
 _VALID_TRANSITIONS = {
     None: "ready",
@@ -234,6 +241,10 @@ async def _set_current_exam_package_state(
             db_current_exam_package.current = False
         db.commit()
 
+        await ktp_controller.agent.utils.send_invalidation(
+            ktp_controller.messages.Invalidation.CURRENT_EXAM_PACKAGE
+        )
+
     return old_state
 
 
@@ -243,6 +254,7 @@ async def _set_current_exam_package_state(
     summary="Get current exam package",
 )
 async def _get_current_exam_package(
+    data: schemas.GetCurrentExamPackageData | None = None,
     db: sqlalchemy.orm.Session = fastapi.Depends(get_db),
 ):
     utcnow = ktp_controller.utils.utcnow()
@@ -273,6 +285,11 @@ async def _get_current_exam_package(
         db_current_exam_package.current = True
         db.commit()
 
+        if data is None or data.notify_agents:
+            await ktp_controller.agent.utils.send_invalidation(
+                ktp_controller.messages.Invalidation.CURRENT_EXAM_PACKAGE
+            )
+
     return {
         "external_id": db_current_exam_package.external_id,
         "start_time": db_current_exam_package.start_time.replace(
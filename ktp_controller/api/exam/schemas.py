@@ -89,6 +89,12 @@ class GetScheduledExamData(ktp_controller.pydantic.BaseModel):
     external_id: pydantic.StrictStr
 
 
+class GetCurrentExamPackageData(ktp_controller.pydantic.BaseModel):
+    # Agents need not be notified if the caller is the agent, which gets
+    # the promoted package in the response anyway.
+    notify_agents: pydantic.StrictBool = True
+
+
 class SetCurrentExamPackageStateData(ktp_controller.pydantic.BaseModel):
     external_id: pydantic.StrictStr
     state: ScheduledExamPackageState
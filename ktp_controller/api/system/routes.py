@@ -2,6 +2,7 @@
 import asyncio
 import json
 import logging
+import time
 
 # Third-party imports
 import fastapi  # type: ignore
@@ -20,6 +21,7 @@ import ktp_controller.messages
 import ktp_controller.redis
 import ktp_controller.pydantic
 import ktp_controller.api.utils
+import ktp_controller.tracing
 import ktp_controller.ui
 
 # Relative imports
@@ -46,7 +48,16 @@ Return asynchronous message UUID as application/json body.
 """,
 )
 async def _async_command(command_data: ktp_controller.messages.CommandData):
-    return await ktp_controller.agent.utils.send_command(command_data)
+    started_at = time.time()
+    command_uuid = await ktp_controller.agent.utils.send_command(command_data)
+    ktp_controller.tracing.record_span(
+        "api.async_command",
+        command_uuid,
+        started_at,
+        time.time(),
+        command=command_data.command,
+    )
+    return command_uuid
 
 
 @router.websocket("/ui_websocket")
@@ -147,9 +158,13 @@ async def _communicate_with_agent(websock: fastapi.WebSocket):
                 _LOGGER.error(
                     "Agent command %r failed", command_result_message.data.command_uuid
                 )
-            await ktp_controller.ui.forward_command_result_message(
-                command_result_message
-            )
+            with ktp_controller.tracing.span(
+                "api.forward_command_result",
+                str(command_result_message.data.command_uuid),
+            ):
+                await ktp_controller.ui.forward_command_result_message(
+                    command_result_message
+                )
             _LOGGER.info("forwarded command result successfully")
             continue
         if message["kind"] == ktp_controller.messages.MessageKind.STATUS_REPORT:
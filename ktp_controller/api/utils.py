@@ -1,10 +1,14 @@
 # Standard library imports
+import json
 import logging
 
 # Third-party imports
 import fastapi
 import redis.asyncio as redis
 
+# Internal imports
+import ktp_controller.tracing
+
 
 __all__ = [
     "deliver_pubsub_messages_to_websock",
@@ -20,6 +24,21 @@ _LOGGER = logging.getLogger(__name__)
 # Utils:
 
 
+def _trace_delivery(data: str) -> None:
+    # Cheap check first, only command messages are traced.
+    if '"command' not in data:
+        return
+    try:
+        message = json.loads(data)
+    except ValueError:
+        return
+    command_uuid = ktp_controller.tracing.get_command_uuid(message)
+    if command_uuid is not None:
+        ktp_controller.tracing.record_instant(
+            f"api.deliver_{message['kind']}", command_uuid
+        )
+
+
 async def deliver_pubsub_messages_to_websock(
     pubsub: redis.client.PubSub, websock: fastapi.WebSocket
 ):
@@ -28,3 +47,4 @@ async def deliver_pubsub_messages_to_websock(
         if message and message["type"] == "message":
             data = message["data"].decode("ascii")
             await websock.send_text(data)
+            _trace_delivery(data)
@@ -3,6 +3,7 @@
 # Standard library imports
 import argparse
 import asyncio
+import time
 
 # Third-party imports
 import yaml
@@ -10,10 +11,23 @@ import yaml
 # Internal imports
 
 
+# Spans of the last hops are written by API and agent concurrently with
+# the command result delivery, give their trace writers a moment before
+# reading them.
+_TRACE_SETTLE_TIME_SEC = 0.2
+
+
 async def _command_api_async_command(args) -> int:
     import ktp_controller.api.client  # pylint: disable=import-outside-toplevel
+    import ktp_controller.tracing  # pylint: disable=import-outside-toplevel
+
+    started_at = time.time()
+    command_uuid = ktp_controller.api.client.async_command(args.COMMAND)
+    ktp_controller.tracing.record_span(
+        "cli.post_async_command", command_uuid, started_at, time.time()
+    )
 
-    return ktp_controller.api.client.async_command(args.COMMAND)
+    return command_uuid
 
 
 def _print_as_yaml(obj):
@@ -60,6 +74,17 @@ async def _command_status(args) -> int:  # pylint: disable=unused-argument
     return None
 
 
+async def _command_metrics(args) -> int:  # pylint: disable=unused-argument
+    import requests  # pylint: disable=import-outside-toplevel
+    import ktp_controller.agent.metrics  # pylint: disable=import-outside-toplevel
+
+    response = requests.get(ktp_controller.agent.metrics.get_metrics_url(), timeout=5)
+    response.raise_for_status()
+    print(response.text, end="")
+
+    return None
+
+
 _COMMANDS = {
     "enable_auto_control": _command_api_async_command,
     "disable_auto_control": _command_api_async_command,
@@ -68,6 +93,7 @@ _COMMANDS = {
     "archive_current_exam_package": _command_api_async_command,
     "prepare_current_exam_package": _command_api_async_command,
     "status": _command_status,
+    "metrics": _command_metrics,
 }
 
 
@@ -77,12 +103,14 @@ async def _dispatch_command(args) -> int:
     import ktp_controller.api.client  # pylint: disable=import-outside-toplevel
     import ktp_controller.utils  # pylint: disable=import-outside-toplevel
     import ktp_controller.messages  # pylint: disable=import-outside-toplevel
+    import ktp_controller.tracing  # pylint: disable=import-outside-toplevel
 
     command_result_data = None
 
     async with websockets.connect(
         ktp_controller.api.client.get_ui_websock_url()
     ) as ui_websock:
+        started_at = time.time()
         command_uuid = await _COMMANDS[args.COMMAND](args)
         if command_uuid is not None:
             async for data in ui_websock:
@@ -103,8 +131,21 @@ async def _dispatch_command(args) -> int:
                 command_result_data = command_result_message.data
                 if str(command_result_data.command_uuid) != command_uuid:
                     continue
+                ktp_controller.tracing.record_span(
+                    "cli.command", command_uuid, started_at, time.time()
+                )
                 break
 
+    if args.trace and command_uuid is not None:
+        ktp_controller.tracing.flush_trace_events()
+        await asyncio.sleep(_TRACE_SETTLE_TIME_SEC)
+        print(f"# Trace of command {command_uuid}:")
+        print(
+            ktp_controller.tracing.format_command_trace(
+                ktp_controller.tracing.read_command_trace(command_uuid)
+            )
+        )
+
     if command_result_data is not None and not command_result_data.command_status.is_ok:
         print(f"ERROR: {args.COMMAND} failed: {command_result_data.error_message}")
         return 1
@@ -116,6 +157,11 @@ def run() -> int:
     parser = argparse.ArgumentParser(
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
     )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="print per-hop latency breakdown of the command",
+    )
     subparsers = parser.add_subparsers(title="Commands", dest="COMMAND", required=True)
     for command in _COMMANDS:
         subparsers.add_parser(command)
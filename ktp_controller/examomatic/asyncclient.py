@@ -0,0 +1,40 @@
+# Standard library imports
+import functools
+
+# Third-party imports
+
+# Internal imports
+import ktp_controller.http
+import ktp_controller.examomatic.client
+
+
+__all__ = [
+    # Exam-O-Matic API commands:
+    "send_abitti2_status_report",
+    "get_exam_info",
+    "download_exam_file",
+    "download_dummy_exam_file",
+    "upload_answers_file",
+]
+
+
+_to_async = functools.partial(
+    ktp_controller.http.to_async, executor=ktp_controller.examomatic.client.EXECUTOR
+)
+
+
+# Exam-O-Matic API commands, same as in
+# ktp_controller.examomatic.client, but these do not block the event
+# loop. Downloads are streamed to disk chunk by chunk in a worker
+# thread.
+
+
+send_abitti2_status_report = _to_async(
+    ktp_controller.examomatic.client.send_abitti2_status_report
+)
+get_exam_info = _to_async(ktp_controller.examomatic.client.get_exam_info)
+download_exam_file = _to_async(ktp_controller.examomatic.client.download_exam_file)
+download_dummy_exam_file = _to_async(
+    ktp_controller.examomatic.client.download_dummy_exam_file
+)
+upload_answers_file = _to_async(ktp_controller.examomatic.client.upload_answers_file)
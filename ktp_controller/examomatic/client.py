@@ -4,6 +4,7 @@ import hashlib
 import json
 import logging
 import os.path
+import time
 import typing
 
 # Third-party imports
@@ -12,12 +13,38 @@ import requests.auth
 import requests.exceptions
 
 # Internal imports
+import ktp_controller.http
 import ktp_controller.utils
 from ktp_controller.settings import SETTINGS
 
 _LOGGER = logging.getLogger(__file__)
 
+_COMPONENT = "Exam-O-Matic"
+
+_POOL_MAXSIZE = 10
+
+# All requests to Exam-O-Matic share the same keep-alive connection
+# pool.
+_SESSION = ktp_controller.http.new_session(
+    pool_maxsize=_POOL_MAXSIZE, component=_COMPONENT
+)
+
+# Worker threads of ktp_controller.examomatic.asyncclient, one per pooled
+# connection.
+EXECUTOR = ktp_controller.http.new_executor(
+    max_workers=_POOL_MAXSIZE, component=_COMPONENT
+)
+
+# Journals of chunked answers uploads are kept here, keyed by exam
+# package and answers checksum, not by the local answers filepath, which
+# is different on every attempt.
+_ANSWERS_UPLOAD_JOURNAL_DIR = os.path.expanduser(
+    "~/.local/share/ktp-controller/answers-upload-journals"
+)
+
 __all__ = [
+    # Constants:
+    "EXECUTOR",
     # Utils:
     "get_basic_auth",
     "get_examomatic_websock_url",
@@ -30,6 +57,7 @@ __all__ = [
     "download_dummy_exam_file",
     "websock_ack",
     "upload_answers_file",
+    "upload_answers_file_chunked",
 ]
 
 
@@ -51,8 +79,9 @@ def _get(
     path: str,
     *,
     extra_params: typing.Optional[typing.Dict[str, str]] = None,
+    extra_headers: typing.Optional[typing.Dict[str, str]] = None,
     stream: bool = False,
-    timeout: int = 20,
+    timeout: ktp_controller.http.Timeout = 20,
 ) -> requests.Response:
     if extra_params is None:
         extra_params = {}
@@ -63,7 +92,7 @@ def _get(
     }
     params.update(extra_params)
 
-    response = requests.get(
+    response = _SESSION.get(
         ktp_controller.utils.get_url(
             SETTINGS.examomatic_host,
             path,
@@ -71,6 +100,7 @@ def _get(
         ),
         auth=_get_auth(),
         params=params,
+        headers=extra_headers,
         timeout=timeout,
         stream=stream,
     )
@@ -91,9 +121,18 @@ def _post(
     data: bytes | None = None,
     json: typing.Any | None = None,  # pylint: disable=redefined-outer-name
     files: typing.Dict | None = None,
-    timeout: int = 20,
+    multipart: ktp_controller.http.MultipartBody | None = None,
+    extra_headers: typing.Optional[typing.Dict[str, str]] = None,
+    timeout: ktp_controller.http.Timeout = 20,
 ) -> requests.Response:
-    response = requests.post(
+    headers = dict(extra_headers or {})
+    if multipart is not None:
+        if data is not None or files is not None:
+            raise ValueError("multipart cannot be used with data or files")
+        headers["Content-Type"] = multipart.content_type
+        data = multipart  # type: ignore
+
+    response = _SESSION.post(
         ktp_controller.utils.get_url(
             SETTINGS.examomatic_host,
             path,
@@ -108,6 +147,7 @@ def _post(
             "id": SETTINGS.id,
         },
         files=files,
+        headers=headers or None,
         timeout=timeout,
     )
 
@@ -167,7 +207,7 @@ def websock_validate_message(data):
 
 
 def send_abitti2_status_report(
-    status_report: typing.Dict, *, timeout: int = 20
+    status_report: typing.Dict, *, timeout: ktp_controller.http.Timeout = 20
 ) -> typing.Any:
     return _post(
         "/v1/servers/status_update",
@@ -176,42 +216,181 @@ def send_abitti2_status_report(
     ).json()
 
 
-def get_exam_info(*, timeout: int = 20) -> typing.Dict:
+def get_exam_info(*, timeout: ktp_controller.http.Timeout = 20) -> typing.Dict:
     return _get("/v2/schedules/exam_packages", timeout=timeout).json()
 
 
 def get_exam_file_stream(
-    sha256sum: str, *, timeout: int = 20, stream_chunk_size=4096
+    sha256sum: str,
+    *,
+    timeout: ktp_controller.http.Timeout = 20,
+    stream_chunk_size: int = 64 * 1024,
 ) -> typing.Iterable[bytes]:
-    response = _get(
+    sha256sum_of_downloaded_file = hashlib.sha256()
+
+    with _get(
         "/v1/exams/raw_file",
         extra_params={"hash": sha256sum},
         stream=True,
         timeout=timeout,
-    )
-
-    sha256sum_of_downloaded_file = hashlib.sha256()
-
-    for chunk in response.iter_content(chunk_size=stream_chunk_size):
-        sha256sum_of_downloaded_file.update(chunk)
-        yield chunk
+    ) as response:
+        for chunk in response.iter_content(chunk_size=stream_chunk_size):
+            sha256sum_of_downloaded_file.update(chunk)
+            yield chunk
 
     if sha256sum_of_downloaded_file.hexdigest() != sha256sum:
         raise RuntimeError("sha256sum mismatch of downloaded exam file")
 
 
-def download_exam_file(sha256sum: str, dest_filepath: str, *, timeout: int = 20):
+def _read_journal(
+    journal_filepath: str,
+) -> typing.Dict[str, typing.Any] | None:
+    try:
+        with open(journal_filepath, "r", encoding="ascii") as journal_file:
+            return json.load(journal_file)
+    except FileNotFoundError:
+        return None
+    except Exception:  # pylint: disable=broad-exception-caught
+        _LOGGER.exception("ignoring invalid journal %r", journal_filepath)
+        return None
+
+
+def _write_download_journal(
+    journal_filepath: str, sha256sum: str, offset: int, partial_sha256sum: str
+):
     with ktp_controller.utils.open_atomic_write(
-        dest_filepath, exclusive=True
-    ) as dest_file:
-        for chunk in get_exam_file_stream(sha256sum, timeout=timeout):
-            dest_file.write(chunk)
+        journal_filepath, encoding="ascii"
+    ) as journal_file:
+        json.dump(
+            {
+                "sha256": sha256sum,
+                "offset": offset,
+                "partial_sha256": partial_sha256sum,
+            },
+            journal_file,
+        )
+
+
+def _restore_partial_download(
+    sha256sum: str, partial_filepath: str, journal_filepath: str
+) -> typing.Tuple[int, typing.Any]:
+    """Return (offset, hash object) to resume the download from.
+
+    Hash objects cannot be persisted, so the journal records the
+    SHA256 checksum of the first offset bytes instead. The hash state
+    is restored by re-reading those bytes from the local disk, which
+    also verifies the partial file has not been corrupted.
+    """
+
+    journal = _read_journal(journal_filepath)
+    if journal is None or journal["sha256"] != sha256sum:
+        return (0, hashlib.sha256())
+
+    offset = journal["offset"]
+    partial_sha256sum = hashlib.sha256()
+    try:
+        with open(partial_filepath, "rb") as partial_file:
+            remaining = offset
+            while remaining > 0:
+                chunk = partial_file.read(min(remaining, 1024**2))
+                if not chunk:
+                    break
+                partial_sha256sum.update(chunk)
+                remaining -= len(chunk)
+    except FileNotFoundError:
+        return (0, hashlib.sha256())
+
+    if remaining > 0 or partial_sha256sum.hexdigest() != journal["partial_sha256"]:
+        _LOGGER.warning(
+            "partial download %r does not match its journal, restarting",
+            partial_filepath,
+        )
+        return (0, hashlib.sha256())
+
+    return (offset, partial_sha256sum)
+
+
+def download_exam_file(
+    sha256sum: str,
+    dest_filepath: str,
+    *,
+    timeout: ktp_controller.http.Timeout = 20,
+    stream_chunk_size: int = 64 * 1024,
+    journal_interval_bytes: int = 1024**2,
+):
+    """Download exam file to dest_filepath, which must not exist.
+
+    Download is written to a partial file next to dest_filepath, and
+    its progress is recorded to a journal sidecar file every
+    journal_interval_bytes. If the download is interrupted, the next
+    call continues from the last journaled offset with a HTTP Range
+    request. Dest file is created only after the checksum has been
+    verified.
+    """
+
+    if os.path.exists(dest_filepath):
+        raise FileExistsError(dest_filepath)
+
+    partial_filepath = f"{dest_filepath}.partial"
+    journal_filepath = f"{partial_filepath}.journal"
+
+    offset, sha256sum_of_downloaded_file = _restore_partial_download(
+        sha256sum, partial_filepath, journal_filepath
+    )
+    if offset > 0:
+        _LOGGER.info("resuming download of %r from offset %d", dest_filepath, offset)
+
+    # Interrupted download might have been complete already.
+    if offset == 0 or sha256sum_of_downloaded_file.hexdigest() != sha256sum:
+        with _get(
+            "/v1/exams/raw_file",
+            extra_params={"hash": sha256sum},
+            extra_headers={"Range": f"bytes={offset}-"} if offset > 0 else None,
+            stream=True,
+            timeout=timeout,
+        ) as response:
+            if offset > 0 and response.status_code != 206:
+                _LOGGER.warning(
+                    "Exam-O-Matic does not support resuming downloads, restarting"
+                )
+                offset, sha256sum_of_downloaded_file = (0, hashlib.sha256())
+
+            journaled_offset = offset
+            with open(partial_filepath, "ab") as partial_file:
+                partial_file.truncate(offset)
+                for chunk in response.iter_content(chunk_size=stream_chunk_size):
+                    partial_file.write(chunk)
+                    sha256sum_of_downloaded_file.update(chunk)
+                    offset += len(chunk)
+                    if offset - journaled_offset >= journal_interval_bytes:
+                        partial_file.flush()
+                        os.fsync(partial_file.fileno())
+                        _write_download_journal(
+                            journal_filepath,
+                            sha256sum,
+                            offset,
+                            sha256sum_of_downloaded_file.hexdigest(),
+                        )
+                        journaled_offset = offset
+
+    try:
+        if sha256sum_of_downloaded_file.hexdigest() != sha256sum:
+            raise RuntimeError("sha256sum mismatch of downloaded exam file")
+        # Fails if dest file has appeared meanwhile.
+        os.link(partial_filepath, dest_filepath)
+    finally:
+        # Either completed, or corrupted beyond repair.
+        os.unlink(partial_filepath)
+        try:
+            os.unlink(journal_filepath)
+        except FileNotFoundError:
+            pass
 
 
 def download_dummy_exam_file(
     dest_filepath: str,
     *,
-    timeout: int = 20,  # pylint: disable=unused-argument
+    timeout: ktp_controller.http.Timeout = 20,  # pylint: disable=unused-argument
 ):
     ktp_controller.utils.copy_atomic(
         os.path.join(os.path.dirname(__file__), "dummy-exam-file.mex"), dest_filepath
@@ -239,28 +418,218 @@ def upload_answers_file(
     filepath: str,
     sha256sum: str | None = None,
     is_final: IsFinal = IsFinal.UNKNOWN,
-    timeout: int = 20,
+    timeout: ktp_controller.http.Timeout = 20,
+    chunk_size: int | None = None,
 ):
+    """Upload answers file to Exam-O-Matic.
+
+    If chunk_size is non-zero, the file is uploaded in chunks of
+    chunk_size bytes, see upload_answers_file_chunked(). If chunk_size
+    is None, SETTINGS.examomatic_answers_upload_chunk_size is used.
+    """
+
     is_final = IsFinal(is_final)
 
     if sha256sum is None:
         sha256sum = ktp_controller.utils.sha256(filepath)
 
+    if chunk_size is None:
+        chunk_size = SETTINGS.examomatic_answers_upload_chunk_size
+    if chunk_size:
+        upload_answers_file_chunked(
+            exam_package_external_id=exam_package_external_id,
+            filepath=filepath,
+            sha256sum=sha256sum,
+            is_final=is_final,
+            timeout=timeout,
+            chunk_size=chunk_size,
+        )
+        return
+
     filename = os.path.basename(filepath)
+    file_size = os.path.getsize(filepath)
+
+    _post(
+        "/v1/answers/upload",
+        multipart=ktp_controller.http.MultipartBody(
+            [
+                ktp_controller.http.MultipartPart.field("answers_file", filename),
+                ktp_controller.http.MultipartPart.field("file_sha256", sha256sum),
+                ktp_controller.http.MultipartPart.field("file_size", str(file_size)),
+                ktp_controller.http.MultipartPart.field("is_final", str(is_final)),
+                ktp_controller.http.MultipartPart.field(
+                    "package_id", exam_package_external_id
+                ),
+                ktp_controller.http.MultipartPart(
+                    "answers_file",
+                    ktp_controller.utils.bytes_stream(filepath, chunk_size=64 * 1024),
+                    filename=filename,
+                    size=file_size,
+                ),
+            ]
+        ),
+        timeout=timeout,
+    )
+
+
+def _init_answers_upload(
+    *,
+    exam_package_external_id: str,
+    filepath: str,
+    sha256sum: str,
+    is_final: IsFinal,
+    chunk_size: int,
+    journal_filepath: str,
+    timeout: ktp_controller.http.Timeout,
+) -> typing.Dict[str, typing.Any]:
+    answers_upload = _post(
+        "/v1/answers/uploads",
+        json={
+            "package_id": exam_package_external_id,
+            "answers_file": os.path.basename(filepath),
+            "file_size": os.path.getsize(filepath),
+            "file_sha256": sha256sum,
+            "is_final": str(is_final),
+            "chunk_size": chunk_size,
+        },
+        timeout=timeout,
+    ).json()
 
-    with open(filepath, "rb") as f:
-        file_size = f.seek(0, 2)
-        f.seek(0)
-
-        _post(
-            "/v1/answers/upload",
-            data={
-                "answers_file": filename,
-                "file_sha256": sha256sum,
-                "file_size": file_size,
-                "is_final": is_final,
-                "package_id": exam_package_external_id,
+    with ktp_controller.utils.open_atomic_write(
+        journal_filepath, encoding="ascii"
+    ) as journal_file:
+        json.dump(
+            {
+                "upload_id": answers_upload["upload_id"],
+                "sha256": sha256sum,
+                "chunk_size": chunk_size,
+                "is_final": str(is_final),
             },
-            files={"answers_file": f},
-            timeout=timeout,
+            journal_file,
         )
+
+    return answers_upload
+
+
+def _get_answers_upload_status(
+    upload_id: str, *, timeout: ktp_controller.http.Timeout
+) -> typing.Dict[str, typing.Any] | None:
+    try:
+        return _get(f"/v1/answers/uploads/{upload_id}", timeout=timeout).json()
+    except requests.exceptions.HTTPError as http_error:
+        if http_error.response.status_code == 404:
+            return None
+        raise
+
+
+def _send_answers_chunks(
+    answers_upload: typing.Dict[str, typing.Any],
+    filepath: str,
+    *,
+    chunk_size: int,
+    timeout: ktp_controller.http.Timeout,
+):
+    received_chunks = set(answers_upload["received_chunks"])
+    with open(filepath, "rb") as answers_file:
+        for index in range(answers_upload["chunk_count"]):
+            if index in received_chunks:
+                continue
+            answers_file.seek(index * chunk_size)
+            chunk = answers_file.read(chunk_size)
+            _post(
+                f"/v1/answers/uploads/{answers_upload['upload_id']}/chunks/{index}",
+                data=chunk,
+                extra_headers={"X-Chunk-SHA256": hashlib.sha256(chunk).hexdigest()},
+                timeout=timeout,
+            )
+
+
+def upload_answers_file_chunked(
+    *,
+    exam_package_external_id: str,
+    filepath: str,
+    sha256sum: str | None = None,
+    is_final: IsFinal = IsFinal.UNKNOWN,
+    timeout: ktp_controller.http.Timeout = 20,
+    chunk_size: int = 4 * 1024**2,
+    max_attempts: int = 5,
+    retry_interval_sec: float = 2,
+    journal_dirpath: str | None = None,
+):
+    """Upload answers file in chunks: init the upload, send numbered
+    chunks with their SHA256 checksums, and commit the upload.
+
+    If sending fails, the upload continues from the chunks Exam-O-Matic
+    has acknowledged, at most max_attempts times. Upload id is recorded
+    to a journal in journal_dirpath (defaults to a directory under the
+    user's data directory), keyed by exam package and answers checksum.
+    An upload interrupted by a restart continues from where it was left
+    too, even if the same answers were downloaded again to a different
+    filepath.
+    """
+
+    is_final = IsFinal(is_final)
+
+    if sha256sum is None:
+        sha256sum = ktp_controller.utils.sha256(filepath)
+
+    if journal_dirpath is None:
+        journal_dirpath = _ANSWERS_UPLOAD_JOURNAL_DIR
+    os.makedirs(journal_dirpath, exist_ok=True)
+    journal_filepath = os.path.join(
+        journal_dirpath, f"{exam_package_external_id}_{sha256sum}.json"
+    )
+    journal = _read_journal(journal_filepath)
+
+    upload_id = None
+    if journal is not None and journal == {
+        "upload_id": journal["upload_id"],
+        "sha256": sha256sum,
+        "chunk_size": chunk_size,
+        "is_final": str(is_final),
+    }:
+        upload_id = journal["upload_id"]
+
+    for attempt in range(1, max_attempts + 1):
+        try:
+            answers_upload = (
+                None
+                if upload_id is None
+                else _get_answers_upload_status(upload_id, timeout=timeout)
+            )
+            if answers_upload is None:
+                answers_upload = _init_answers_upload(
+                    exam_package_external_id=exam_package_external_id,
+                    filepath=filepath,
+                    sha256sum=sha256sum,
+                    is_final=is_final,
+                    chunk_size=chunk_size,
+                    journal_filepath=journal_filepath,
+                    timeout=timeout,
+                )
+                upload_id = answers_upload["upload_id"]
+
+            if not answers_upload["is_committed"]:
+                _send_answers_chunks(
+                    answers_upload, filepath, chunk_size=chunk_size, timeout=timeout
+                )
+                _post(f"/v1/answers/uploads/{upload_id}/commit", timeout=timeout)
+        except (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+        ):
+            if attempt == max_attempts:
+                raise
+            _LOGGER.warning(
+                "chunked upload of answers file %r was interrupted (attempt %d/%d), "
+                "resuming in %.1f seconds",
+                filepath,
+                attempt,
+                max_attempts,
+                retry_interval_sec * attempt,
+            )
+            time.sleep(retry_interval_sec * attempt)
+        else:
+            break
+
+    os.unlink(journal_filepath)
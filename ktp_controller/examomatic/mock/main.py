@@ -6,10 +6,12 @@ import copy
 import datetime
 import hashlib
 import logging
+import os.path
+import re
 import urllib.parse
 import uuid
 
-from typing import Annotated, Dict, List, Any
+from typing import Annotated, Dict, List, Any, Literal
 
 # Third-party imports
 import fastapi  # type: ignore
@@ -62,6 +64,7 @@ APP.state.pong_count = 0
 APP.state.ack_count = 0
 APP.state.refresh_exams_count = 0
 APP.state.requests = []
+APP.state.answers_uploads = {}
 
 
 @APP.middleware("http")
@@ -84,10 +87,38 @@ async def _get_exam_file_stream(
     sha256sum: ktp_controller.pydantic.StrictSHA256String = fastapi.Query(
         ..., alias="hash"
     ),
+    range_: str | None = fastapi.Header(None, alias="Range"),
 ):
     _check_domain(domain)
+
+    exam_filepath = get_exam_filepath(sha256sum)
+
+    if range_ is None:
+        return fastapi.responses.StreamingResponse(
+            ktp_controller.utils.bytes_stream(exam_filepath),
+            media_type="application/zip",
+        )
+
+    # Only single open-ended ranges are supported, that's what
+    # resumed downloads need.
+    range_match = re.fullmatch(r"bytes=(\d+)-", range_.strip())
+    if range_match is None:
+        raise fastapi.HTTPException(400, detail=f"unsupported range: {range_!r}")
+
+    offset = int(range_match.group(1))
+    file_size = os.path.getsize(exam_filepath)
+    if offset >= file_size:
+        raise fastapi.HTTPException(
+            416, headers={"Content-Range": f"bytes */{file_size}"}
+        )
+
     return fastapi.responses.StreamingResponse(
-        ktp_controller.utils.bytes_stream(get_exam_filepath(sha256sum)),
+        ktp_controller.utils.bytes_stream(exam_filepath, offset=offset),
+        status_code=206,
+        headers={
+            "Accept-Ranges": "bytes",
+            "Content-Range": f"bytes {offset}-{file_size - 1}/{file_size}",
+        },
         media_type="application/zip",
     )
 
@@ -267,6 +298,155 @@ def _upload_answers_file(
         raise fastapi.HTTPException(400, detail=f"incorrect is_final: {is_final!r}")
 
 
+class _AnswersUploadInit(ktp_controller.pydantic.BaseModel):
+    package_id: pydantic.StrictStr
+    answers_file: pydantic.StrictStr
+    file_size: pydantic.NonNegativeInt
+    file_sha256: ktp_controller.pydantic.StrictSHA256String
+    is_final: Literal["false", "true", "unknown"]
+    chunk_size: pydantic.PositiveInt
+
+
+def _get_answers_upload(upload_id: str) -> Dict[str, Any]:
+    try:
+        return APP.state.answers_uploads[upload_id]
+    except KeyError as key_error:
+        raise fastapi.HTTPException(404, detail="unknown upload_id") from key_error
+
+
+def _get_answers_upload_status(answers_upload: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "upload_id": answers_upload["upload_id"],
+        "chunk_count": answers_upload["chunk_count"],
+        "received_chunks": sorted(answers_upload["chunks"]),
+        "is_committed": answers_upload["is_committed"],
+    }
+
+
+@APP.post(
+    "/v1/answers/uploads",
+    response_model=None,
+    status_code=200,
+)
+async def _init_answers_upload(
+    request: _AnswersUploadInit,
+    domain: str,
+    hostname: str,  # pylint: disable=unused-argument
+    server_id: int = fastapi.Query(..., alias="id"),  # pylint: disable=unused-argument
+):
+    _check_domain(domain)
+
+    upload_id = str(uuid.uuid4())
+    APP.state.answers_uploads[upload_id] = {
+        "upload_id": upload_id,
+        "init": request.model_dump(),
+        "chunk_count": max(1, -(-request.file_size // request.chunk_size)),
+        "chunks": {},
+        "is_committed": False,
+    }
+
+    return _get_answers_upload_status(APP.state.answers_uploads[upload_id])
+
+
+@APP.get(
+    "/v1/answers/uploads/{upload_id}",
+    response_model=None,
+    status_code=200,
+)
+async def _get_answers_upload_status_route(
+    upload_id: str,
+    domain: str,
+    hostname: str,  # pylint: disable=unused-argument
+    server_id: int = fastapi.Query(..., alias="id"),  # pylint: disable=unused-argument
+):
+    _check_domain(domain)
+
+    return _get_answers_upload_status(_get_answers_upload(upload_id))
+
+
+@APP.post(
+    "/v1/answers/uploads/{upload_id}/chunks/{index}",
+    response_model=None,
+    status_code=200,
+)
+async def _upload_answers_chunk(
+    request: fastapi.Request,
+    upload_id: str,
+    index: int,
+    domain: str,
+    hostname: str,  # pylint: disable=unused-argument
+    server_id: int = fastapi.Query(..., alias="id"),  # pylint: disable=unused-argument
+    chunk_sha256: str = fastapi.Header(..., alias="X-Chunk-SHA256"),
+):
+    _check_domain(domain)
+
+    answers_upload = _get_answers_upload(upload_id)
+    if answers_upload["is_committed"]:
+        raise fastapi.HTTPException(409, detail="upload is already committed")
+    if not 0 <= index < answers_upload["chunk_count"]:
+        raise fastapi.HTTPException(400, detail=f"invalid chunk index: {index}")
+
+    chunk = await request.body()
+
+    expected_chunk_sha256 = hashlib.sha256(chunk).hexdigest()
+    if expected_chunk_sha256 != chunk_sha256:
+        raise fastapi.HTTPException(
+            400,
+            detail=f"incorrect chunk sha256, expected {expected_chunk_sha256}, got {chunk_sha256}",
+        )
+
+    chunk_size = answers_upload["init"]["chunk_size"]
+    file_size = answers_upload["init"]["file_size"]
+    expected_chunk_size = min(chunk_size, file_size - index * chunk_size)
+    if len(chunk) != expected_chunk_size:
+        raise fastapi.HTTPException(
+            400,
+            detail=f"incorrect chunk size, expected {expected_chunk_size}, got {len(chunk)}",
+        )
+
+    answers_upload["chunks"][index] = chunk
+
+    return _get_answers_upload_status(answers_upload)
+
+
+@APP.post(
+    "/v1/answers/uploads/{upload_id}/commit",
+    response_model=None,
+    status_code=200,
+)
+async def _commit_answers_upload(
+    upload_id: str,
+    domain: str,
+    hostname: str,  # pylint: disable=unused-argument
+    server_id: int = fastapi.Query(..., alias="id"),  # pylint: disable=unused-argument
+):
+    _check_domain(domain)
+
+    answers_upload = _get_answers_upload(upload_id)
+
+    missing_chunks = set(range(answers_upload["chunk_count"])) - set(
+        answers_upload["chunks"]
+    )
+    if missing_chunks:
+        raise fastapi.HTTPException(
+            400, detail=f"missing chunks: {sorted(missing_chunks)}"
+        )
+
+    sha256 = hashlib.sha256()
+    for index in range(answers_upload["chunk_count"]):
+        sha256.update(answers_upload["chunks"][index])
+    if sha256.hexdigest() != answers_upload["init"]["file_sha256"]:
+        raise fastapi.HTTPException(
+            400,
+            detail=f"incorrect file_sha256, expected {sha256.hexdigest()}, "
+            f"got {answers_upload['init']['file_sha256']}",
+        )
+
+    answers_upload["is_committed"] = True
+
+    return _get_answers_upload_status(answers_upload)
+
+
 async def _play_ping_pong_with_ktp_controller(websock: fastapi.WebSocket):
     async for message in websock.iter_json():
         if message["type"] == "ping":
@@ -10,6 +10,15 @@ import os.path
 # ~/.local/share/ktp-controller/exam-files/FILE_UUID/FILE_SHA256
 _EXAM_FILE_DIR = os.path.expanduser("~/.local/share/ktp-controller/exam-files")
 
+# Contents of all exam files will be stored here like so:
+# ~/.local/share/ktp-controller/exam-file-contents/FILE_SHA256[:2]/FILE_SHA256
+#
+# Exam files are hard links to these, so that the same content
+# scheduled under multiple file UUIDs is downloaded and stored once.
+_EXAM_FILE_CONTENT_DIR = os.path.expanduser(
+    "~/.local/share/ktp-controller/exam-file-contents"
+)
+
 # All exam packages will be stored here like so:
 # ~/.local/share/ktp-controller/exam-packages/FILE_UUID/COMPOUND_EXAM_FILE_SHA256
 _EXAM_PACKAGE_DIR = os.path.expanduser("~/.local/share/ktp-controller/exam-packages")
@@ -30,6 +39,7 @@ DUMMY_EXAM_PACKAGE_FILEPATH = os.path.expanduser(
 class LocalFilepathType(str, enum.Enum):
     ANSWERS_FILE = "answers-file"
     EXAM_FILE = "exam-file"
+    EXAM_FILE_CONTENT = "exam-file-content"
     EXAM_PACKAGE = "exam-package"
 
     def __str__(self) -> str:
@@ -43,6 +53,9 @@ def get_local_filepath(
     if local_filepath_type == LocalFilepathType.EXAM_FILE:
         basedir = _EXAM_FILE_DIR
         ext = ".mex"
+    elif local_filepath_type == LocalFilepathType.EXAM_FILE_CONTENT:
+        basedir = _EXAM_FILE_CONTENT_DIR
+        ext = ".mex"
     elif local_filepath_type == LocalFilepathType.EXAM_PACKAGE:
         basedir = _EXAM_PACKAGE_DIR
         ext = ".zip"
@@ -0,0 +1,371 @@
+# Standard library imports
+import asyncio
+import collections
+import concurrent.futures
+import contextvars
+import copy
+import dataclasses
+import functools
+import re
+import secrets
+import threading
+import time
+import typing
+import urllib.parse
+
+# Third-party imports
+import requests
+import requests.adapters
+
+# Internal imports
+import ktp_controller.metrics
+
+# Relative imports
+
+
+__all__ = [
+    # Types:
+    "Timeout",
+    "MultipartPart",
+    "MultipartBody",
+    "RequestStats",
+    # Utils:
+    "new_session",
+    "new_executor",
+    "get_latency_stats",
+    "get_request_stats",
+    "get_request_metric_families",
+    "to_async",
+]
+
+
+# Constants:
+
+
+_REQUEST_STATS: typing.Dict[typing.Tuple[str, str], "RequestStats"] = {}
+_REQUEST_STATS_LOCK = threading.Lock()
+
+# Path segments which are identifiers are replaced by placeholders, so
+# that stats are kept per endpoint, not per resource.
+_NUMBER_SEGMENT_RE = re.compile(r"^[0-9]+$")
+_ID_SEGMENT_RE = re.compile(r"^[0-9a-fA-F-]{16,}$")
+
+
+# Types:
+
+
+# Either a single timeout in seconds, or a (connect, read) pair of
+# timeouts. Read timeout applies to each chunk of streamed responses.
+Timeout = float | typing.Tuple[float, float]
+
+
+@dataclasses.dataclass
+class RequestStats:
+    """Cumulative stats of requests to a single endpoint.
+
+    Bytes of streamed bodies are counted from their Content-Length
+    headers, so chunked streams are not included.
+    """
+
+    latency: ktp_controller.metrics.LatencyStats = dataclasses.field(
+        default_factory=ktp_controller.metrics.LatencyStats
+    )
+    histogram: ktp_controller.metrics.Histogram = dataclasses.field(
+        default_factory=ktp_controller.metrics.Histogram
+    )
+    status_codes: typing.Counter[int] = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    timeout_count: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+
+
+def _normalize_path(path: str) -> str:
+    """
+    >>> _normalize_path("/v1/answers/uploads/0b4e7a4c-5d8f-4a3b-9c2e-1f6a7b8c9d0e/chunks/3")
+    '/v1/answers/uploads/{id}/chunks/{n}'
+    """
+
+    return "/".join(
+        (
+            "{n}"
+            if _NUMBER_SEGMENT_RE.match(segment)
+            else "{id}" if _ID_SEGMENT_RE.match(segment) else segment
+        )
+        for segment in path.split("/")
+    )
+
+
+def _get_request_body_size(request: requests.PreparedRequest) -> int:
+    if isinstance(request.body, (bytes, str)):
+        return len(request.body)
+    return int(request.headers.get("Content-Length", 0))
+
+
+def _get_response_body_size(response: requests.Response, *, is_streamed: bool) -> int:
+    # Content of streamed responses has not been read yet, and must not
+    # be read here.
+    if is_streamed:
+        return int(response.headers.get("Content-Length", 0))
+    return len(response.content or b"")
+
+
+class _InstrumentedSession(requests.Session):
+    def __init__(self, component: str):
+        super().__init__()
+        self.__component = component
+
+    def request(  # pylint: disable=arguments-differ
+        self, method, url, *args, **kwargs
+    ) -> requests.Response:
+        path = _normalize_path(urllib.parse.urlparse(url).path)
+        response = None
+        is_timeout = False
+        started_at = time.monotonic()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+            return response
+        except requests.exceptions.Timeout:
+            is_timeout = True
+            raise
+        finally:
+            _record_request(
+                self.__component,
+                path,
+                time.monotonic() - started_at,
+                response=response,
+                is_streamed=bool(kwargs.get("stream")),
+                is_timeout=is_timeout,
+            )
+
+
+@dataclasses.dataclass
+class MultipartPart:
+    name: str
+    chunks: typing.Iterable[bytes]
+    filename: str | None = None
+    content_type: str | None = None
+    # Size of the content in bytes, if known beforehand.
+    size: int | None = None
+
+    @classmethod
+    def field(cls, name: str, value: str) -> "MultipartPart":
+        data = value.encode("utf-8")
+        return cls(name, [data], size=len(data))
+
+    def get_header(self, boundary: str) -> bytes:
+        disposition = f'form-data; name="{self.name}"'
+        if self.filename is not None:
+            disposition += f'; filename="{self.filename}"'
+        header = f"--{boundary}\r\nContent-Disposition: {disposition}\r\n"
+        if self.content_type is not None:
+            header += f"Content-Type: {self.content_type}\r\n"
+        return f"{header}\r\n".encode("utf-8")
+
+
+class MultipartBody:
+    """Streamed multipart/form-data request body.
+
+    Unlike files= of requests, which builds the whole body in memory,
+    contents of the parts are iterated only while the body is being
+    sent. If sizes of all parts are known, body is sent with
+    Content-Length, otherwise with chunked transfer encoding.
+    """
+
+    def __init__(self, parts: typing.Iterable[MultipartPart]):
+        self.__parts = list(parts)
+        self.__boundary = secrets.token_hex(16)
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.__boundary}"
+
+    @property
+    def len(self) -> int | None:
+        # requests uses this as the Content-Length.
+        if any(part.size is None for part in self.__parts):
+            return None
+        return sum(
+            len(part.get_header(self.__boundary)) + part.size + 2  # type: ignore
+            for part in self.__parts
+        ) + len(self.__get_footer())
+
+    def __get_footer(self) -> bytes:
+        return f"--{self.__boundary}--\r\n".encode("utf-8")
+
+    def __iter__(self) -> typing.Iterator[bytes]:
+        for part in self.__parts:
+            yield part.get_header(self.__boundary)
+            for chunk in part.chunks:
+                if chunk:
+                    yield chunk
+            yield b"\r\n"
+        yield self.__get_footer()
+
+
+# Utils:
+
+
+def _record_request(
+    component: str,
+    path: str,
+    duration_sec: float,
+    *,
+    response: requests.Response | None,
+    is_streamed: bool,
+    is_timeout: bool,
+):
+    if response is not None:
+        bytes_sent = _get_request_body_size(response.request)
+        bytes_received = _get_response_body_size(response, is_streamed=is_streamed)
+
+    with _REQUEST_STATS_LOCK:
+        request_stats = _REQUEST_STATS.setdefault((component, path), RequestStats())
+        request_stats.latency.record(
+            duration_sec, is_error=response is None or not response.ok
+        )
+        request_stats.histogram.record(duration_sec)
+        if response is not None:
+            request_stats.status_codes[response.status_code] += 1
+            request_stats.bytes_sent += bytes_sent
+            request_stats.bytes_received += bytes_received
+        if is_timeout:
+            request_stats.timeout_count += 1
+
+
+def get_request_stats(
+    component: str | None = None,
+) -> typing.Dict[typing.Tuple[str, str], RequestStats]:
+    """Return a snapshot of stats of requests made with instrumented
+    sessions, keyed by (component, path). Identifiers in paths are
+    replaced by placeholders.
+    """
+
+    with _REQUEST_STATS_LOCK:
+        return {
+            key: copy.deepcopy(request_stats)
+            for key, request_stats in _REQUEST_STATS.items()
+            if component is None or key[0] == component
+        }
+
+
+def get_latency_stats(
+    component: str | None = None,
+) -> typing.Dict[typing.Tuple[str, str], ktp_controller.metrics.LatencyStats]:
+    """Return a snapshot of latency counters of requests made with
+    instrumented sessions, keyed by (component, path).
+    """
+
+    return {
+        key: request_stats.latency
+        for key, request_stats in get_request_stats(component).items()
+    }
+
+
+def get_request_metric_families(
+    prefix: str,
+) -> typing.List[ktp_controller.metrics.MetricFamily]:
+    """Return stats of requests made with instrumented sessions as
+    metric families, whose names start with prefix."""
+
+    duration = ktp_controller.metrics.MetricFamily(
+        f"{prefix}_duration_seconds", "histogram", "Durations of HTTP requests."
+    )
+    responses = ktp_controller.metrics.MetricFamily(
+        f"{prefix}_responses_total",
+        "counter",
+        "Number of HTTP responses by status code.",
+    )
+    errors = ktp_controller.metrics.MetricFamily(
+        f"{prefix}_errors_total",
+        "counter",
+        "Number of HTTP requests which failed or got an error response.",
+    )
+    timeouts = ktp_controller.metrics.MetricFamily(
+        f"{prefix}_timeouts_total", "counter", "Number of timed out HTTP requests."
+    )
+    bytes_sent = ktp_controller.metrics.MetricFamily(
+        f"{prefix}_bytes_sent_total", "counter", "Bytes sent in HTTP request bodies."
+    )
+    bytes_received = ktp_controller.metrics.MetricFamily(
+        f"{prefix}_bytes_received_total",
+        "counter",
+        "Bytes received in HTTP response bodies.",
+    )
+
+    for (component, path), request_stats in sorted(get_request_stats().items()):
+        duration.add_histogram(request_stats.histogram, component=component, path=path)
+        for status_code, count in sorted(request_stats.status_codes.items()):
+            responses.add(count, component=component, path=path, code=str(status_code))
+        errors.add(request_stats.latency.error_count, component=component, path=path)
+        timeouts.add(request_stats.timeout_count, component=component, path=path)
+        bytes_sent.add(request_stats.bytes_sent, component=component, path=path)
+        bytes_received.add(request_stats.bytes_received, component=component, path=path)
+
+    return [duration, responses, errors, timeouts, bytes_sent, bytes_received]
+
+
+def new_session(
+    *, pool_maxsize: int = 10, component: str | None = None
+) -> requests.Session:
+    """Return a new session with a keep-alive connection pool.
+
+    Connections (and thus TLS sessions) are reused by all requests
+    made with the session, at most pool_maxsize connections per host
+    are kept open. requests.Session itself does not promise thread
+    safety. Sessions are shared between to_async() worker threads only
+    because the urllib3 connection pool is thread-safe and requests
+    made here pass auth and headers per request, never changing any
+    per-session state after the session has been created. (Cookies
+    set by servers go to the cookie jar, which does its own locking.)
+
+    If component is given, stats of all requests are recorded per
+    path, see get_request_stats().
+    """
+
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_maxsize)
+    session = (
+        requests.Session() if component is None else _InstrumentedSession(component)
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    return session
+
+
+def new_executor(
+    *, max_workers: int, component: str
+) -> concurrent.futures.ThreadPoolExecutor:
+    """Return a thread pool for to_async() calls of a component.
+
+    Components get their own pools, sized after their sessions'
+    connection pools, so that long transfers of one component do not
+    hold up calls of others in asyncio's small default executor.
+    """
+
+    return concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix=f"ktp-controller-{component}"
+    )
+
+
+def to_async(
+    func: typing.Callable,
+    *,
+    executor: concurrent.futures.ThreadPoolExecutor | None = None,
+) -> typing.Callable[..., typing.Awaitable]:
+    """Return a coroutine function which runs blocking func in a
+    separate thread of executor (asyncio's default executor if None),
+    so that the event loop is free to serve others while func is
+    blocked on network or disk I/O.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        # Context variables are passed on, like asyncio.to_thread does.
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, functools.partial(context.run, func, *args, **kwargs)
+        )
+
+    return wrapper
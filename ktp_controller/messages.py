@@ -16,18 +16,22 @@ __all__ = [
     # Enums:
     "Command",
     "CommandStatus",
+    "Invalidation",
     "MessageKind",
     # Types:
     "CommandData",
     "CommandResultData",
     "PongData",
+    "LoopLagEventData",
     "StatusReportData",
+    "InvalidationData",
     "Data",
     "CommandMessage",
     "CommandResultMessage",
     "PingMessage",
     "PongMessage",
     "StatusReportMessage",
+    "InvalidationMessage",
     "Data",
     "Message",
 ]
@@ -61,12 +65,20 @@ class CommandStatus(str, enum.Enum):
         return self.value == "ok" or self.value.startswith("ok_")
 
 
+class Invalidation(str, enum.Enum):
+    CURRENT_EXAM_PACKAGE = "current_exam_package"
+
+    def __str__(self) -> str:
+        return self.value
+
+
 class MessageKind(str, enum.Enum):
     PING = "ping"
     PONG = "pong"
     COMMAND = "command"
     COMMAND_RESULT = "command_result"
     STATUS_REPORT = "status_report"
+    INVALIDATION = "invalidation"
 
     def __str__(self) -> str:
         return self.value
@@ -89,11 +101,30 @@ class PongData(ktp_controller.pydantic.BaseModel):
     ping_uuid: pydantic.UUID4
 
 
+class LoopLagEventData(ktp_controller.pydantic.BaseModel):
+    detected_at: ktp_controller.pydantic.DateTime
+    lag_sec: pydantic.NonNegativeFloat
+    stack: str | None = None
+
+
 class StatusReportData(ktp_controller.pydantic.BaseModel):
     is_auto_control_enabled: pydantic.StrictBool
+    # Recent stalls of the agent's event loop, oldest first.
+    loop_lag_events: typing.List[LoopLagEventData] = []
+
+
+class InvalidationData(ktp_controller.pydantic.BaseModel):
+    invalidation: Invalidation
 
 
-Data = typing.Union[CommandData, CommandResultData, PongData, StatusReportData, None]
+Data = typing.Union[
+    CommandData,
+    CommandResultData,
+    PongData,
+    StatusReportData,
+    InvalidationData,
+    None,
+]
 
 
 class _MessageBase(ktp_controller.pydantic.BaseModel):
@@ -127,6 +158,16 @@ class StatusReportMessage(_MessageBase):
     data: StatusReportData
 
 
+class InvalidationMessage(_MessageBase):
+    kind: typing.Literal[MessageKind.INVALIDATION] = MessageKind.INVALIDATION
+    data: InvalidationData
+
+
 Message = typing.Union[
-    CommandMessage, CommandResultMessage, PingMessage, PongMessage, StatusReportMessage
+    CommandMessage,
+    CommandResultMessage,
+    PingMessage,
+    PongMessage,
+    StatusReportMessage,
+    InvalidationMessage,
 ]
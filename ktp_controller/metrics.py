@@ -0,0 +1,281 @@
+# Standard library imports
+import bisect
+import collections
+import dataclasses
+import math
+import typing
+
+# Third-party imports
+
+# Internal imports
+
+# Relative imports
+
+
+__all__ = [
+    # Types:
+    "LatencyStats",
+    "LatencySamples",
+    "Histogram",
+    "MetricFamily",
+    # Utils:
+    "format_metric_families",
+    "get_latency_metric_families",
+]
+
+
+# Types:
+
+
+@dataclasses.dataclass
+class LatencyStats:
+    """Cumulative latency counters of a single operation.
+
+    >>> latency_stats = LatencyStats()
+    >>> latency_stats.record(0.5)
+    >>> latency_stats.record(1.5, is_error=True)
+    >>> latency_stats
+    LatencyStats(count=2, error_count=1, total_sec=2.0, max_sec=1.5)
+    >>> latency_stats.mean_sec
+    1.0
+    """
+
+    count: int = 0
+    error_count: int = 0
+    total_sec: float = 0.0
+    max_sec: float = 0.0
+
+    def record(self, duration_sec: float, *, is_error: bool = False) -> None:
+        self.count += 1
+        if is_error:
+            self.error_count += 1
+        self.total_sec += duration_sec
+        self.max_sec = max(self.max_sec, duration_sec)
+
+    @property
+    def mean_sec(self) -> float:
+        return self.total_sec / self.count if self.count else 0.0
+
+
+class LatencySamples:
+    """Latencies of the most recent max_count operations, for computing
+    nearest-rank percentiles.
+
+    >>> latency_samples = LatencySamples(max_count=100)
+    >>> for i in range(1, 201):
+    ...     latency_samples.record(i / 100)
+    >>> len(latency_samples)
+    100
+    >>> latency_samples.percentile(50)
+    1.5
+    >>> latency_samples.percentiles()
+    {'p50': 1.5, 'p90': 1.9, 'p99': 1.99}
+    """
+
+    def __init__(self, *, max_count: int = 1000):
+        self.__samples: typing.Deque[float] = collections.deque(maxlen=max_count)
+
+    def __len__(self) -> int:
+        return len(self.__samples)
+
+    def record(self, duration_sec: float) -> None:
+        self.__samples.append(duration_sec)
+
+    def percentile(self, p: float) -> float:
+        samples = sorted(self.__samples)
+        if not samples:
+            return 0.0
+        return samples[max(math.ceil(p / 100 * len(samples)) - 1, 0)]
+
+    def percentiles(
+        self, ps: typing.Iterable[float] = (50, 90, 99)
+    ) -> typing.Dict[str, float]:
+        return {f"p{p:g}": self.percentile(p) for p in ps}
+
+
+# Upper bounds of histogram buckets in seconds. Uploads and prepares
+# can take minutes.
+_DEFAULT_HISTOGRAM_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+)
+
+
+@dataclasses.dataclass
+class Histogram:
+    """Histogram of durations with fixed bucket upper bounds.
+
+    >>> histogram = Histogram(buckets=(0.1, 1.0))
+    >>> for duration_sec in [0.05, 0.1, 0.5, 5.0]:
+    ...     histogram.record(duration_sec)
+    >>> histogram.get_cumulative_counts()
+    [(0.1, 2), (1.0, 3), (inf, 4)]
+    >>> histogram.sum_sec
+    5.65
+    """
+
+    buckets: typing.Tuple[float, ...] = _DEFAULT_HISTOGRAM_BUCKETS
+    # Non-cumulative, the last one is for durations above all buckets.
+    counts: typing.List[int] = dataclasses.field(default_factory=list)
+    sum_sec: float = 0.0
+
+    def __post_init__(self):
+        if not self.counts:
+            self.counts = [0] * (len(self.buckets) + 1)
+
+    def record(self, duration_sec: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, duration_sec)] += 1
+        self.sum_sec += duration_sec
+
+    def get_cumulative_counts(self) -> typing.List[typing.Tuple[float, int]]:
+        cumulative_counts = []
+        count = 0
+        for upper_bound, bucket_count in zip([*self.buckets, math.inf], self.counts):
+            count += bucket_count
+            cumulative_counts.append((upper_bound, count))
+        return cumulative_counts
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, (bool, int)):
+        return str(int(value))
+    return repr(float(value))
+
+
+@dataclasses.dataclass
+class MetricFamily:
+    """Samples of a single metric in Prometheus text exposition format.
+
+    >>> metric_family = MetricFamily("ktp_up", "gauge", "Is it up.")
+    >>> metric_family.add(1, component="API")
+    >>> metric_family.add(0.5, component='"Abitti2"')
+    >>> print(metric_family.format(), end="")
+    # HELP ktp_up Is it up.
+    # TYPE ktp_up gauge
+    ktp_up{component="API"} 1
+    ktp_up{component="\\"Abitti2\\""} 0.5
+    """
+
+    name: str
+    type: str
+    help: str
+    # (name suffix, labels, value)
+    samples: typing.List[typing.Tuple[str, typing.Dict[str, str], float]] = (
+        dataclasses.field(default_factory=list)
+    )
+
+    def add(self, value: float, **labels: str) -> None:
+        self.samples.append(("", labels, value))
+
+    def add_with_suffix(self, suffix: str, value: float, **labels: str) -> None:
+        """Add a sample whose name is suffixed, like the _bucket, _sum
+        and _count samples of histograms."""
+
+        self.samples.append((suffix, labels, value))
+
+    def add_histogram(self, histogram: Histogram, **labels: str) -> None:
+        """Add samples of a histogram.
+
+        >>> metric_family = MetricFamily("ktp_d_seconds", "histogram", "D.")
+        >>> histogram = Histogram(buckets=(1.0,))
+        >>> histogram.record(0.5)
+        >>> metric_family.add_histogram(histogram, path="/a")
+        >>> print(metric_family.format(), end="")
+        # HELP ktp_d_seconds D.
+        # TYPE ktp_d_seconds histogram
+        ktp_d_seconds_bucket{path="/a",le="1"} 1
+        ktp_d_seconds_bucket{path="/a",le="+Inf"} 1
+        ktp_d_seconds_sum{path="/a"} 0.5
+        ktp_d_seconds_count{path="/a"} 1
+        """
+
+        for upper_bound, count in histogram.get_cumulative_counts():
+            self.add_with_suffix(
+                "_bucket",
+                count,
+                **labels,
+                le="+Inf" if math.isinf(upper_bound) else f"{upper_bound:g}",
+            )
+        self.add_with_suffix("_sum", histogram.sum_sec, **labels)
+        self.add_with_suffix("_count", sum(histogram.counts), **labels)
+
+    def format(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples:
+            label_str = ",".join(
+                f'{name}="{_escape_label_value(str(label_value))}"'
+                for name, label_value in labels.items()
+            )
+            if label_str:
+                label_str = f"{{{label_str}}}"
+            lines.append(f"{self.name}{suffix}{label_str} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Utils:
+
+
+def format_metric_families(metric_families: typing.Iterable[MetricFamily]) -> str:
+    return "".join(metric_family.format() for metric_family in metric_families)
+
+
+def get_latency_metric_families(
+    name: str,
+    description: str,
+    label_names: typing.Sequence[str],
+    latency_stats: typing.Dict[typing.Tuple[str, ...], LatencyStats],
+) -> typing.List[MetricFamily]:
+    """Return metric families of latency counters keyed by label values.
+
+    >>> latency_stats = LatencyStats()
+    >>> latency_stats.record(0.5)
+    >>> metric_families = get_latency_metric_families(
+    ...     "ktp_x", "X", ["path"], {("/a",): latency_stats}
+    ... )
+    >>> print(format_metric_families(metric_families[:2]), end="")
+    # HELP ktp_x_total Number of X.
+    # TYPE ktp_x_total counter
+    ktp_x_total{path="/a"} 1
+    # HELP ktp_x_errors_total Number of failed X.
+    # TYPE ktp_x_errors_total counter
+    ktp_x_errors_total{path="/a"} 0
+    """
+
+    count = MetricFamily(f"{name}_total", "counter", f"Number of {description}.")
+    error_count = MetricFamily(
+        f"{name}_errors_total", "counter", f"Number of failed {description}."
+    )
+    total_sec = MetricFamily(
+        f"{name}_duration_seconds_total",
+        "counter",
+        f"Total duration of {description}.",
+    )
+    max_sec = MetricFamily(
+        f"{name}_duration_seconds_max", "gauge", f"Maximum duration of {description}."
+    )
+
+    for label_values, stats in sorted(latency_stats.items()):
+        labels = dict(zip(label_names, label_values))
+        count.add(stats.count, **labels)
+        error_count.add(stats.error_count, **labels)
+        total_sec.add(stats.total_sec, **labels)
+        max_sec.add(stats.max_sec, **labels)
+
+    return [count, error_count, total_sec, max_sec]
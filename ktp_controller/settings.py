@@ -8,7 +8,13 @@ import typing
 
 
 # Third-party imports
-from pydantic import field_validator, PositiveInt, StrictBool
+from pydantic import (
+    field_validator,
+    NonNegativeInt,
+    PositiveFloat,
+    PositiveInt,
+    StrictBool,
+)
 from pydantic.fields import FieldInfo
 from pydantic_settings import BaseSettings, PydanticBaseSettingsSource, SettingsConfigDict  # type: ignore
 
@@ -89,6 +95,37 @@ class Settings(BaseSettings):
     api_port: PositiveInt = 8000
     logging_level: str = "INFO"
     db_path: str
+    exam_file_prefetch_concurrency: PositiveInt = 4
+    # Zero disables the scan.
+    exam_file_integrity_scan_interval_sec: NonNegativeInt = 6 * 60 * 60
+    abitti2_decrypt_concurrency: PositiveInt = 4
+    abitti2_browser_permission_grant_concurrency: PositiveInt = 16
+    abitti2_stop_exam_session_concurrency: PositiveInt = 16
+    # Zero uploads answers files in a single request.
+    examomatic_answers_upload_chunk_size: NonNegativeInt = 0
+    # Zero disables answer backups.
+    answers_backup_interval_sec: NonNegativeInt = 5 * 60
+    # Zero disables prebuilding.
+    exam_package_prebuild_lead_time_sec: NonNegativeInt = 24 * 60 * 60
+    # Unchanged status reports are sent to Exam-O-Matic this often. Zero
+    # sends every status report.
+    examomatic_status_report_heartbeat_sec: NonNegativeInt = 60
+    # Status reports which could not be sent are stored up to this many.
+    # When the outbox is full, the oldest reports are dropped.
+    status_report_outbox_max_size: PositiveInt = 1000
+    agent_metrics_host: str = "127.0.0.1"
+    # Zero disables the metrics endpoint.
+    agent_metrics_port: NonNegativeInt = 9180
+    # Event loop stalls at least this long are logged with the stack of
+    # the blocking code and shown in status reports.
+    agent_loop_lag_threshold_sec: PositiveFloat = 0.5
+    # Trace events of commands are appended to this file by CLI, API and
+    # agent, in Chrome trace event format (JSON array format, which can
+    # be left unterminated). The file can be opened as is in Perfetto or
+    # chrome://tracing. Empty disables tracing.
+    command_trace_filepath: str = os.path.expanduser(
+        "~/.local/share/ktp-controller/command-trace.json"
+    )
 
     @field_validator("examomatic_use_tls", mode="before")
     @classmethod
@@ -0,0 +1,286 @@
+# Standard library imports
+import atexit
+import contextlib
+import json
+import logging
+import os
+import os.path
+import queue
+import threading
+import time
+import typing
+
+# Third-party imports
+
+# Internal imports
+from ktp_controller.settings import SETTINGS
+
+# Relative imports
+
+
+__all__ = [
+    # Utils:
+    "get_command_uuid",
+    "record_span",
+    "record_instant",
+    "span",
+    "flush_trace_events",
+    "read_command_trace",
+    "format_command_trace",
+]
+
+
+# Constants:
+
+
+_LOGGER = logging.getLogger(__name__)
+
+# When the trace file grows this big, it is rotated to a single backup
+# file, which keeps both disk usage and read_command_trace() bounded.
+_MAX_TRACE_FILE_SIZE = 8 * 1024 * 1024
+
+# Events are dropped rather than queued without limit if the writer
+# thread cannot keep up.
+_MAX_QUEUED_EVENTS = 10_000
+
+
+# Utils:
+
+
+def get_command_uuid(message: typing.Dict[str, typing.Any]) -> str | None:
+    """Return the UUID of the command the message belongs to, if any.
+
+    >>> get_command_uuid({"kind": "command", "uuid": "u1", "data": {}})
+    'u1'
+    >>> get_command_uuid(
+    ...     {"kind": "command_result", "uuid": "u2", "data": {"command_uuid": "u1"}}
+    ... )
+    'u1'
+    >>> get_command_uuid({"kind": "ping", "uuid": "u3", "data": None}) is None
+    True
+    """
+
+    if message.get("kind") == "command":
+        return message.get("uuid")
+    if message.get("kind") == "command_result":
+        return (message.get("data") or {}).get("command_uuid")
+    return None
+
+
+def _get_rotated_trace_filepath(trace_filepath: str) -> str:
+    return f"{trace_filepath}.1"
+
+
+def _append_trace_lines(trace_filepath: str, lines: typing.List[str]) -> None:
+    # Tracing must never break the traced command.
+    try:
+        os.makedirs(os.path.dirname(trace_filepath), exist_ok=True)
+        try:
+            if os.path.getsize(trace_filepath) >= _MAX_TRACE_FILE_SIZE:
+                # Concurrent processes may both rotate, which loses the
+                # older backup, but only trace events are lost.
+                os.replace(trace_filepath, _get_rotated_trace_filepath(trace_filepath))
+        except FileNotFoundError:
+            pass
+        try:
+            # Only the first writer of any process starts the array.
+            with open(trace_filepath, "xb") as trace_file:
+                trace_file.write(b"[\n")
+        except FileExistsError:
+            pass
+        # Lines are written with a single unbuffered append, so that
+        # events of concurrent processes do not get interleaved.
+        with open(trace_filepath, "ab", buffering=0) as trace_file:
+            trace_file.write("".join(lines).encode("ascii"))
+    except OSError:
+        _LOGGER.debug(
+            "failed to write trace events to %r", trace_filepath, exc_info=True
+        )
+
+
+class _TraceWriter:
+    """Writes trace events in a background thread, so that recording
+    them never blocks event loops of API and agent on file I/O."""
+
+    def __init__(self) -> None:
+        self.__queue: queue.Queue[typing.Tuple[str, str]] = queue.Queue(
+            maxsize=_MAX_QUEUED_EVENTS
+        )
+        self.__thread: threading.Thread | None = None
+        self.__thread_lock = threading.Lock()
+
+    def put(self, trace_filepath: str, event: typing.Dict[str, typing.Any]) -> None:
+        with self.__thread_lock:
+            if self.__thread is None or not self.__thread.is_alive():
+                self.__thread = threading.Thread(
+                    target=self.__run, name="ktp-controller-trace-writer", daemon=True
+                )
+                self.__thread.start()
+        line = json.dumps(event, ensure_ascii=True, separators=(",", ":")) + ",\n"
+        try:
+            self.__queue.put_nowait((trace_filepath, line))
+        except queue.Full:
+            _LOGGER.debug("trace event queue is full, dropped %r", event)
+
+    def flush(self) -> None:
+        self.__queue.join()
+
+    def __run(self) -> None:
+        while True:
+            items = [self.__queue.get()]
+            while True:
+                try:
+                    items.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines_by_filepath: typing.Dict[str, typing.List[str]] = {}
+            for trace_filepath, line in items:
+                lines_by_filepath.setdefault(trace_filepath, []).append(line)
+            for trace_filepath, lines in lines_by_filepath.items():
+                _append_trace_lines(trace_filepath, lines)
+            for _ in items:
+                self.__queue.task_done()
+
+
+_TRACE_WRITER = _TraceWriter()
+
+
+def _write_event(
+    event: typing.Dict[str, typing.Any], trace_filepath: str | None
+) -> None:
+    if trace_filepath is None:
+        trace_filepath = SETTINGS.command_trace_filepath
+    if trace_filepath:
+        _TRACE_WRITER.put(trace_filepath, event)
+
+
+def flush_trace_events() -> None:
+    """Wait until all recorded trace events have been written."""
+
+    _TRACE_WRITER.flush()
+
+
+atexit.register(flush_trace_events)
+
+
+def _event(
+    phase: str, name: str, command_uuid: str, ts_sec: float, args: typing.Dict
+) -> typing.Dict[str, typing.Any]:
+    return {
+        "name": name,
+        "cat": "command",
+        "ph": phase,
+        "ts": round(ts_sec * 1_000_000),
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+        "args": {"command_uuid": str(command_uuid), **args},
+    }
+
+
+def record_span(
+    name: str,
+    command_uuid: str,
+    started_at: float,
+    ended_at: float,
+    *,
+    trace_filepath: str | None = None,
+    **args: typing.Any,
+) -> None:
+    """Record a span of a command. Times are from time.time(), so that
+    spans of different processes are comparable."""
+
+    event = _event("X", name, command_uuid, started_at, args)
+    event["dur"] = round((ended_at - started_at) * 1_000_000)
+    _write_event(event, trace_filepath)
+
+
+def record_instant(
+    name: str,
+    command_uuid: str,
+    *,
+    trace_filepath: str | None = None,
+    **args: typing.Any,
+) -> None:
+    event = _event("i", name, command_uuid, time.time(), args)
+    event["s"] = "p"
+    _write_event(event, trace_filepath)
+
+
+@contextlib.contextmanager
+def span(
+    name: str,
+    command_uuid: str,
+    *,
+    trace_filepath: str | None = None,
+    **args: typing.Any,
+) -> typing.Iterator[None]:
+    started_at = time.time()
+    try:
+        yield
+    finally:
+        record_span(
+            name,
+            command_uuid,
+            started_at,
+            time.time(),
+            trace_filepath=trace_filepath,
+            **args,
+        )
+
+
+def read_command_trace(
+    command_uuid: str, *, trace_filepath: str | None = None
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    """Return trace events of a command, ordered by time. Only events
+    recorded by this process are guaranteed to be written, see
+    flush_trace_events()."""
+
+    if trace_filepath is None:
+        trace_filepath = SETTINGS.command_trace_filepath
+
+    events: typing.List[typing.Dict[str, typing.Any]] = []
+    if not trace_filepath:
+        return events
+    for filepath in [_get_rotated_trace_filepath(trace_filepath), trace_filepath]:
+        if not os.path.exists(filepath):
+            continue
+        with open(filepath, "r", encoding="utf-8") as trace_file:
+            for line in trace_file:
+                line = line.strip().removesuffix(",")
+                if not line.startswith("{"):
+                    continue
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("args", {}).get("command_uuid") == str(command_uuid):
+                    events.append(event)
+
+    return sorted(events, key=lambda e: e["ts"])
+
+
+def format_command_trace(events: typing.List[typing.Dict[str, typing.Any]]) -> str:
+    """Return a per-hop latency breakdown of trace events of a command.
+
+    >>> print(format_command_trace([
+    ...     {"name": "cli.command", "ph": "X", "ts": 1000, "dur": 5000, "pid": 1},
+    ...     {"name": "api.deliver", "ph": "i", "ts": 2500, "pid": 2},
+    ... ]))
+    offset ms   duration ms  pid     hop
+        0.000         5.000  1       cli.command
+        1.500             -  2       api.deliver
+    """
+
+    if not events:
+        return "no trace events"
+
+    first_ts = events[0]["ts"]
+    lines = [f"{'offset ms':>9}  {'duration ms':>12}  {'pid':<6}  hop"]
+    for event in events:
+        offset_ms = (event["ts"] - first_ts) / 1000
+        duration_ms = f"{event['dur'] / 1000:.3f}" if event["ph"] == "X" else "-"
+        lines.append(
+            f"{offset_ms:>9.3f}  {duration_ms:>12}  {event['pid']:<6}  {event['name']}"
+        )
+
+    return "\n".join(lines)
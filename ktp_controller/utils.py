@@ -1,4 +1,5 @@
 # Standard library imports
+import asyncio
 import base64
 import contextlib
 import datetime
@@ -24,6 +25,7 @@ __all__ = [
     "get_basic_auth",
     "readfirstline",
     "websock_send_json",
+    "gather_bounded",
 ]
 
 
@@ -168,6 +170,36 @@ def readfirstline(filepath, encoding=sys.getdefaultencoding()):
         return f.readline().rstrip(os.linesep)
 
 
+async def gather_bounded(
+    aws: typing.Iterable[typing.Awaitable],
+    *,
+    limit: int,
+    return_exceptions: bool = False,
+) -> typing.List[typing.Any]:
+    """Like asyncio.gather(), but at most limit awaitables are awaited
+    concurrently. Awaitables are started in the given order.
+
+    >>> async def double(x):
+    ...     await asyncio.sleep(0)
+    ...     return 2 * x
+    >>> asyncio.run(gather_bounded([double(i) for i in range(5)], limit=2))
+    [0, 2, 4, 6, 8]
+    """
+
+    if limit < 1:
+        raise ValueError("invalid limit, must be greater than zero", limit)
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def _await(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(
+        *[_await(aw) for aw in aws], return_exceptions=return_exceptions
+    )
+
+
 async def websock_send_json(websock, data) -> str:
     message = json.dumps(
         data,
@@ -234,8 +266,11 @@ def check_filename(filename: str):
         raise ValueError("invalid filename", filename)
 
 
-def bytes_stream(filepath: str, chunk_size: int = 4096) -> typing.Iterator[bytes]:
+def bytes_stream(
+    filepath: str, chunk_size: int = 4096, offset: int = 0
+) -> typing.Iterator[bytes]:
     with open(filepath, "rb") as f:
+        f.seek(offset)
         while True:
             data = f.read(chunk_size)
             if not data:
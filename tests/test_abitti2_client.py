@@ -0,0 +1,52 @@
+# Standard library imports
+import time
+
+# Third-party imports
+import pytest
+
+# Internal imports
+import ktp_controller.abitti2.client
+
+from .utils import ConcurrencyTracker
+
+
+def test_decrypt_uploaded_exams_concurrently(mocker):
+    tracker = ConcurrencyTracker()
+
+    def _decrypt_exams(decrypt_code):
+        with tracker.track():
+            time.sleep(0.05)
+        return {"wrongPassword": False, "mebs": [f"{decrypt_code}.meb"]}
+
+    mocker.patch(
+        "ktp_controller.abitti2.client.decrypt_exams", side_effect=_decrypt_exams
+    )
+
+    exam_filenames = {f"code{i}.meb" for i in range(6)}
+    assert (
+        ktp_controller.abitti2.client.decrypt_uploaded_exams(
+            exam_filenames, [f"code{i}" for i in range(6)], concurrency=3
+        )
+        == exam_filenames
+    )
+    assert tracker.max_running == 3
+
+
+def test_decrypt_uploaded_exams_checks(mocker):
+    mocker.patch(
+        "ktp_controller.abitti2.client.decrypt_exams",
+        side_effect=lambda decrypt_code: {
+            "wrongPassword": decrypt_code == "wrong",
+            "mebs": [] if decrypt_code == "wrong" else ["exam1.meb"],
+        },
+    )
+
+    with pytest.raises(RuntimeError, match="failed to decrypt 1/2 exams"):
+        ktp_controller.abitti2.client.decrypt_uploaded_exams(
+            {"exam1.meb", "exam2.meb"}, ["right"]
+        )
+
+    with pytest.raises(RuntimeError, match="invalid decrypt code"):
+        ktp_controller.abitti2.client.decrypt_uploaded_exams(
+            {"exam1.meb"}, ["right", "wrong"]
+        )
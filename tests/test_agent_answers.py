@@ -0,0 +1,140 @@
+# Standard library imports
+import contextlib
+import hashlib
+
+# Third-party imports
+import fastapi.testclient
+import pytest
+
+# Internal imports
+import ktp_controller.examomatic.client
+from ktp_controller.agent.answers import back_up_answers_file, transfer_answers_file
+from ktp_controller.examomatic.mock.main import APP
+
+
+_CHUNKS = [b"answers" * 1000, b"more answers" * 1000, b"the end"]
+_CONTENT = b"".join(_CHUNKS)
+
+
+@contextlib.contextmanager
+def _open_answers_file_stream():
+    yield iter(_CHUNKS)
+
+
+def test_transfer_answers_file_uploads_to_examomatic_mock(tmp_path, mocker):
+    mocker.patch(
+        "ktp_controller.abitti2.client.open_answers_file_stream",
+        side_effect=_open_answers_file_stream,
+    )
+    mocker.patch(
+        "ktp_controller.examomatic.client.SETTINGS.examomatic_answers_upload_chunk_size",
+        0,
+    )
+    responses = []
+
+    def _post(path, *, multipart, **kwargs):  # pylint: disable=unused-argument
+        body = b"".join(multipart)
+        # Sent with Content-Length, not with chunked transfer encoding.
+        assert multipart.len == len(body)
+        with fastapi.testclient.TestClient(APP) as client:
+            responses.append(
+                client.post(
+                    path,
+                    params={
+                        "domain": "integration.test",
+                        "hostname": "unit-test-host1",
+                        "id": 1,
+                    },
+                    headers={"Content-Type": multipart.content_type},
+                    content=body,
+                )
+            )
+
+    mocker.patch("ktp_controller.examomatic.client._post", side_effect=_post)
+
+    answers_filepath = str(tmp_path / "answers.meb")
+    sha256sum = transfer_answers_file(
+        answers_filepath,
+        exam_package_external_id="package1",
+        is_final=ktp_controller.examomatic.client.IsFinal.TRUE,
+    )
+
+    assert sha256sum == hashlib.sha256(_CONTENT).hexdigest()
+    assert [response.status_code for response in responses] == [200]
+    with open(answers_filepath, "rb") as answers_file:
+        assert answers_file.read() == _CONTENT
+
+
+def test_transfer_answers_file_fails_on_download_errors(tmp_path, mocker):
+    @contextlib.contextmanager
+    def _open_failing_answers_file_stream():
+        def _chunks():
+            yield _CHUNKS[0]
+            raise ConnectionError("Abitti2 went away")
+
+        yield _chunks()
+
+    mocker.patch(
+        "ktp_controller.abitti2.client.open_answers_file_stream",
+        side_effect=_open_failing_answers_file_stream,
+    )
+    upload_answers_file = mocker.patch(
+        "ktp_controller.examomatic.client.upload_answers_file"
+    )
+
+    answers_filepath = tmp_path / "answers.meb"
+    with pytest.raises(ConnectionError, match="Abitti2 went away"):
+        transfer_answers_file(
+            str(answers_filepath),
+            exam_package_external_id="package1",
+            is_final=ktp_controller.examomatic.client.IsFinal.TRUE,
+        )
+
+    assert not upload_answers_file.called
+    assert not answers_filepath.exists()
+
+
+def test_back_up_answers_file_skips_unchanged_answers(tmp_path, mocker):
+    contents = [_CONTENT, _CONTENT, _CONTENT + b"more"]
+
+    def _download_answers_file(dest_filepath):
+        content = contents.pop(0)
+        with open(dest_filepath, "wb") as dest_file:
+            dest_file.write(content)
+        return hashlib.sha256(content).hexdigest()
+
+    mocker.patch(
+        "ktp_controller.abitti2.client.download_answers_file",
+        side_effect=_download_answers_file,
+    )
+    upload_answers_file = mocker.patch(
+        "ktp_controller.examomatic.client.upload_answers_file"
+    )
+
+    sha256sum = back_up_answers_file(
+        str(tmp_path / "1_backup.meb"),
+        exam_package_external_id="package1",
+        last_sha256sum=None,
+    )
+    assert upload_answers_file.call_count == 1
+    assert (
+        upload_answers_file.call_args.kwargs["is_final"]
+        == ktp_controller.examomatic.client.IsFinal.FALSE
+    )
+
+    back_up_answers_file(
+        str(tmp_path / "2_backup.meb"),
+        exam_package_external_id="package1",
+        last_sha256sum=sha256sum,
+    )
+    assert upload_answers_file.call_count == 1
+    assert not (tmp_path / "2_backup.meb").exists()
+
+    # Only the latest backup is kept.
+    back_up_answers_file(
+        str(tmp_path / "3_backup.meb"),
+        exam_package_external_id="package1",
+        last_sha256sum=sha256sum,
+    )
+    assert upload_answers_file.call_count == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["3_backup.meb"]
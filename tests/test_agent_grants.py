@@ -0,0 +1,67 @@
+# Standard library imports
+import asyncio
+
+# Third-party imports
+
+# Internal imports
+from ktp_controller.agent.grants import BrowserPermissionGranter
+
+from .utils import mock_concurrent_calls
+
+
+def _student(n, student_status="waiting-for-auth-browser"):
+    return {
+        "studentUuid": f"student{n}",
+        "sessionUuid": f"session{n}",
+        "studentStatus": student_status,
+    }
+
+
+def _mock_grant(mocker, *, failing_session_uuids=()):
+    return mock_concurrent_calls(
+        mocker,
+        "ktp_controller.abitti2.asyncclient.set_exam_session_permission_to_use_browsers",
+        failing_keys=failing_session_uuids,
+    )
+
+
+def test_grant_is_concurrent_and_bounded(mocker):
+    granted, tracker = _mock_grant(mocker)
+    students = [_student(n) for n in range(10)] + [_student(10, "connected")]
+
+    granter = BrowserPermissionGranter(concurrency=3)
+    assert asyncio.run(granter.grant(students)) == 10
+
+    assert sorted(granted) == sorted(f"session{n}" for n in range(10))
+    assert tracker.max_running == 3
+    assert len(granter.latency_samples) == 10
+    assert granter.latency_samples.percentile(50) > 0
+
+
+def test_grant_is_idempotent(mocker):
+    granted, _ = _mock_grant(mocker, failing_session_uuids={"session1"})
+    students = [_student(0), _student(1)]
+
+    async def run():
+        granter = BrowserPermissionGranter(concurrency=3)
+        assert await granter.grant(students) == 1
+        # Only the failed grant is retried.
+        assert await granter.grant(students) == 0
+
+    asyncio.run(run())
+
+    assert granted == ["session0"]
+
+
+def test_grant_is_retried_for_students_still_waiting(mocker):
+    granted, _ = _mock_grant(mocker)
+    students = [_student(0)]
+
+    async def run():
+        granter = BrowserPermissionGranter(concurrency=1, regrant_interval_sec=0)
+        await granter.grant(students)
+        await granter.grant(students)
+
+    asyncio.run(run())
+
+    assert granted == ["session0", "session0"]
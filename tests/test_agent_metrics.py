@@ -0,0 +1,82 @@
+# Standard library imports
+import asyncio
+import datetime
+import socket
+
+# Third-party imports
+
+# Internal imports
+from ktp_controller.agent.metrics import serve_metrics
+from ktp_controller.agent.stats import APIConnectionStats, CountingWebsocket
+
+
+def _get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _request(port: int, request_line: str) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{request_line}\r\nHost: localhost\r\n\r\n".encode("ascii"))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+def test_serve_metrics():
+    port = _get_free_port()
+
+    async def run():
+        task = asyncio.create_task(
+            serve_metrics(lambda: "ktp_up 1\n", host="127.0.0.1", port=port)
+        )
+        await asyncio.sleep(0.1)
+        try:
+            return (
+                await _request(port, "GET /metrics HTTP/1.1"),
+                await _request(port, "GET / HTTP/1.1"),
+                await _request(port, "POST /metrics HTTP/1.1"),
+            )
+        finally:
+            task.cancel()
+
+    metrics_response, not_found_response, not_allowed_response = asyncio.run(run())
+
+    assert metrics_response.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert b"Content-Type: text/plain; version=0.0.4" in metrics_response
+    assert metrics_response.endswith(b"\r\n\r\nktp_up 1\n")
+    assert not_found_response.startswith(b"HTTP/1.1 404 ")
+    assert not_allowed_response.startswith(b"HTTP/1.1 405 ")
+
+
+class _MockWebsocket:
+    def __init__(self, messages):
+        self.messages = messages
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def __aiter__(self):
+        for message in self.messages:
+            yield message
+
+
+def test_counting_websocket():
+    connection_stats = APIConnectionStats(
+        datetime.datetime.now(tz=datetime.timezone.utc)
+    )
+    websock = CountingWebsocket(_MockWebsocket(["ä", b"xy"]), connection_stats)
+
+    async def run():
+        await websock.send("ping")
+        return [message async for message in websock]
+
+    assert asyncio.run(run()) == ["ä", b"xy"]
+    assert websock.sent == ["ping"]
+    assert connection_stats.messages_sent == 1
+    assert connection_stats.bytes_sent == 4
+    assert connection_stats.messages_received == 2
+    assert connection_stats.bytes_received == 4
@@ -0,0 +1,146 @@
+# Standard library imports
+import asyncio
+
+# Third-party imports
+import requests
+import requests.exceptions
+
+# Internal imports
+from ktp_controller.agent.outbox import Outbox
+
+
+def test_outbox_sends_directly_when_empty(tmp_path):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        outbox = Outbox(send, outbox_filepath=str(tmp_path / "outbox.sqlite"))
+        assert await outbox.send({"n": 1})
+        assert await outbox.get_size() == 0
+
+    asyncio.run(run())
+
+    assert sent == [{"n": 1}]
+
+
+def test_outbox_delivers_failed_messages_in_order(tmp_path):
+    sent = []
+    is_down = True
+
+    async def send(message):
+        if is_down:
+            raise RuntimeError("Exam-O-Matic is down")
+        sent.append(message)
+
+    outbox_filepath = str(tmp_path / "outbox.sqlite")
+
+    async def fail():
+        outbox = Outbox(send, outbox_filepath=outbox_filepath)
+        assert not await outbox.send({"n": 1})
+        # Once something is queued, everything is queued.
+        assert not await outbox.send({"n": 2})
+        assert await outbox.get_size() == 2
+
+    async def recover():
+        nonlocal is_down
+        is_down = False
+        outbox = Outbox(send, outbox_filepath=outbox_filepath, read_batch_size=1)
+        task = asyncio.create_task(outbox.run())
+        await asyncio.sleep(0.05)
+        assert await outbox.get_size() == 0
+        task.cancel()
+
+    asyncio.run(fail())
+    # Queued messages survive restarts.
+    asyncio.run(recover())
+
+    assert sent == [{"n": 1}, {"n": 2}]
+
+
+def test_outbox_backs_off_and_retries(tmp_path):
+    calls = []
+
+    async def send(message):
+        calls.append(message)
+        if len(calls) < 3:
+            raise RuntimeError("Exam-O-Matic is down")
+
+    async def run():
+        outbox = Outbox(
+            send,
+            outbox_filepath=str(tmp_path / "outbox.sqlite"),
+            min_backoff_sec=0.01,
+        )
+        await outbox.put({"n": 1})
+        task = asyncio.create_task(outbox.run())
+        await asyncio.sleep(0.1)
+        assert await outbox.get_size() == 0
+        task.cancel()
+
+    asyncio.run(run())
+
+    assert calls == [{"n": 1}] * 3
+
+
+def test_outbox_drops_oldest_messages_when_full(tmp_path):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        outbox = Outbox(
+            send, outbox_filepath=str(tmp_path / "outbox.sqlite"), max_size=2
+        )
+        for n in range(4):
+            await outbox.put({"n": n})
+        assert await outbox.get_size() == 2
+        task = asyncio.create_task(outbox.run())
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run())
+
+    assert sent == [{"n": 2}, {"n": 3}]
+
+
+def _http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(response=response)
+
+
+def test_outbox_drops_rejected_messages(tmp_path):
+    calls = []
+
+    async def send(message):
+        calls.append(message)
+        if message["n"] == 1:
+            raise _http_error(400)
+        if len(calls) < 4:
+            raise _http_error(503)
+
+    async def run():
+        outbox = Outbox(
+            send,
+            outbox_filepath=str(tmp_path / "outbox.sqlite"),
+            min_backoff_sec=0.01,
+        )
+        # Rejected directly, not stored.
+        assert not await outbox.send({"n": 1})
+        assert await outbox.get_size() == 0
+
+        await outbox.put({"n": 1})
+        await outbox.put({"n": 2})
+        task = asyncio.create_task(outbox.run())
+        await asyncio.sleep(0.1)
+        assert await outbox.get_size() == 0
+        task.cancel()
+
+    asyncio.run(run())
+
+    # The rejected message does not block the one after it, which is
+    # retried after server errors.
+    assert calls == [{"n": 1}, {"n": 1}, {"n": 2}, {"n": 2}]
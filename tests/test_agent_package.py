@@ -0,0 +1,189 @@
+# Standard library imports
+import hashlib
+import struct
+import zipfile
+
+# Third-party imports
+import pytest
+
+# Internal imports
+import ktp_controller.utils
+from ktp_controller.agent.package import (
+    build_exam_package_file,
+    get_exam_package_members,
+    get_exam_package_size,
+    iter_exam_package,
+    open_exam_package_stream,
+)
+from ktp_controller.agent.verification import VerificationIndex
+
+
+def _exam_file_infos(tmp_path, mocker):
+    exam_file_infos = []
+    exam_filepaths = {}
+    for name, content in [("b.mex", b"exam b"), ("a.mex", b"exam a")]:
+        sha256sum = hashlib.sha256(content).hexdigest()
+        exam_filepath = tmp_path / name
+        exam_filepath.write_bytes(content)
+        exam_filepaths[sha256sum] = str(exam_filepath)
+        exam_file_infos.append({"external_id": name, "name": name, "sha256": sha256sum})
+
+    mocker.patch(
+        "ktp_controller.files.get_local_filepath",
+        side_effect=lambda _type, _dirname, sha256sum: exam_filepaths[sha256sum],
+    )
+
+    return exam_file_infos
+
+
+def test_exam_package_build_is_deterministic(tmp_path, mocker):
+    exam_file_infos = _exam_file_infos(tmp_path, mocker)
+    verification_index = VerificationIndex(str(tmp_path / "index.json"))
+
+    assert build_exam_package_file(
+        str(tmp_path / "package1.zip"),
+        exam_file_infos,
+        verification_index=verification_index,
+    )
+    assert build_exam_package_file(
+        str(tmp_path / "package2.zip"),
+        list(reversed(exam_file_infos)),
+        verification_index=verification_index,
+    )
+
+    assert ktp_controller.utils.sha256(
+        str(tmp_path / "package1.zip")
+    ) == ktp_controller.utils.sha256(str(tmp_path / "package2.zip"))
+
+    with zipfile.ZipFile(tmp_path / "package1.zip") as exam_package_zip:
+        assert exam_package_zip.testzip() is None
+        member_names = exam_package_zip.namelist()
+    assert member_names == sorted(member_names)
+    assert sorted(member_name.split("_", 1)[1] for member_name in member_names) == [
+        "a.mex",
+        "b.mex",
+    ]
+
+
+def test_exam_package_is_reused_until_changed(tmp_path, mocker):
+    exam_file_infos = _exam_file_infos(tmp_path, mocker)
+    exam_package_filepath = str(tmp_path / "package.zip")
+    verification_index = VerificationIndex(str(tmp_path / "index.json"))
+
+    assert build_exam_package_file(
+        exam_package_filepath,
+        exam_file_infos,
+        verification_index=verification_index,
+    )
+    assert not build_exam_package_file(
+        exam_package_filepath,
+        exam_file_infos,
+        verification_index=verification_index,
+    )
+
+    with open(exam_package_filepath, "ab") as exam_package_file:
+        exam_package_file.write(b"garbage")
+
+    assert build_exam_package_file(
+        exam_package_filepath,
+        exam_file_infos,
+        verification_index=verification_index,
+    )
+
+
+def test_exam_package_members_have_sizes_in_local_headers(tmp_path, mocker):
+    exam_file_infos = _exam_file_infos(tmp_path, mocker)
+    exam_package_filepath = tmp_path / "package.zip"
+
+    build_exam_package_file(
+        str(exam_package_filepath),
+        exam_file_infos,
+        verification_index=VerificationIndex(str(tmp_path / "index.json")),
+    )
+
+    content = exam_package_filepath.read_bytes()
+    with zipfile.ZipFile(exam_package_filepath) as exam_package_zip:
+        zinfos = exam_package_zip.infolist()
+    for zinfo in zinfos:
+        # Local file header: signature, version, flags, method, time,
+        # date, CRC-32, compressed size, uncompressed size.
+        _, _, flags, method, _, _, crc, compress_size, file_size = struct.unpack(
+            "<IHHHHHIII", content[zinfo.header_offset : zinfo.header_offset + 26]
+        )
+        assert not flags & 0x08  # No data descriptor.
+        assert method == zipfile.ZIP_STORED
+        assert (crc, compress_size, file_size) == (
+            zinfo.CRC,
+            zinfo.file_size,
+            zinfo.file_size,
+        )
+
+
+def test_exam_package_stream_is_saved_and_reused(tmp_path, mocker):
+    exam_file_infos = _exam_file_infos(tmp_path, mocker)
+    verification_index = VerificationIndex(str(tmp_path / "index.json"))
+    build_exam_package_file(
+        str(tmp_path / "built.zip"),
+        exam_file_infos,
+        verification_index=verification_index,
+    )
+    exam_package_filepath = tmp_path / "streamed.zip"
+
+    with open_exam_package_stream(
+        str(exam_package_filepath),
+        exam_file_infos,
+        verification_index=verification_index,
+    ) as (chunks, size):
+        content = b"".join(chunks)
+    assert size == len(content)
+    assert content == (tmp_path / "built.zip").read_bytes()
+    assert exam_package_filepath.read_bytes() == content
+
+    # Reused from the disk.
+    mocker.patch(
+        "ktp_controller.agent.package.iter_exam_package",
+        side_effect=AssertionError("rebuilt"),
+    )
+    with open_exam_package_stream(
+        str(exam_package_filepath),
+        exam_file_infos,
+        verification_index=verification_index,
+    ) as (chunks, size):
+        assert (b"".join(chunks), size) == (content, len(content))
+
+
+def test_exam_package_stream_is_not_saved_on_errors(tmp_path, mocker):
+    exam_file_infos = _exam_file_infos(tmp_path, mocker)
+    exam_package_filepath = tmp_path / "streamed.zip"
+
+    with pytest.raises(ConnectionError):
+        with open_exam_package_stream(
+            str(exam_package_filepath),
+            exam_file_infos,
+            verification_index=VerificationIndex(str(tmp_path / "index.json")),
+        ) as (chunks, _):
+            next(chunks)
+            raise ConnectionError("upload failed")
+
+    assert not exam_package_filepath.exists()
+    assert not (tmp_path / "streamed.zip.manifest.json").exists()
+
+
+def test_exam_package_uses_zip64_for_large_members(tmp_path, mocker):
+    exam_file_infos = _exam_file_infos(tmp_path, mocker)
+    members = get_exam_package_members(exam_file_infos)
+    exam_filepaths = {i["sha256"]: str(tmp_path / i["name"]) for i in exam_file_infos}
+    # Small limit, so that all sizes and offsets are stored as zip64.
+    mocker.patch("ktp_controller.agent.package._ZIP64_LIMIT", 4)
+
+    content = b"".join(iter_exam_package(members, exam_filepaths))
+    assert get_exam_package_size(members, exam_filepaths) == len(content)
+
+    exam_package_filepath = tmp_path / "package.zip"
+    exam_package_filepath.write_bytes(content)
+    with zipfile.ZipFile(exam_package_filepath) as exam_package_zip:
+        assert exam_package_zip.testzip() is None
+        assert {
+            member_name.split("_", 1)[1]: exam_package_zip.read(member_name)
+            for member_name in exam_package_zip.namelist()
+        } == {"a.mex": b"exam a", "b.mex": b"exam b"}
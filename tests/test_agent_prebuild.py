@@ -0,0 +1,111 @@
+# Standard library imports
+import asyncio
+import datetime
+import os.path
+
+# Third-party imports
+
+# Internal imports
+import ktp_controller.utils
+from ktp_controller.agent.prebuild import (
+    ExamPackagePrebuilder,
+    get_upcoming_exam_packages,
+)
+from ktp_controller.agent.verification import VerificationIndex
+
+
+def _exam_info(utcnow, file_sha256="a" * 64):
+    def _package(lock_time, end_time, schedules):
+        return {
+            "lock_time": lock_time.isoformat(),
+            "end_time": end_time.isoformat(),
+            "schedules": schedules,
+        }
+
+    return {
+        "schedules": [
+            {
+                "id": "s1",
+                "file_uuid": "f1",
+                "file_name": "exam1.mex",
+                "file_sha256": file_sha256,
+            },
+        ],
+        "packages": {
+            "later": _package(
+                utcnow + datetime.timedelta(hours=2),
+                utcnow + datetime.timedelta(hours=3),
+                ["s1"],
+            ),
+            "sooner": _package(
+                utcnow + datetime.timedelta(minutes=5),
+                utcnow + datetime.timedelta(hours=1),
+                ["s1"],
+            ),
+            "ended": _package(
+                utcnow - datetime.timedelta(hours=2),
+                utcnow - datetime.timedelta(hours=1),
+                ["s1"],
+            ),
+        },
+    }
+
+
+def test_get_upcoming_exam_packages():
+    utcnow = ktp_controller.utils.utcnow()
+
+    assert [
+        external_id
+        for _, external_id, _ in get_upcoming_exam_packages(
+            _exam_info(utcnow), utcnow=utcnow
+        )
+    ] == ["sooner", "later"]
+
+
+def test_prebuilder_builds_due_packages_and_removes_stale_ones(tmp_path, mocker):
+    utcnow = ktp_controller.utils.utcnow()
+    built = []
+
+    def _build_exam_package_file(exam_package_filepath, exam_file_infos, **kwargs):
+        built.append(exam_package_filepath)
+        with open(exam_package_filepath, "wb"):
+            pass
+        return True
+
+    mocker.patch(
+        "ktp_controller.agent.package.get_exam_package_filepath",
+        side_effect=lambda external_id, exam_file_infos: str(
+            tmp_path / f"{external_id}_{exam_file_infos[0]['sha256'][0]}.zip"
+        ),
+    )
+    mocker.patch(
+        "ktp_controller.agent.package.build_exam_package_file",
+        side_effect=_build_exam_package_file,
+    )
+
+    prebuilder = ExamPackagePrebuilder(
+        verification_index=VerificationIndex(str(tmp_path / "index.json")),
+        lead_time_sec=60 * 60,
+    )
+
+    async def _prebuild(eom_exam_info):
+        prebuilder.update_exam_info(eom_exam_info)
+        try:
+            await asyncio.wait_for(prebuilder.run(), 0.2)
+        except TimeoutError:
+            pass
+
+    async def _test():
+        await _prebuild(_exam_info(utcnow))
+        # Only the package locking within the lead time is prebuilt.
+        assert built == [str(tmp_path / "sooner_a.zip")]
+
+        # Exam file changed, so the prebuilt package became stale.
+        await _prebuild(_exam_info(utcnow, file_sha256="b" * 64))
+        assert built == [
+            str(tmp_path / "sooner_a.zip"),
+            str(tmp_path / "sooner_b.zip"),
+        ]
+        assert not os.path.exists(tmp_path / "sooner_a.zip")
+
+    asyncio.run(_test())
@@ -0,0 +1,97 @@
+# Standard library imports
+import asyncio
+
+# Third-party imports
+import pytest
+
+# Internal imports
+from ktp_controller.agent.prefetch import get_prefetch_order, prefetch_exam_files
+
+
+def _schedule(schedule_id, file_uuid, start_time):
+    return {
+        "id": schedule_id,
+        "file_name": f"{file_uuid}.mex",
+        "file_uuid": file_uuid,
+        "file_sha256": file_uuid * 8,
+        "file_size": 10,
+        "start_time": start_time,
+    }
+
+
+def _exam_info():
+    return {
+        "schedules": [
+            _schedule("s1", "f1", "2025-01-03T10:00:00+00:00"),
+            _schedule("s2", "f2", "2025-01-01T10:00:00+00:00"),
+            _schedule("s3", "f3", "2025-01-02T10:00:00+00:00"),
+            # Same exam file as s1, but scheduled later.
+            _schedule("s4", "f1", "2025-01-04T10:00:00+00:00"),
+            # Not in any package.
+            _schedule("s5", "f5", "2025-01-02T12:00:00+00:00"),
+        ],
+        "packages": {
+            "p1": {
+                "start_time": "2025-01-03T09:00:00+00:00",
+                "schedules": ["s1", "s2"],
+            },
+            "p2": {
+                "start_time": "2025-01-02T09:00:00+00:00",
+                "schedules": ["s3", "s4"],
+            },
+        },
+    }
+
+
+def test_get_prefetch_order():
+    # s1 is left out, because its exam file is prefetched already for
+    # s4, which belongs to an earlier package.
+    assert [s["id"] for s in get_prefetch_order(_exam_info())] == [
+        "s3",
+        "s4",
+        "s5",
+        "s2",
+    ]
+
+
+def test_prefetch_exam_files_is_bounded():
+    running = set()
+    max_running = 0
+    started = []
+
+    async def ensure_exam_file_exists(eom_schedule):
+        nonlocal max_running
+        started.append(eom_schedule["id"])
+        running.add(eom_schedule["id"])
+        max_running = max(max_running, len(running))
+        await asyncio.sleep(0.01)
+        running.remove(eom_schedule["id"])
+
+    eom_schedules = get_prefetch_order(_exam_info())
+    asyncio.run(
+        prefetch_exam_files(eom_schedules, ensure_exam_file_exists, concurrency=2)
+    )
+
+    assert max_running == 2
+    assert started == [s["id"] for s in eom_schedules]
+
+
+def test_prefetch_exam_files_attempts_all_files():
+    attempted = []
+
+    async def ensure_exam_file_exists(eom_schedule):
+        attempted.append(eom_schedule["id"])
+        if eom_schedule["id"] == "s3":
+            raise RuntimeError("download failed")
+
+    with pytest.raises(ExceptionGroup) as exc_info:
+        asyncio.run(
+            prefetch_exam_files(
+                get_prefetch_order(_exam_info()),
+                ensure_exam_file_exists,
+                concurrency=1,
+            )
+        )
+
+    assert len(exc_info.value.exceptions) == 1
+    assert attempted == ["s3", "s4", "s5", "s2"]
@@ -0,0 +1,144 @@
+# Standard library imports
+import asyncio
+import copy
+
+# Third-party imports
+
+# Internal imports
+from ktp_controller.agent.reporter import (
+    StatusReporter,
+    get_status_report_fingerprint,
+)
+
+
+def _status_report(*, answer_paper_count=0, received_at="2025-01-01T10:00:00Z"):
+    return {
+        "monitoring_passphrase": "passphrase",
+        "server_version": "v1",
+        "status": {
+            "type": "stats",
+            "data": {
+                "students": [
+                    {
+                        "studentUuid": "s1",
+                        "sessionUuid": "x1",
+                        "studentStatus": "connected",
+                        "lastSeen": received_at,
+                    },
+                ],
+                "answerPaperCount": answer_paper_count,
+                "examStatus": {"hasStarted": True, "startTime": "2025-01-01"},
+            },
+            "singleSecurityCode": "1234",
+        },
+        "received_at": received_at,
+        "exams": [],
+    }
+
+
+def test_get_status_report_fingerprint_ignores_receive_times():
+    assert get_status_report_fingerprint(
+        _status_report()
+    ) == get_status_report_fingerprint(_status_report(received_at="later"))
+    assert get_status_report_fingerprint(
+        _status_report()
+    ) != get_status_report_fingerprint(_status_report(answer_paper_count=1))
+
+
+def test_status_reporter_sends_changes_and_heartbeats(mocker):
+    sent = []
+
+    async def send(status_report):
+        sent.append(copy.deepcopy(status_report))
+        return True
+
+    monotonic = mocker.patch("time.monotonic", return_value=100.0)
+
+    async def run():
+        reporter = StatusReporter(send, heartbeat_interval_sec=60, min_interval_sec=1)
+
+        # The first report is always sent.
+        reported_at = await reporter.report(_status_report())
+        assert reported_at is not None
+        assert len(sent) == 1
+
+        # Unchanged reports are skipped, but they are already reported.
+        monotonic.return_value = 105.0
+        assert await reporter.report(_status_report(received_at="b")) == reported_at
+        assert len(sent) == 1
+
+        # Changes are sent immediately.
+        monotonic.return_value = 110.0
+        assert await reporter.report(_status_report(answer_paper_count=1))
+        assert len(sent) == 2
+
+        # Heartbeat.
+        monotonic.return_value = 170.0
+        await reporter.report(_status_report(answer_paper_count=1))
+        assert len(sent) == 3
+
+    asyncio.run(run())
+
+
+def test_status_reporter_coalesces_bursts():
+    sent = []
+
+    async def send(status_report):
+        sent.append(copy.deepcopy(status_report))
+        return True
+
+    async def run():
+        reporter = StatusReporter(
+            send, heartbeat_interval_sec=60, min_interval_sec=0.05
+        )
+        assert await reporter.report(_status_report()) is not None
+        for answer_paper_count in range(1, 4):
+            status_report = _status_report(answer_paper_count=answer_paper_count)
+            status_report["reported_at"] = await reporter.report(status_report)
+            # Deferred reports have not been sent yet.
+            assert status_report["reported_at"] is None
+        assert len(sent) == 1
+
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+
+    # Only the latest change of the burst is sent, as it was reported.
+    assert len(sent) == 2
+    assert sent[1] == _status_report(answer_paper_count=3)
+
+
+def test_status_reporter_retries_failed_sends():
+    calls = []
+
+    async def send(status_report):
+        calls.append(status_report)
+        if len(calls) == 1:
+            raise RuntimeError("Exam-O-Matic is down")
+        return True
+
+    async def run():
+        reporter = StatusReporter(send, heartbeat_interval_sec=60, min_interval_sec=0)
+        assert await reporter.report(_status_report()) is None
+        assert await reporter.report(_status_report()) is not None
+
+    asyncio.run(run())
+
+    assert len(calls) == 2
+
+
+def test_status_reporter_does_not_resend_queued_reports():
+    calls = []
+
+    async def send(status_report):
+        calls.append(status_report)
+        return False
+
+    async def run():
+        reporter = StatusReporter(send, heartbeat_interval_sec=60, min_interval_sec=0)
+        assert await reporter.report(_status_report()) is None
+        assert await reporter.report(_status_report()) is None
+
+    asyncio.run(run())
+
+    assert len(calls) == 1
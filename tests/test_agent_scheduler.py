@@ -0,0 +1,158 @@
+# Standard library imports
+import asyncio
+import datetime
+
+# Third-party imports
+
+# Internal imports
+import ktp_controller.utils
+from ktp_controller.agent.scheduler import (
+    TransitionScheduler,
+    get_transition_deadline,
+)
+
+
+def _exam_package(utcnow, state, **kwargs):
+    exam_package = {
+        "external_id": "package1",
+        "start_time": (utcnow + datetime.timedelta(minutes=10)).isoformat(),
+        "end_time": (utcnow + datetime.timedelta(minutes=40)).isoformat(),
+        "lock_time": (utcnow - datetime.timedelta(minutes=5)).isoformat(),
+        "locked": True,
+        "scheduled_exam_external_ids": ["exam1"],
+        "state": state,
+        "state_changed_at": None,
+    }
+    exam_package.update(kwargs)
+    return exam_package
+
+
+def test_transition_deadline_follows_exam_package_times():
+    utcnow = ktp_controller.utils.utcnow()
+
+    for state, expected_deadline in [
+        (None, utcnow - datetime.timedelta(minutes=5)),
+        ("ready", utcnow + datetime.timedelta(minutes=10)),
+        ("running", utcnow + datetime.timedelta(minutes=40)),
+    ]:
+        assert (
+            get_transition_deadline(
+                _exam_package(utcnow, state),
+                utcnow=utcnow,
+                is_auto_control_enabled=True,
+            )
+            == expected_deadline
+        )
+
+
+def test_transition_deadline_without_auto_control():
+    utcnow = ktp_controller.utils.utcnow()
+    state_changed_at = utcnow - datetime.timedelta(seconds=3)
+
+    for state in [None, "ready", "running", "stopped"]:
+        assert (
+            get_transition_deadline(
+                _exam_package(utcnow, state),
+                utcnow=utcnow,
+                is_auto_control_enabled=False,
+            )
+            is None
+        )
+
+    # Stopping goes on regardless of auto control.
+    assert (
+        get_transition_deadline(
+            _exam_package(
+                utcnow, "stopping", state_changed_at=state_changed_at.isoformat()
+            ),
+            utcnow=utcnow,
+            is_auto_control_enabled=False,
+        )
+        == state_changed_at
+    )
+
+
+def test_transition_deadline_without_current_exam_package():
+    utcnow = ktp_controller.utils.utcnow()
+    lock_times = [
+        utcnow - datetime.timedelta(minutes=1),
+        utcnow + datetime.timedelta(minutes=20),
+        utcnow + datetime.timedelta(minutes=10),
+    ]
+
+    assert get_transition_deadline(
+        None,
+        utcnow=utcnow,
+        is_auto_control_enabled=True,
+        upcoming_lock_times=lock_times,
+    ) == utcnow + datetime.timedelta(minutes=10)
+
+    assert (
+        get_transition_deadline(
+            None,
+            utcnow=utcnow,
+            is_auto_control_enabled=True,
+            upcoming_lock_times=[],
+        )
+        is None
+    )
+
+
+def test_scheduler_retries_unchanged_deadline_later():
+    utcnow = ktp_controller.utils.utcnow()
+    scheduler = TransitionScheduler(
+        is_auto_control_enabled=lambda: True, retry_interval_sec=5
+    )
+
+    # Nothing is known yet, so the first deadline is right now.
+    assert scheduler.get_next_deadline(utcnow) == (utcnow, None)
+
+    exam_package = _exam_package(
+        utcnow, "ready", start_time=(utcnow - datetime.timedelta(seconds=1)).isoformat()
+    )
+    scheduler.update_current_exam_package(exam_package)
+    asyncio.run(asyncio.wait_for(scheduler.wait_for_next_deadline(), 1))
+
+    # Start time has passed and fired already, but the state is still
+    # the same, so it's retried later.
+    scheduler.update_current_exam_package(exam_package)
+    next_deadline, _ = scheduler.get_next_deadline(ktp_controller.utils.utcnow())
+    assert next_deadline > utcnow + datetime.timedelta(seconds=4)
+
+    # State change resets the retry delay.
+    exam_package["state"] = "running"
+    scheduler.update_current_exam_package(exam_package)
+    end_time = datetime.datetime.fromisoformat(exam_package["end_time"])
+    assert scheduler.get_next_deadline(utcnow) == (end_time, end_time)
+
+
+def test_scheduler_fires_past_deadline_once_per_retry_interval(mocker):
+    started_at = ktp_controller.utils.utcnow()
+    clock = [started_at]
+
+    # Each look at the clock takes a second, so that the scheduler can
+    # be run without actually sleeping.
+    def utcnow():
+        now = clock[0]
+        clock[0] += datetime.timedelta(seconds=1)
+        return now
+
+    mocker.patch("ktp_controller.utils.utcnow", utcnow)
+    scheduler = TransitionScheduler(
+        is_auto_control_enabled=lambda: True, retry_interval_sec=5, max_sleep_sec=0
+    )
+    # Stopping is due since state change, which is always in the past.
+    scheduler.update_current_exam_package(
+        _exam_package(
+            started_at,
+            "stopping",
+            state_changed_at=(started_at - datetime.timedelta(minutes=1)).isoformat(),
+        )
+    )
+
+    fired_at = []
+    for _ in range(4):
+        asyncio.run(scheduler.wait_for_next_deadline())
+        fired_at.append((clock[0] - started_at).total_seconds() - 1)
+
+    assert fired_at == [0, 5, 10, 15]
@@ -0,0 +1,92 @@
+# Standard library imports
+import asyncio
+
+# Third-party imports
+
+# Internal imports
+from ktp_controller.agent.snapshot import Snapshot
+
+
+def _fetcher():
+    fetch_count = 0
+
+    async def fetch():
+        nonlocal fetch_count
+        fetch_count += 1
+        return {"fetch_count": fetch_count}
+
+    return fetch, lambda: fetch_count
+
+
+def test_snapshot_is_fetched_only_after_invalidation():
+    fetch, get_fetch_count = _fetcher()
+
+    async def run():
+        snapshot = Snapshot(fetch)
+        snapshot.subscribe()
+        assert await snapshot.get() == {"fetch_count": 1}
+        value = await snapshot.get()
+        assert value == {"fetch_count": 1}
+        # Copies can be modified freely.
+        value["fetch_count"] = 100
+        assert await snapshot.get() == {"fetch_count": 1}
+
+        snapshot.invalidate()
+        assert await snapshot.get() == {"fetch_count": 2}
+
+    asyncio.run(run())
+
+    assert get_fetch_count() == 2
+
+
+def test_snapshot_is_not_used_without_subscription():
+    fetch, get_fetch_count = _fetcher()
+
+    async def run():
+        snapshot = Snapshot(fetch)
+        await snapshot.get()
+        await snapshot.get()
+        snapshot.subscribe()
+        await snapshot.get()
+        await snapshot.get()
+        snapshot.unsubscribe()
+        await snapshot.get()
+
+    asyncio.run(run())
+
+    assert get_fetch_count() == 4
+
+
+def test_snapshot_expires():
+    fetch, get_fetch_count = _fetcher()
+
+    async def run():
+        snapshot = Snapshot(fetch, max_age_sec=0)
+        snapshot.subscribe()
+        await snapshot.get()
+        await snapshot.get()
+
+    asyncio.run(run())
+
+    assert get_fetch_count() == 2
+
+
+def test_snapshot_invalidated_while_fetching_is_not_stored():
+    fetch_count = 0
+    snapshot = None
+
+    async def fetch():
+        nonlocal fetch_count
+        fetch_count += 1
+        if fetch_count == 1:
+            snapshot.invalidate()
+        return fetch_count
+
+    async def run():
+        assert await snapshot.get() == 1
+        assert await snapshot.get() == 2
+        assert await snapshot.get() == 2
+
+    snapshot = Snapshot(fetch)
+    snapshot.subscribe()
+    asyncio.run(run())
@@ -0,0 +1,45 @@
+# Standard library imports
+import asyncio
+
+# Third-party imports
+import pytest
+
+# Internal imports
+from ktp_controller.agent.main import _stop_exam_sessions
+
+from .utils import mock_concurrent_calls
+
+
+def _student(n, **kwargs):
+    return {"studentUuid": f"student{n}", "sessionUuid": f"session{n}", **kwargs}
+
+
+def _mock_stop_exam_session(mocker, *, failing_session_uuids=()):
+    return mock_concurrent_calls(
+        mocker,
+        "ktp_controller.abitti2.asyncclient.stop_exam_session",
+        failing_keys=failing_session_uuids,
+    )
+
+
+def test_stop_exam_sessions_skips_ended_sessions(mocker):
+    stopped, tracker = _mock_stop_exam_session(mocker)
+    students = [
+        _student(0, examFinished=True),
+        _student(1, sessionStatus="session_ended"),
+        *[_student(n, sessionStatus="in_progress") for n in range(2, 10)],
+    ]
+
+    asyncio.run(_stop_exam_sessions(students, concurrency=4))
+
+    assert sorted(stopped) == sorted(f"session{n}" for n in range(2, 10))
+    assert tracker.max_running == 4
+
+
+def test_stop_exam_sessions_attempts_all_sessions(mocker):
+    stopped, _ = _mock_stop_exam_session(mocker, failing_session_uuids={"session0"})
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(_stop_exam_sessions([_student(n) for n in range(3)], concurrency=1))
+
+    assert stopped == ["session1", "session2"]
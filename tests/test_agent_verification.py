@@ -0,0 +1,90 @@
+# Standard library imports
+import hashlib
+import json
+import os
+
+# Third-party imports
+
+# Internal imports
+import ktp_controller.utils
+from ktp_controller.agent.verification import VerificationIndex
+
+
+def test_unchanged_file_is_not_rehashed(tmp_path, mocker):
+    filepath = tmp_path / "exam.mex"
+    filepath.write_bytes(b"exam")
+    index_filepath = str(tmp_path / "index.json")
+
+    sha256 = mocker.spy(ktp_controller.utils, "sha256")
+
+    index = VerificationIndex(index_filepath)
+    assert index.get_sha256(str(filepath)) == hashlib.sha256(b"exam").hexdigest()
+    assert sha256.call_count == 1
+
+    # Index is persisted.
+    index = VerificationIndex(index_filepath)
+    assert index.get_sha256(str(filepath)) == hashlib.sha256(b"exam").hexdigest()
+    assert sha256.call_count == 1
+
+    filepath.write_bytes(b"exam2")
+    assert index.get_sha256(str(filepath)) == hashlib.sha256(b"exam2").hexdigest()
+    assert sha256.call_count == 2
+
+
+def test_scan_integrity_finds_silent_corruption(tmp_path):
+    filepath = tmp_path / "exam.mex"
+    filepath.write_bytes(b"exam")
+
+    index = VerificationIndex(str(tmp_path / "index.json"))
+    index.record(str(filepath), hashlib.sha256(b"exam").hexdigest())
+    assert not index.scan_integrity()
+
+    # Same size and mtime, different content.
+    st = os.stat(filepath)
+    with open(filepath, "r+b") as f:
+        f.write(b"EXAM")
+    os.utime(filepath, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    assert index.get_sha256(str(filepath)) == hashlib.sha256(b"exam").hexdigest()
+    assert index.scan_integrity() == [str(filepath)]
+    assert index.get_sha256(str(filepath)) == hashlib.sha256(b"EXAM").hexdigest()
+
+
+def test_scan_integrity_skips_unreadable_files(tmp_path, mocker):
+    filepaths = [tmp_path / "exam1.mex", tmp_path / "exam2.mex"]
+    index = VerificationIndex(str(tmp_path / "index.json"))
+    for filepath in filepaths:
+        filepath.write_bytes(b"exam")
+        index.record(str(filepath), hashlib.sha256(b"exam").hexdigest())
+    filepaths[1].write_bytes(b"EXAM")
+
+    sha256 = ktp_controller.utils.sha256
+
+    def fail_on_first(filepath):
+        if filepath == str(filepaths[0]):
+            raise PermissionError(filepath)
+        return sha256(filepath)
+
+    mocker.patch.object(ktp_controller.utils, "sha256", side_effect=fail_on_first)
+
+    assert index.scan_integrity() == [str(filepaths[1])]
+
+
+def test_scan_integrity_saves_index_once(tmp_path, mocker):
+    index_filepath = str(tmp_path / "index.json")
+    index = VerificationIndex(index_filepath)
+    for i in range(5):
+        filepath = tmp_path / f"exam{i}.mex"
+        filepath.write_bytes(b"exam")
+        index.record(str(filepath), hashlib.sha256(b"exam").hexdigest())
+    os.unlink(tmp_path / "exam0.mex")
+
+    open_atomic_write = mocker.spy(ktp_controller.utils, "open_atomic_write")
+    assert not index.scan_integrity()
+    assert open_atomic_write.call_count == 1
+
+    # Removed file was dropped from the saved index.
+    with open(index_filepath, "r", encoding="ascii") as index_file:
+        assert sorted(json.load(index_file)) == [
+            str(tmp_path / f"exam{i}.mex") for i in range(1, 5)
+        ]
@@ -0,0 +1,44 @@
+# Standard library imports
+import asyncio
+import time
+
+# Third-party imports
+
+# Internal imports
+from ktp_controller.agent.watchdog import LoopLagMonitor
+
+
+def _block_event_loop(duration_sec):
+    time.sleep(duration_sec)
+
+
+def test_loop_lag_monitor_dumps_stack_of_blocking_code():
+    monitor = LoopLagMonitor(threshold_sec=0.1, interval_sec=0.01)
+
+    async def run():
+        task = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0.05)
+        _block_event_loop(0.3)
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run())
+
+    assert len(monitor.events) == 1
+    assert monitor.events[0].lag_sec >= 0.2
+    assert "_block_event_loop" in monitor.events[0].stack
+    assert sum(monitor.histogram.counts) > 1
+
+
+def test_loop_lag_monitor_ignores_small_lags():
+    monitor = LoopLagMonitor(threshold_sec=1, interval_sec=0.01)
+
+    async def run():
+        task = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(run())
+
+    assert not monitor.events
+    assert sum(monitor.histogram.counts) > 0
@@ -8,6 +8,7 @@ import uuid
 from ktp_controller.api import models
 import ktp_controller.api.client
 import ktp_controller.api.exam.schemas
+import ktp_controller.messages
 from ktp_controller.examomatic.mock.utils import (
     read_exam_info,
     get_synthetic_exam_info,
@@ -324,6 +325,53 @@ def test_get_current_exam_package__one_package_and_under_15mins_to_start_time_no
     assert response.json() == api_exam_info["scheduled_exam_packages"][0]
 
 
+def test_get_current_exam_package__promotion_notifies_agents(
+    client, testdb, utcnow, mocker
+):
+    send_invalidation = mocker.patch("ktp_controller.agent.utils.send_invalidation")
+    eom_exam_info = get_synthetic_exam_info(
+        start_time=utcnow + datetime.timedelta(minutes=14, seconds=59),
+        utcnow=utcnow,
+    )
+    api_exam_info = ktp_controller.api.client.eom_exam_info_to_api_exam_info(
+        eom_exam_info
+    )
+
+    response = client.post("/api/v1/exam/save_exam_info", json=api_exam_info)
+    assert_response(response, expected_status_code=200)
+    send_invalidation.reset_mock()
+
+    response = client.post("/api/v1/exam/get_current_exam_package")
+    assert_response(response, expected_status_code=200)
+    send_invalidation.assert_called_once_with(
+        ktp_controller.messages.Invalidation.CURRENT_EXAM_PACKAGE
+    )
+
+
+def test_get_current_exam_package__promotion_by_agent_does_not_notify_agents(
+    client, testdb, utcnow, mocker
+):
+    send_invalidation = mocker.patch("ktp_controller.agent.utils.send_invalidation")
+    eom_exam_info = get_synthetic_exam_info(
+        start_time=utcnow + datetime.timedelta(minutes=14, seconds=59),
+        utcnow=utcnow,
+    )
+    api_exam_info = ktp_controller.api.client.eom_exam_info_to_api_exam_info(
+        eom_exam_info
+    )
+
+    response = client.post("/api/v1/exam/save_exam_info", json=api_exam_info)
+    assert_response(response, expected_status_code=200)
+    send_invalidation.reset_mock()
+
+    response = client.post(
+        "/api/v1/exam/get_current_exam_package", json={"notify_agents": False}
+    )
+    assert_response(response, expected_status_code=200)
+    assert response.json() == api_exam_info["scheduled_exam_packages"][0]
+    assert not send_invalidation.called
+
+
 def test_get_current_exam_package__one_package_and_lock_time_is_far_in_future_but_already_locked_no_current_yet(
     client, testdb, utcnow
 ):
@@ -726,3 +774,24 @@ def test_set_current_exam_package_state__multiple_locked_packages(
             assert_response(response, expected_status_code=200)
             assert response.json() == state
             state = next_state
+
+
+def test_save_exam_info__invalidates_current_exam_package(
+    client, testdb, utcnow, mocker
+):
+    pubsub_send = mocker.patch("ktp_controller.redis.pubsub_send")
+
+    response = client.post(
+        "/api/v1/exam/save_exam_info",
+        json={
+            "scheduled_exams": [],
+            "scheduled_exam_packages": [],
+            "request_id": "some_kind_of_request_id1",
+            "raw_data": {},
+        },
+    )
+    assert_response(response, expected_status_code=200)
+
+    pubsub_send.assert_called_once()
+    invalidation_message = pubsub_send.call_args.args[0]
+    assert invalidation_message.data.invalidation == "current_exam_package"
@@ -0,0 +1,111 @@
+# Standard library imports
+import hashlib
+import os.path
+
+# Third-party imports
+import fastapi.testclient
+import pytest
+
+# Internal imports
+import ktp_controller.examomatic.client
+from ktp_controller.examomatic.mock.main import APP
+
+
+_CONTENT = bytes(range(256)) * 64
+_SHA256SUM = hashlib.sha256(_CONTENT).hexdigest()
+
+
+@pytest.fixture(name="exam_filepath")
+def _exam_filepath(tmp_path, mocker):
+    exam_filepath = tmp_path / "exam.mex"
+    exam_filepath.write_bytes(_CONTENT)
+    mocker.patch(
+        "ktp_controller.examomatic.mock.main.get_exam_filepath",
+        return_value=str(exam_filepath),
+    )
+    return exam_filepath
+
+
+def _get_raw_file(headers=None):
+    with fastapi.testclient.TestClient(APP) as client:
+        return client.get(
+            "/v1/exams/raw_file",
+            params={
+                "domain": "integration.test",
+                "hostname": "unit-test-host1",
+                "id": 1,
+                "hash": _SHA256SUM,
+            },
+            headers=headers,
+        )
+
+
+def test_mock_raw_file_range(exam_filepath):
+    response = _get_raw_file()
+    assert response.status_code == 200
+    assert response.content == _CONTENT
+
+    response = _get_raw_file({"Range": "bytes=1000-"})
+    assert response.status_code == 206
+    assert response.content == _CONTENT[1000:]
+    assert response.headers["Content-Range"] == (
+        f"bytes 1000-{len(_CONTENT) - 1}/{len(_CONTENT)}"
+    )
+
+    response = _get_raw_file({"Range": f"bytes={len(_CONTENT)}-"})
+    assert response.status_code == 416
+
+
+class _FakeResponse:
+    def __init__(self, content, status_code, fail_after=None):
+        self.content = content
+        self.status_code = status_code
+        self.__fail_after = fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            if self.__fail_after is not None and i >= self.__fail_after:
+                raise ConnectionError("connection lost")
+            yield self.content[i : i + chunk_size]
+
+
+def test_download_exam_file_resumes(tmp_path, mocker):
+    dest_filepath = str(tmp_path / "exam.mex")
+    requested_ranges = []
+
+    def _get(path, *, extra_headers=None, **kwargs):  # pylint: disable=unused-argument
+        requested_ranges.append((extra_headers or {}).get("Range"))
+        if extra_headers is None:
+            return _FakeResponse(_CONTENT, 200, fail_after=5000)
+        offset = int(extra_headers["Range"][len("bytes=") : -1])
+        return _FakeResponse(_CONTENT[offset:], 206)
+
+    mocker.patch("ktp_controller.examomatic.client._get", side_effect=_get)
+
+    with pytest.raises(ConnectionError):
+        ktp_controller.examomatic.client.download_exam_file(
+            _SHA256SUM,
+            dest_filepath,
+            stream_chunk_size=1000,
+            journal_interval_bytes=2000,
+        )
+    assert not os.path.exists(dest_filepath)
+
+    ktp_controller.examomatic.client.download_exam_file(
+        _SHA256SUM,
+        dest_filepath,
+        stream_chunk_size=1000,
+        journal_interval_bytes=2000,
+    )
+
+    # Resumed from the last journaled offset.
+    assert requested_ranges == [None, "bytes=4000-"]
+    with open(dest_filepath, "rb") as dest_file:
+        assert dest_file.read() == _CONTENT
+    assert os.listdir(tmp_path) == ["exam.mex"]
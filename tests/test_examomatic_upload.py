@@ -0,0 +1,133 @@
+# Standard library imports
+import os
+import urllib.parse
+
+# Third-party imports
+import fastapi.testclient
+import pytest
+import requests
+import requests.exceptions
+
+# Internal imports
+import ktp_controller.examomatic.client
+from ktp_controller.examomatic.mock.main import APP
+
+
+_CONTENT = bytes(range(256)) * 64
+
+
+class _MockSession:
+    """Routes requests of the Exam-O-Matic client to the mock. The first
+    upload of each chunk in fail_chunk_indices fails."""
+
+    def __init__(self, client, fail_chunk_indices):
+        self.__client = client
+        self.__fail_chunk_indices = set(fail_chunk_indices)
+        self.chunk_indices = []
+
+    def __request(self, method, url, *, params=None, json=None, data=None, **kwargs):
+        path = urllib.parse.urlparse(url).path
+        if "/chunks/" in path:
+            chunk_index = int(path.rsplit("/", 1)[1])
+            self.chunk_indices.append(chunk_index)
+            if chunk_index in self.__fail_chunk_indices:
+                self.__fail_chunk_indices.remove(chunk_index)
+                raise requests.exceptions.ConnectionError("connection lost")
+
+        mock_response = self.__client.request(
+            method,
+            path,
+            params=params,
+            json=json,
+            content=data,
+            headers=kwargs.get("headers"),
+        )
+
+        response = requests.Response()
+        response.status_code = mock_response.status_code
+        response.url = url
+        response._content = mock_response.content  # pylint: disable=protected-access
+        return response
+
+    def get(self, url, **kwargs):
+        return self.__request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.__request("POST", url, **kwargs)
+
+
+@pytest.fixture(name="journal_dirpath")
+def _journal_dirpath(tmp_path, mocker):
+    journal_dirpath = tmp_path / "journals"
+    mocker.patch.object(
+        ktp_controller.examomatic.client,
+        "_ANSWERS_UPLOAD_JOURNAL_DIR",
+        str(journal_dirpath),
+    )
+    mocker.patch.object(
+        ktp_controller.examomatic.client.SETTINGS, "domain", "integration.test"
+    )
+    mocker.patch("time.sleep")
+    return journal_dirpath
+
+
+def test_chunked_answers_upload_resumes(tmp_path, journal_dirpath, mocker):
+    answers_filepath = tmp_path / "answers.meb"
+    answers_filepath.write_bytes(_CONTENT)
+
+    with fastapi.testclient.TestClient(APP) as client:
+        APP.state.answers_uploads.clear()
+        session = _MockSession(client, fail_chunk_indices=[2])
+        mocker.patch("ktp_controller.examomatic.client._SESSION", session)
+
+        ktp_controller.examomatic.client.upload_answers_file(
+            exam_package_external_id="package1",
+            filepath=str(answers_filepath),
+            is_final=ktp_controller.examomatic.client.IsFinal.TRUE,
+            chunk_size=4096,
+        )
+
+    (answers_upload,) = APP.state.answers_uploads.values()
+    assert answers_upload["is_committed"]
+    assert answers_upload["chunk_count"] == 4
+
+    # Chunks acknowledged before the failure were not sent again.
+    assert session.chunk_indices == [0, 1, 2, 2, 3]
+    assert not os.listdir(journal_dirpath)
+
+
+def test_chunked_answers_upload_resumes_from_another_download(
+    tmp_path, journal_dirpath, mocker
+):
+    # Same answers are downloaded again to a new filepath after a
+    # restart.
+    answers_filepaths = [tmp_path / "answers1.meb", tmp_path / "answers2.meb"]
+    for answers_filepath in answers_filepaths:
+        answers_filepath.write_bytes(_CONTENT)
+
+    with fastapi.testclient.TestClient(APP) as client:
+        APP.state.answers_uploads.clear()
+        session = _MockSession(client, fail_chunk_indices=[2])
+        mocker.patch("ktp_controller.examomatic.client._SESSION", session)
+
+        with pytest.raises(requests.exceptions.ConnectionError):
+            ktp_controller.examomatic.client.upload_answers_file_chunked(
+                exam_package_external_id="package1",
+                filepath=str(answers_filepaths[0]),
+                is_final=ktp_controller.examomatic.client.IsFinal.TRUE,
+                chunk_size=4096,
+                max_attempts=1,
+            )
+        assert len(os.listdir(journal_dirpath)) == 1
+
+        ktp_controller.examomatic.client.upload_answers_file_chunked(
+            exam_package_external_id="package1",
+            filepath=str(answers_filepaths[1]),
+            is_final=ktp_controller.examomatic.client.IsFinal.TRUE,
+            chunk_size=4096,
+        )
+
+    (answers_upload,) = APP.state.answers_uploads.values()
+    assert answers_upload["is_committed"]
+    assert session.chunk_indices == [0, 1, 2, 2, 3]
+    assert not os.listdir(journal_dirpath)
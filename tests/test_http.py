@@ -0,0 +1,135 @@
+# Standard library imports
+import asyncio
+import contextvars
+import threading
+
+# Third-party imports
+import pytest
+import requests
+
+# Internal imports
+from ktp_controller.http import (
+    MultipartBody,
+    MultipartPart,
+    get_request_stats,
+    new_executor,
+    new_session,
+    to_async,
+)
+
+_CONTEXT_VAR: contextvars.ContextVar[str] = contextvars.ContextVar("_CONTEXT_VAR")
+
+
+def test_multipart_body_with_known_size_has_content_length():
+    body = MultipartBody(
+        [
+            MultipartPart(
+                "examZip",
+                [b"zip", b"", b"data"],
+                filename="package.zip",
+                content_type="application/zip",
+                size=7,
+            ),
+            MultipartPart.field("sha256", "abc"),
+        ]
+    )
+
+    content = b"".join(body)
+    assert body.len == len(content)
+    assert b'name="examZip"; filename="package.zip"' in content
+    assert b"\r\n\r\nzipdata\r\n" in content
+
+    prepared_request = requests.Request(
+        "POST",
+        "http://example.invalid/",
+        data=body,
+        headers={"Content-Type": body.content_type},
+    ).prepare()
+    assert prepared_request.headers["Content-Length"] == str(len(content))
+    assert "Transfer-Encoding" not in prepared_request.headers
+
+
+def test_multipart_body_with_unknown_size_is_chunked():
+    body = MultipartBody([MultipartPart("examZip", iter([b"zipdata"]))])
+
+    prepared_request = requests.Request(
+        "POST", "http://example.invalid/", data=body
+    ).prepare()
+    assert prepared_request.headers["Transfer-Encoding"] == "chunked"
+
+
+class _FakeAdapter(requests.adapters.BaseAdapter):
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        if request.url.endswith("/slow"):
+            raise requests.exceptions.ReadTimeout("timed out", request=request)
+        response = requests.Response()
+        response.status_code = 404 if request.url.endswith("/missing") else 200
+        response._content = b"hello"  # pylint: disable=protected-access
+        # Differs from the body, to tell which one was counted.
+        response.headers["Content-Length"] = "7"
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def test_instrumented_session_records_request_stats():
+    session = new_session(component="test_http")
+    session.mount("http://", _FakeAdapter())
+
+    session.post("http://example.invalid/items/12345/data", data=b"abc")
+    session.get("http://example.invalid/items/67890/data")
+    session.get("http://example.invalid/missing")
+    with pytest.raises(requests.exceptions.Timeout):
+        session.get("http://example.invalid/slow")
+    session.get("http://example.invalid/streamed", stream=True)
+
+    request_stats = get_request_stats("test_http")
+    assert sorted(request_stats) == [
+        ("test_http", "/items/{n}/data"),
+        ("test_http", "/missing"),
+        ("test_http", "/slow"),
+        ("test_http", "/streamed"),
+    ]
+
+    item_stats = request_stats[("test_http", "/items/{n}/data")]
+    assert item_stats.latency.count == 2
+    assert item_stats.latency.error_count == 0
+    assert sum(item_stats.histogram.counts) == 2
+    assert item_stats.status_codes == {200: 2}
+    assert item_stats.bytes_sent == 3
+    assert item_stats.bytes_received == 10
+
+    missing_stats = request_stats[("test_http", "/missing")]
+    assert missing_stats.status_codes == {404: 1}
+    assert missing_stats.latency.error_count == 1
+
+    slow_stats = request_stats[("test_http", "/slow")]
+    assert slow_stats.timeout_count == 1
+    assert slow_stats.latency.error_count == 1
+    assert not slow_stats.status_codes
+
+    # Streamed bodies are counted from Content-Length, without reading
+    # them.
+    assert request_stats[("test_http", "/streamed")].bytes_received == 7
+
+
+def test_to_async_runs_in_given_executor():
+    executor = new_executor(max_workers=1, component="test_http")
+
+    def _get_thread_name_and_context_var():
+        return threading.current_thread().name, _CONTEXT_VAR.get()
+
+    async def _main():
+        _CONTEXT_VAR.set("passed on")
+        return await to_async(_get_thread_name_and_context_var, executor=executor)()
+
+    try:
+        thread_name, value = asyncio.run(_main())
+    finally:
+        executor.shutdown()
+
+    assert thread_name.startswith("ktp-controller-test_http")
+    assert value == "passed on"
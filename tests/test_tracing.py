@@ -0,0 +1,92 @@
+# Standard library imports
+import json
+import time
+
+# Third-party imports
+
+# Internal imports
+from ktp_controller.settings import SETTINGS
+from ktp_controller.tracing import (
+    flush_trace_events,
+    format_command_trace,
+    read_command_trace,
+    record_instant,
+    record_span,
+    span,
+)
+
+
+def test_command_trace_is_written_in_chrome_trace_event_format(tmp_path):
+    trace_filepath = str(tmp_path / "traces" / "command-trace.json")
+
+    started_at = time.time()
+    record_span(
+        "cli.post_async_command",
+        "u1",
+        started_at,
+        started_at + 0.25,
+        trace_filepath=trace_filepath,
+    )
+    with span("agent.execute_command", "u1", trace_filepath=trace_filepath, x=1):
+        pass
+    record_instant("api.deliver_command", "u1", trace_filepath=trace_filepath)
+    record_instant("api.deliver_command", "u2", trace_filepath=trace_filepath)
+    flush_trace_events()
+
+    with open(trace_filepath, "r", encoding="utf-8") as trace_file:
+        content = trace_file.read()
+    # The unterminated JSON array format is valid once terminated.
+    all_events = json.loads(content.rstrip().removesuffix(",") + "]")
+    assert len(all_events) == 4
+
+    events = read_command_trace("u1", trace_filepath=trace_filepath)
+    assert [event["name"] for event in events] == [
+        "cli.post_async_command",
+        "agent.execute_command",
+        "api.deliver_command",
+    ]
+    assert events[0]["ph"] == "X"
+    assert events[0]["dur"] == 250_000
+    assert events[1]["args"] == {"command_uuid": "u1", "x": 1}
+    assert events[2]["ph"] == "i"
+
+    breakdown = format_command_trace(events).splitlines()
+    assert len(breakdown) == 4
+    assert breakdown[1].split()[:2] == ["0.000", "250.000"]
+
+
+def test_read_command_trace_without_trace_file(tmp_path):
+    trace_filepath = str(tmp_path / "command-trace.json")
+
+    assert not read_command_trace("u1", trace_filepath=trace_filepath)
+    assert format_command_trace([]) == "no trace events"
+
+
+def test_command_trace_file_is_rotated(tmp_path, mocker):
+    trace_filepath = str(tmp_path / "command-trace.json")
+    mocker.patch("ktp_controller.tracing._MAX_TRACE_FILE_SIZE", 1)
+
+    for name in ["first", "second", "third"]:
+        record_instant(name, "u1", trace_filepath=trace_filepath)
+        flush_trace_events()
+
+    # Only the latest backup is kept.
+    assert (tmp_path / "command-trace.json.1").exists()
+    assert [
+        event["name"]
+        for event in read_command_trace("u1", trace_filepath=trace_filepath)
+    ] == ["second", "third"]
+
+
+def test_command_trace_filepath_is_read_from_settings(tmp_path, mocker):
+    trace_filepath = tmp_path / "command-trace.json"
+
+    mocker.patch.object(SETTINGS, "command_trace_filepath", "")
+    record_instant("disabled", "u1")
+    flush_trace_events()
+    assert not read_command_trace("u1")
+
+    mocker.patch.object(SETTINGS, "command_trace_filepath", str(trace_filepath))
+    record_instant("enabled", "u1")
+    flush_trace_events()
+    assert [event["name"] for event in read_command_trace("u1")] == ["enabled"]
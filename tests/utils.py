@@ -1,6 +1,10 @@
 # Standard library imports
+import asyncio
+import contextlib
 import datetime
 import sys
+import threading
+import typing
 
 # Third-party imports
 from sqlalchemy import create_engine
@@ -59,3 +63,51 @@ def assert_response(response, *, expected_status_code: int):
     except AssertionError:
         print(response.content, file=sys.stderr)
         raise
+
+
+class ConcurrencyTracker:
+    """Track how many calls run at the same time, in threads or in
+    coroutines."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__running = 0
+        self.max_running = 0
+
+    @contextlib.contextmanager
+    def track(self):
+        with self.__lock:
+            self.__running += 1
+            self.max_running = max(self.max_running, self.__running)
+        try:
+            yield
+        finally:
+            with self.__lock:
+                self.__running -= 1
+
+
+def mock_concurrent_calls(
+    mocker,
+    target: str,
+    *,
+    failing_keys: typing.Collection = (),
+    duration_sec: float = 0.01,
+) -> typing.Tuple[typing.List, ConcurrencyTracker]:
+    """Patch coroutine function target with a mock which takes
+    duration_sec. The first argument of each call is its key. Calls
+    with failing_keys raise RuntimeError, keys of other calls are
+    collected to the returned list, in completion order."""
+
+    succeeded_keys: typing.List = []
+    tracker = ConcurrencyTracker()
+
+    async def call(key, *args, **kwargs):  # pylint: disable=unused-argument
+        with tracker.track():
+            await asyncio.sleep(duration_sec)
+        if key in failing_keys:
+            raise RuntimeError(f"{target} failed")
+        succeeded_keys.append(key)
+
+    mocker.patch(target, call)
+
+    return succeeded_keys, tracker